@@ -50,6 +50,21 @@ def main():
     # 8. Mercado
     run_command("python3 -m src.etl.market_data", "Descargando Precios Históricos")
 
+    # 9. Resúmenes de cartera (completo: fill_metadata pudo cambiar los sectores)
+    run_command("python3 -m src.features.portfolio_summary --full", "Materializando Resúmenes por Fondo y Trimestre")
+
+    # 10. Cambios de posición trimestre a trimestre (solo lo pendiente)
+    run_command("python3 -m src.features.position_changes", "Calculando Compras y Ventas por Trimestre")
+
+    # 11. Fondos más parecidos por trimestre (solo los trimestres nuevos o recargados)
+    run_command("python3 -m src.features.fund_similarity", "Calculando Similitud entre Fondos")
+
+    # 12. Historia del grafo fondos -> empresas (solo los trimestres nuevos o recargados)
+    run_command("python3 -m src.features.graph_history", "Actualizando la Historia del Grafo por Trimestre")
+
+    # 13. Capa Analítica (Parquet particionado para DuckDB)
+    run_command("python3 -m src.etl.export_parquet", "Exportando Parquet Particionado (Incremental)")
+
     print("\n===================================================")
     print("PIPELINE FINALIZADO. DATA WAREHOUSE LISTO.")
     print("===================================================")
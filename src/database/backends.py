@@ -0,0 +1,98 @@
+# src/database/backends.py
+# Perfiles de almacenamiento: SQLite afinado (por defecto) o PostgreSQL con pool de conexiones.
+# La elección se hace en config/database.yaml o con variables de entorno (RADAR_DB_BACKEND / RADAR_DATABASE_URL).
+import os
+from pathlib import Path
+import yaml
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+CONFIG_PATH = BASE_DIR / "config" / "database.yaml"
+
+DEFAULT_CONFIG = {
+    "backend": "sqlite",
+    "sqlite": {"path": "data/institutional_radar.db", "pragmas": {}},
+    "postgresql": {"url": None, "pool_size": 5, "max_overflow": 10, "pool_recycle": 1800},
+}
+
+def load_config():
+    """Lee config/database.yaml (si existe) y aplica las variables de entorno encima."""
+    config = {k: (dict(v) if isinstance(v, dict) else v) for k, v in DEFAULT_CONFIG.items()}
+    if CONFIG_PATH.exists():
+        with open(CONFIG_PATH, "r") as f:
+            user = yaml.safe_load(f) or {}
+        for key, value in user.items():
+            if isinstance(value, dict) and isinstance(config.get(key), dict):
+                config[key].update(value)
+            else:
+                config[key] = value
+
+    url = os.environ.get("RADAR_DATABASE_URL")
+    backend = os.environ.get("RADAR_DB_BACKEND")
+    if url:
+        backend = backend or ("postgresql" if url.startswith("postgresql") else "sqlite")
+        if backend == "postgresql":
+            config["postgresql"]["url"] = url
+        else:
+            config["sqlite"]["url"] = url
+    if backend:
+        config["backend"] = backend
+    return config
+
+def sqlite_path(config):
+    """
+    Archivo de la base SQLite. Con una URL (RADAR_DATABASE_URL) es el de la URL, relativo al directorio
+    actual como lo abre SQLite; None si la base es en memoria.
+    """
+    url = config["sqlite"].get("url")
+    if url:
+        database = make_url(url).database
+        if not database or database == ":memory:":
+            return None
+        return Path(database).resolve()
+    path = Path(config["sqlite"]["path"])
+    return path if path.is_absolute() else BASE_DIR / path
+
+def _apply_pragmas(engine, pragmas):
+    """Los PRAGMA son por conexión: se aplican en cada conexión nueva del pool."""
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def create_sqlite_engine(config, echo=False):
+    path = sqlite_path(config)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    url = config["sqlite"].get("url") or f"sqlite:///{path}"
+    engine = create_engine(url, echo=echo)
+    _apply_pragmas(engine, config["sqlite"].get("pragmas") or {})
+    return engine
+
+def create_postgresql_engine(config, echo=False):
+    pg = config["postgresql"]
+    if not pg.get("url"):
+        raise ValueError("Backend 'postgresql' sin URL: define postgresql.url en config/database.yaml o RADAR_DATABASE_URL")
+    return create_engine(
+        pg["url"],
+        echo=echo,
+        pool_size=pg.get("pool_size", 5),
+        max_overflow=pg.get("max_overflow", 10),
+        pool_recycle=pg.get("pool_recycle", 1800),
+        pool_pre_ping=True,
+    )
+
+BACKENDS = {
+    "sqlite": create_sqlite_engine,
+    "postgresql": create_postgresql_engine,
+}
+
+def create_configured_engine(config=None, echo=False):
+    config = config or load_config()
+    backend = config["backend"]
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido '{backend}'. Opciones: {', '.join(BACKENDS)}")
+    return BACKENDS[backend](config, echo=echo)
@@ -0,0 +1,284 @@
+# src/database/bulk.py
+# Interfaz ÚNICA de carga masiva para las etapas del ETL.
+# SQLite -> executemany dentro de la transacción. PostgreSQL -> COPY ... FROM STDIN (CSV en memoria).
+# Deduplicación por llave natural con INSERT ... ON CONFLICT (los índices únicos están en models.py).
+# Además lleva la cuenta de filas/segundo por tabla para comparar backends.
+# load_frame / update_frame: la misma carga desde un DataFrame (o columnas NumPy) sin crear un dict por fila.
+import csv
+import io
+import time
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, text, Date
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Session
+
+# {tabla: [filas, segundos]} acumulado durante el proceso
+LOAD_STATS = defaultdict(lambda: [0, 0.0])
+
+def _table_of(model_or_table):
+    return getattr(model_or_table, "__table__", model_or_table)
+
+def dialect_of(db: Session):
+    return db.get_bind().dialect.name
+
+def _record(table, rows, elapsed):
+    stats = LOAD_STATS[table.name]
+    stats[0] += rows
+    stats[1] += elapsed
+
+def _with_scalar_defaults(table, rows):
+    """COPY no ejecuta los default= de Python (Core sí): los completamos aquí."""
+    defaults = {c.name: c.default.arg for c in table.columns
+                if c.default is not None and c.default.is_scalar and c.name not in rows[0]}
+    if not defaults: return rows
+    return [{**defaults, **row} for row in rows]
+
+def _copy_rows(db: Session, table_name, columns, rows):
+    """COPY en la misma transacción de la sesión (psycopg2 o psycopg 3)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[c] for c in columns])  # None -> campo vacío -> NULL
+    _copy_buffer(db, table_name, columns, buf)
+
+def _copy_buffer(db: Session, table_name, columns, buf):
+    buf.seek(0)
+    cols_sql = ", ".join(f'"{c}"' for c in columns)
+    sql = f'COPY "{table_name}" ({cols_sql}) FROM STDIN WITH (FORMAT csv)'
+    raw = db.connection().connection.dbapi_connection
+    with raw.cursor() as cursor:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, buf)
+        else:                               # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buf.getvalue())
+
+def bulk_insert(db: Session, model_or_table, rows):
+    """
+    Inserta una lista de dicts (todas con las mismas llaves) en una tabla.
+    No hace commit: el llamador controla la transacción.
+    """
+    if not rows: return 0
+    table = _table_of(model_or_table)
+    t0 = time.perf_counter()
+
+    if dialect_of(db) == "postgresql":
+        rows = _with_scalar_defaults(table, rows)
+        _copy_rows(db, table.name, list(rows[0].keys()), rows)
+    else:
+        db.execute(insert(table), rows)
+
+    _record(table, len(rows), time.perf_counter() - t0)
+    return len(rows)
+
+def _pg_stage(db: Session, table):
+    stage = f"_stage_{table.name}"
+    db.execute(text(f'CREATE TEMP TABLE IF NOT EXISTS "{stage}" (LIKE "{table.name}" INCLUDING DEFAULTS) ON COMMIT DROP'))
+    db.execute(text(f'TRUNCATE "{stage}"'))
+    return stage
+
+def _pg_staged_merge(db: Session, table, rows, index_elements, update_columns):
+    """
+    PostgreSQL: COPY a una tabla temporal y luego un solo INSERT ... SELECT ... ON CONFLICT.
+    Mantiene la velocidad de COPY sin perder la deduplicación por llave natural.
+    """
+    rows = _with_scalar_defaults(table, rows)
+    columns = list(rows[0].keys())
+    stage = _pg_stage(db, table)
+    _copy_rows(db, stage, columns, rows)
+    return _pg_merge_from_stage(db, table, stage, columns, index_elements, update_columns)
+
+def _on_conflict_sql(index_elements, update_columns):
+    if not index_elements: return ""
+    keys_sql = ", ".join(f'"{c}"' for c in index_elements)
+    if update_columns:
+        return f' ON CONFLICT ({keys_sql}) DO UPDATE SET ' + ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in update_columns)
+    return f' ON CONFLICT ({keys_sql}) DO NOTHING'
+
+def _pg_merge_from_stage(db: Session, table, stage, columns, index_elements, update_columns):
+    cols_sql = ", ".join(f'"{c}"' for c in columns)
+    result = db.execute(text(
+        f'INSERT INTO "{table.name}" ({cols_sql}) SELECT {cols_sql} FROM "{stage}"'
+        + _on_conflict_sql(index_elements, update_columns)
+    ))
+    return result.rowcount
+
+def _merge(db: Session, model_or_table, rows, index_elements, update_columns):
+    if not rows: return 0
+    table = _table_of(model_or_table)
+    t0 = time.perf_counter()
+
+    if dialect_of(db) == "postgresql":
+        written = _pg_staged_merge(db, table, rows, index_elements, update_columns)
+    else:
+        stmt = sqlite.insert(table)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(index_elements=index_elements,
+                                              set_={c: stmt.excluded[c] for c in update_columns})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+        written = db.execute(stmt, rows).rowcount
+
+    _record(table, len(rows), time.perf_counter() - t0)
+    return written if written is not None and written >= 0 else len(rows)
+
+def insert_ignore(db: Session, model_or_table, rows, index_elements):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO NOTHING, según el dialecto.
+    Devuelve cuántas filas se insertaron realmente (las repetidas se ignoran).
+    """
+    return _merge(db, model_or_table, rows, index_elements, None)
+
+def upsert(db: Session, model_or_table, rows, index_elements, update_columns=None):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO UPDATE: la fila nueva reemplaza los valores.
+    Por defecto actualiza todas las columnas que no forman parte de la llave.
+    """
+    if not rows: return 0
+    if update_columns is None:
+        update_columns = [c for c in rows[0].keys() if c not in index_elements]
+    return _merge(db, model_or_table, rows, index_elements, update_columns)
+
+# CARGA DESDE DATAFRAMES (vectorizada)
+FRAME_CHUNK = 50_000  # Filas por executemany / COPY
+
+def _as_frame(data):
+    """DataFrame o {columna: array} -> DataFrame (sin copiar si ya lo es)."""
+    return data if isinstance(data, pd.DataFrame) else pd.DataFrame(dict(data))
+
+def _with_frame_defaults(table, df):
+    """Igual que _with_scalar_defaults, pero añadiendo columnas constantes al DataFrame."""
+    missing = {c.name: c.default.arg for c in table.columns
+               if c.default is not None and c.default.is_scalar and c.name not in df.columns}
+    return df.assign(**missing) if missing else df
+
+_SQLITE_DATE = "%Y-%m-%d"
+_SQLITE_DATETIME = "%Y-%m-%d %H:%M:%S.%f"  # Mismos formatos que guardan Date/DateTime de SQLAlchemy en SQLite
+
+def _sqlite_temporal(v):
+    if hasattr(v, "hour"): return v.strftime(_SQLITE_DATETIME)
+    if hasattr(v, "isoformat"): return v.isoformat()
+    return v
+
+def _driver_columns(table, df, dialect):
+    """
+    Columnas -> listas de objetos Python que el driver acepta tal cual (tolist() es C, no un bucle).
+    En SQLite las fechas van como texto en el formato de SQLAlchemy. NaN -> NULL.
+    """
+    out = []
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            is_date = isinstance(table.columns[name].type, Date)
+            if dialect == "postgresql":
+                values = (col.dt.date if is_date else col.dt.to_pydatetime()).astype(object)
+            else:
+                values = col.dt.strftime(_SQLITE_DATE if is_date else _SQLITE_DATETIME)
+            values = values.where(col.notna(), None).tolist()
+        elif pd.api.types.is_float_dtype(col):
+            arr = col.to_numpy(dtype=np.float64)
+            values = arr.tolist()
+            if np.isnan(arr).any():
+                values = [None if v != v else v for v in values]
+        elif pd.api.types.is_integer_dtype(col) or pd.api.types.is_bool_dtype(col):
+            values = col.tolist()
+        else:
+            values = col.astype(object).where(col.notna(), None).tolist()
+            if dialect != "postgresql":
+                values = [_sqlite_temporal(v) for v in values]
+        out.append(values)
+    return out
+
+def _executemany(db: Session, table, sql, df, dialect):
+    written = 0
+    for i in range(0, len(df), FRAME_CHUNK):
+        chunk = df.iloc[i:i + FRAME_CHUNK]
+        params = list(zip(*_driver_columns(table, chunk, dialect)))
+        result = db.connection().exec_driver_sql(sql, params)
+        written += result.rowcount if result.rowcount and result.rowcount > 0 else 0
+    return written
+
+def _copy_frame(db: Session, table_name, df):
+    for i in range(0, len(df), FRAME_CHUNK):
+        buf = io.StringIO()
+        df.iloc[i:i + FRAME_CHUNK].to_csv(buf, index=False, header=False, na_rep="")
+        _copy_buffer(db, table_name, list(df.columns), buf)
+
+def load_frame(db: Session, model_or_table, data, index_elements=None, update_columns=None):
+    """
+    Carga un DataFrame (o {columna: array}) en una tabla, en bloques de FRAME_CHUNK filas.
+    - Sin index_elements: INSERT simple.
+    - Con index_elements: deduplica por llave natural (ON CONFLICT DO NOTHING),
+      o actualiza update_columns si se indican (["*"] = todas las que no son llave).
+    SQLite -> executemany del driver con tuplas. PostgreSQL -> COPY (directo, o a tabla temporal + ON CONFLICT).
+    No hace commit. Devuelve las filas escritas.
+    """
+    df = _as_frame(data)
+    if df.empty: return 0
+    table = _table_of(model_or_table)
+    dialect = dialect_of(db)
+    t0 = time.perf_counter()
+
+    if index_elements:
+        # Duplicados dentro del mismo lote: ON CONFLICT no puede tocar dos veces la misma fila
+        df = df.drop_duplicates(subset=index_elements, keep="last")
+    if update_columns == ["*"]:
+        update_columns = [c for c in df.columns if c not in (index_elements or [])]
+    df = _with_frame_defaults(table, df)
+    columns = list(df.columns)
+
+    if dialect == "postgresql":
+        if index_elements:
+            stage = _pg_stage(db, table)
+            _copy_frame(db, stage, df)
+            written = _pg_merge_from_stage(db, table, stage, columns, index_elements, update_columns)
+        else:
+            _copy_frame(db, table.name, df)
+            written = len(df)
+    else:
+        cols_sql = ", ".join(f'"{c}"' for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        sql = f'INSERT INTO "{table.name}" ({cols_sql}) VALUES ({marks})' + _on_conflict_sql(index_elements, update_columns)
+        written = _executemany(db, table, sql, df, dialect)
+
+    _record(table, len(df), time.perf_counter() - t0)
+    return written
+
+def update_frame(db: Session, model_or_table, data, key="id"):
+    """
+    UPDATE masivo desde un DataFrame: cada fila actualiza las columnas presentes donde key coincide.
+    SQLite -> executemany de UPDATE. PostgreSQL -> COPY a tabla temporal + un solo UPDATE ... FROM.
+    """
+    df = _as_frame(data)
+    if df.empty: return 0
+    table = _table_of(model_or_table)
+    dialect = dialect_of(db)
+    t0 = time.perf_counter()
+    columns = [c for c in df.columns if c != key]
+
+    if dialect == "postgresql":
+        # Tabla temporal solo con las columnas a actualizar (LIKE copiaría los NOT NULL del resto)
+        stage = f"_update_{table.name}"
+        cols_sql = ", ".join(f'"{c}"' for c in [key] + columns)
+        db.execute(text(f'DROP TABLE IF EXISTS "{stage}"'))
+        db.execute(text(f'CREATE TEMP TABLE "{stage}" ON COMMIT DROP AS SELECT {cols_sql} FROM "{table.name}" WITH NO DATA'))
+        _copy_frame(db, stage, df[[key] + columns])
+        set_sql = ", ".join(f'"{c}" = s."{c}"' for c in columns)
+        written = db.execute(text(
+            f'UPDATE "{table.name}" AS t SET {set_sql} FROM "{stage}" AS s WHERE t."{key}" = s."{key}"'
+        )).rowcount
+    else:
+        set_sql = ", ".join(f'"{c}" = ?' for c in columns)
+        written = _executemany(db, table, f'UPDATE "{table.name}" SET {set_sql} WHERE "{key}" = ?', df[columns + [key]], dialect)
+
+    _record(table, len(df), time.perf_counter() - t0)
+    return written
+
+def report_load_stats(backend=""):
+    """Imprime el throughput de carga por tabla (filas/s)."""
+    if not LOAD_STATS: return
+    print(f"Throughput de carga{f' ({backend})' if backend else ''}:")
+    for name, (rows, secs) in sorted(LOAD_STATS.items()):
+        print(f"   {name:<22} {rows:>10,} filas en {secs:6.2f}s -> {rows / max(secs, 1e-9):>12,.0f} filas/s")
@@ -1,27 +1,31 @@
 # src/database/connection.py
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from pathlib import Path
 from .models import Base
+from .backends import load_config, sqlite_path, create_configured_engine
 
-# CONFIGURACIÓN DE RUTAS
-# Esto asegura que la base de datos se cree en la carpeta 'data'
-BASE_DIR = Path(__file__).resolve().parents[2]
-DB_PATH = BASE_DIR / "data" / "institutional_radar.db"
-DATABASE_URL = f"sqlite:///{DB_PATH}"
+# CONFIGURACIÓN DEL BACKEND
+# Por defecto SQLite en la carpeta 'data' (con PRAGMAs de rendimiento).
+# Para PostgreSQL: config/database.yaml o RADAR_DATABASE_URL (ver src/database/backends.py)
+DB_CONFIG = load_config()
+BACKEND = DB_CONFIG["backend"]
+DB_PATH = sqlite_path(DB_CONFIG)  # Archivo SQLite real (también con RADAR_DATABASE_URL); None en memoria
 
 # CREACIÓN DEL MOTOR
 # echo=False para que no llene la consola de texto, ponlo en True si quieres ver el SQL crudo
-engine = create_engine(DATABASE_URL, echo=False)
+engine = create_configured_engine(DB_CONFIG, echo=False)
+DATABASE_URL = engine.url.render_as_string(hide_password=True)
 
 # Fábrica de sesiones (usaremos esto cada vez que queramos guardar/leer datos)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
     """Crea las tablas en la base de datos si no existen."""
-    print(f"Conectando a base de datos en: {DB_PATH}")
+    print(f"Conectando a base de datos ({BACKEND}) en: {DATABASE_URL}")
     # Esta línea mágica convierte las clases de Python en tablas SQL reales
     Base.metadata.create_all(bind=engine)
+    # DBs antiguas: índices únicos de llaves naturales (deduplicando antes)
+    from .migrations import migrate
+    migrate()
     print("Tablas creadas exitosamente (Schema Loaded).")
 
 def get_db():
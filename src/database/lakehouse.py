@@ -0,0 +1,142 @@
+# src/database/lakehouse.py
+# Capa de consulta analítica: SQL con DuckDB sobre el Parquet particionado (src/etl/export_parquet.py).
+# Las vistas usan hive_partitioning, así que un filtro por quarter y/o fund_id solo lee esas carpetas.
+#
+#   from src.database.lakehouse import query
+#   query("SELECT fund_id, SUM(value) FROM holdings WHERE quarter = ? GROUP BY 1", ["2025Q3"])
+import sys
+import time
+from pathlib import Path
+import duckdb
+import pandas as pd
+from src.database.connection import engine
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+LAKE_DIR = BASE_DIR / "data" / "processed" / "lake"
+
+# vista -> patrón de archivos (los hechos llevan columnas de partición quarter / fund_id)
+VIEWS = {
+    "holdings": "holdings/*/*/*.parquet",
+    "derivatives": "derivatives/*/*/*.parquet",
+    "stock_prices": "stock_prices/*/*.parquet",
+    "companies": "companies/*.parquet",
+    "funds": "funds/*.parquet",
+}
+
+def connect(lake_dir=LAKE_DIR, threads=None):
+    """Conexión DuckDB en memoria con una vista por tabla exportada."""
+    con = duckdb.connect(database=":memory:")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    for view, pattern in VIEWS.items():
+        if not any(Path(lake_dir).glob(pattern)): continue
+        files = (Path(lake_dir) / pattern).as_posix()
+        con.execute(f"CREATE VIEW {view} AS SELECT * FROM read_parquet('{files}', hive_partitioning = true)")
+    return con
+
+_CON = None
+
+def query(sql, params=None):
+    """Ejecuta SQL sobre el lake y devuelve un DataFrame (conexión reutilizada en el proceso)."""
+    global _CON
+    if _CON is None:
+        _CON = connect()
+    return _CON.execute(sql, params or []).df()
+
+def refresh():
+    """Vuelve a crear las vistas (tras una nueva exportación)."""
+    global _CON
+    if _CON is not None:
+        _CON.close()
+    _CON = None
+
+def latest_quarter():
+    return query("SELECT MAX(quarter) AS q FROM holdings")["q"].iloc[0]
+
+# CONSULTAS REPRESENTATIVAS
+# Cada una en dos versiones: DuckDB sobre Parquet y SQLite sobre el warehouse, para el benchmark.
+def sector_exposure(quarter):
+    """Peso de cada sector en la cartera de cada fondo (Sector Rotation)."""
+    return query("""
+        SELECT f.name AS fund, COALESCE(c.sector, 'Unknown') AS sector, SUM(h.value) AS value
+        FROM holdings h
+        JOIN companies c ON c.id = h.company_id
+        JOIN funds f ON f.id = h.fund_id
+        WHERE h.quarter = ?
+        GROUP BY 1, 2
+        ORDER BY 1, 3 DESC
+    """, [quarter])
+
+def top_held_companies(quarter, limit=20):
+    """Empresas con más fondos detrás y más capital institucional (Whale Tracking)."""
+    return query("""
+        SELECT c.name, c.ticker, COUNT(DISTINCT h.fund_id) AS funds, SUM(h.value) AS value
+        FROM holdings h JOIN companies c ON c.id = h.company_id
+        WHERE h.quarter = ?
+        GROUP BY 1, 2
+        ORDER BY value DESC
+        LIMIT ?
+    """, [quarter, limit])
+
+def put_call_ratio(quarter, limit=20):
+    """Empresas con mayor valor nocional en PUTs respecto a CALLs (Bearish Radar)."""
+    return query("""
+        SELECT c.name, c.ticker,
+               SUM(CASE WHEN d.derivative_type = 'PUT' THEN d.value ELSE 0 END) AS put_value,
+               SUM(CASE WHEN d.derivative_type = 'CALL' THEN d.value ELSE 0 END) AS call_value
+        FROM derivatives d JOIN companies c ON c.id = d.company_id
+        WHERE d.quarter = ?
+        GROUP BY 1, 2
+        ORDER BY put_value DESC
+        LIMIT ?
+    """, [quarter, limit])
+
+_SQLITE_EQUIVALENTS = {
+    "sector_exposure": """
+        SELECT f.name AS fund, COALESCE(c.sector, 'Unknown') AS sector, SUM(h.value) AS value
+        FROM holdings h
+        JOIN companies c ON c.id = h.company_id
+        JOIN funds f ON f.id = h.fund_id
+        WHERE h.report_date BETWEEN :start AND :end
+        GROUP BY 1, 2
+        ORDER BY 1, 3 DESC
+    """,
+    "top_held_companies": """
+        SELECT c.name, c.ticker, COUNT(DISTINCT h.fund_id) AS funds, SUM(h.value) AS value
+        FROM holdings h JOIN companies c ON c.id = h.company_id
+        WHERE h.report_date BETWEEN :start AND :end
+        GROUP BY 1, 2
+        ORDER BY value DESC
+        LIMIT 20
+    """,
+    "put_call_ratio": """
+        SELECT c.name, c.ticker,
+               SUM(CASE WHEN d.derivative_type = 'PUT' THEN d.value ELSE 0 END) AS put_value,
+               SUM(CASE WHEN d.derivative_type = 'CALL' THEN d.value ELSE 0 END) AS call_value
+        FROM derivatives d JOIN companies c ON c.id = d.company_id
+        WHERE d.report_date BETWEEN :start AND :end
+        GROUP BY 1, 2
+        ORDER BY put_value DESC
+        LIMIT 20
+    """,
+}
+
+def benchmark(quarter=None, repeat=3):
+    """Compara el tiempo de las consultas representativas: SQLite (warehouse) vs DuckDB (Parquet)."""
+    from src.database.quarters import quarter_bounds
+
+    quarter = quarter or latest_quarter()
+    start, end = quarter_bounds(quarter)
+    print(f"Benchmark analítico para {quarter} (mejor de {repeat}):")
+    for name, sql in _SQLITE_EQUIVALENTS.items():
+        t_sqlite = min(_timed(lambda: pd.read_sql(sql, engine, params={"start": start, "end": end})) for _ in range(repeat))
+        t_duck = min(_timed(lambda: globals()[name](quarter)) for _ in range(repeat))
+        print(f"   {name:<20} SQLite {t_sqlite * 1000:8.1f} ms | DuckDB {t_duck * 1000:8.1f} ms | x{t_sqlite / max(t_duck, 1e-9):.1f}")
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
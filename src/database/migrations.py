@@ -0,0 +1,159 @@
+# src/database/migrations.py
+# Migración de bases de datos existentes a las llaves naturales únicas definidas en models.py.
+# Antes de crear cada índice único se eliminan los duplicados (se conserva la fila más antigua = MIN(id),
+# igual que hacía el parser al ignorar lo ya cargado).
+# También re-fecha las posiciones cargadas antes del manifiesto de ingesta (report_date = mtime del archivo)
+# al periodo del encabezado SEC, para que el parser no las vuelva a cargar duplicadas con la fecha nueva.
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import inspect, text, select, update, delete, func
+from .connection import engine
+from .models import (Base, Holding, DerivativePosition, StockPrice, Company, KeyExecutive, Fund, IngestManifest,
+                     FundQuarterSummary, FundSectorWeight, PositionChange)
+from .search import ensure_search_index
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DATA_RAW_PATH = BASE_DIR / "data" / "raw"
+
+# (Modelo, nombre del índice) -> columnas de la llave natural
+NATURAL_KEYS = [
+    (Holding, 'uq_holdings_fund_company_date'),
+    (DerivativePosition, 'uq_derivatives_fund_company_date_type'),
+    (StockPrice, 'uq_stock_prices_company_date'),
+    (KeyExecutive, 'uq_key_executives_company_name_role'),
+]
+
+def _index(model, name):
+    return next(ix for ix in model.__table__.indexes if ix.name == name)
+
+def _existing_indexes(conn, table_name):
+    return {ix['name'] for ix in inspect(conn).get_indexes(table_name)}
+
+def remove_duplicates(conn, model, columns):
+    """Borra las filas repetidas por llave natural y devuelve cuántas se eliminaron."""
+    table = model.__tablename__
+    keys = ", ".join(columns)
+    result = conn.execute(text(
+        f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {keys})"
+    ))
+    return result.rowcount
+
+def add_missing_columns(conn):
+    """Columnas nuevas de tablas ya existentes (ALTER TABLE ... ADD COLUMN con su valor por defecto)."""
+    added = []
+    existing = {c['name'] for c in inspect(conn).get_columns(IngestManifest.__tablename__)}
+    if 'status' not in existing:
+        conn.execute(text(f"ALTER TABLE {IngestManifest.__tablename__} ADD COLUMN status VARCHAR NOT NULL DEFAULT 'loaded'"))
+        added.append(f"{IngestManifest.__tablename__}.status")
+    return added
+
+def _legacy_filings(conn):
+    """
+    Reportes de data/raw sin entrada en el manifiesto (cargados, si acaso, por el parser anterior):
+    {(fund_id, fecha de modificación): {fechas de periodo}} y {fund_id: fechas de periodo conocidas}.
+    """
+    from src.etl.infotable import filing_report_date
+    funds = {cik: fid for cik, fid in conn.execute(select(Fund.cik, Fund.id))}
+    manifest = conn.execute(select(IngestManifest.accession, IngestManifest.fund_id, IngestManifest.report_date)).all()
+    loaded = {accession for accession, _, _ in manifest}
+    periods = defaultdict(set)
+    for _, fund_id, report_date in manifest:
+        if report_date is not None:
+            periods[fund_id].add(report_date)
+
+    legacy = defaultdict(set)
+    files = DATA_RAW_PATH.rglob("*.txt") if DATA_RAW_PATH.exists() else []
+    for path in files:
+        if path.parent.name in loaded: continue  # Ya con llave nueva (accession = carpeta del reporte)
+        cik = next((p.name for p in path.parents if p.name.isdigit() and len(p.name) > 4), None)
+        fund_id = cik and (funds.get(cik) or funds.get(cik.lstrip("0")))
+        if not fund_id: continue
+        period = filing_report_date(path)
+        periods[fund_id].add(period)
+        legacy[(fund_id, datetime.fromtimestamp(path.stat().st_mtime).date())].add(period)
+    return legacy, periods
+
+# MIGRACIONES DE DATOS DE UNA SOLA VEZ (registradas en schema_migrations: no se repiten en cada init_db)
+def _applied(conn):
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR PRIMARY KEY, applied_at VARCHAR NOT NULL)"))
+    return {name for (name,) in conn.execute(text("SELECT name FROM schema_migrations"))}
+
+def _mark_applied(conn, name):
+    conn.execute(text("INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :at)"),
+                 {"name": name, "at": datetime.utcnow().isoformat()})
+
+def rekey_report_dates(conn):
+    """
+    Mueve las posiciones guardadas con la fecha de modificación del archivo a la fecha de periodo.
+    Si varios reportes del fondo compartían esa fecha (quedaron mezclados) o el periodo ya tiene filas,
+    las filas viejas se borran y el parser las vuelve a cargar limpias. Idempotente.
+    Devuelve (filas re-fechadas, filas borradas, fondos afectados).
+    """
+    legacy, periods = _legacy_filings(conn)
+    moved = dropped = 0
+    funds = set()
+    for (fund_id, old_date), targets in sorted(legacy.items()):
+        if old_date in periods[fund_id]: continue  # La fecha "vieja" también es un periodo: esas filas están bien
+        for table in (Holding.__table__, DerivativePosition.__table__):
+            at_old = (table.c.fund_id == fund_id, table.c.report_date == old_date)
+            if not conn.scalar(select(func.count()).select_from(table).where(*at_old)): continue
+            funds.add(fund_id)
+            new_date = next(iter(targets))
+            taken = conn.scalar(select(func.count()).select_from(table).where(
+                table.c.fund_id == fund_id, table.c.report_date == new_date))
+            if len(targets) == 1 and not taken:
+                moved += conn.execute(update(table).where(*at_old).values(report_date=new_date)).rowcount
+            else:
+                dropped += conn.execute(delete(table).where(*at_old)).rowcount
+
+    # Resúmenes y cambios de esos fondos se recalculan desde cero en su próximo refresco (dirty_keys)
+    for model in (FundSectorWeight, FundQuarterSummary, PositionChange):
+        if funds:
+            conn.execute(delete(model).where(model.fund_id.in_(funds)))
+    return moved, dropped, funds
+
+def migrate():
+    """Idempotente: solo trabaja en los índices que todavía no existen."""
+    # Tablas nuevas (con sus índices) que una DB antigua todavía no tenga
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        for model, name in NATURAL_KEYS:
+            if name in _existing_indexes(conn, model.__tablename__): continue
+            index = _index(model, name)
+            columns = [c.name for c in index.columns]
+            removed = remove_duplicates(conn, model, columns)
+            index.create(bind=conn)
+            print(f"   {model.__tablename__}: {removed} duplicados eliminados, índice único {name} creado.")
+
+        ticker_index = next(ix for ix in Company.__table__.indexes if 'ticker' in ix.columns)
+        if ticker_index.name not in _existing_indexes(conn, Company.__tablename__):
+            ticker_index.create(bind=conn)
+            print(f"   companies: índice {ticker_index.name} creado.")
+
+        for column in add_missing_columns(conn):
+            print(f"   columna {column} añadida.")
+
+        moved = dropped = 0
+        if "rekey_report_dates" not in _applied(conn):
+            # Una DB sin posiciones no tiene nada que re-fechar: no hace falta leer data/raw
+            if conn.scalar(select(func.count()).select_from(Holding.__table__)) or \
+                    conn.scalar(select(func.count()).select_from(DerivativePosition.__table__)):
+                moved, dropped, funds = rekey_report_dates(conn)
+                print(f"   report_date: {moved} posiciones re-fechadas al periodo SEC y {dropped} borradas "
+                      f"(se recargan) en {len(funds)} fondos.")
+            _mark_applied(conn, "rekey_report_dates")
+
+        # Búsqueda por nombre (FTS5 + triggers; solo SQLite)
+        if ensure_search_index(conn):
+            print("   name_search: índice FTS5 creado y poblado.")
+
+    if moved or dropped:
+        from .query_service import bump_version
+        bump_version("migrations")  # Respuestas en caché construidas con filas que ya no existen
+
+if __name__ == "__main__":
+    print("Migrando esquema a llaves naturales únicas...")
+    migrate()
+    print("Migración completada.")
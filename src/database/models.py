@@ -1,5 +1,5 @@
 # src/database/models.py
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, ForeignKey, DateTime, Text, Boolean, Index
 from sqlalchemy.orm import DeclarativeBase, relationship
 from datetime import datetime
 
@@ -31,7 +31,7 @@ class Company(Base):
     
     # Identificadores
     name = Column(String, nullable=False)
-    ticker = Column(String, nullable=True) # Símbolo bursátil (TSLA)
+    ticker = Column(String, nullable=True, index=True) # Símbolo bursátil (TSLA). Indexado: búsquedas por ticker
     cusip = Column(String, unique=True, nullable=False) # ID Oficial
     cik = Column(String, nullable=True) # ID en la SEC (si logramos cruzarlo)
     
@@ -70,6 +70,10 @@ class Company(Base):
 # 3. HOLDINGS (Acciones Comunes)
 class Holding(Base):
     __tablename__ = 'holdings'
+    # Llave natural: un fondo declara UNA posición por empresa y trimestre
+    __table_args__ = (
+        Index('uq_holdings_fund_company_date', 'fund_id', 'company_id', 'report_date', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     fund_id = Column(Integer, ForeignKey('funds.id'), nullable=False)
@@ -84,6 +88,10 @@ class Holding(Base):
 # --- 4. PRECIOS (Series de Tiempo) ---
 class StockPrice(Base):
     __tablename__ = 'stock_prices'
+    # Llave natural: un cierre por empresa y día (también acelera el "último precio" por empresa)
+    __table_args__ = (
+        Index('uq_stock_prices_company_date', 'company_id', 'date', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
@@ -98,6 +106,10 @@ class StockPrice(Base):
 # Aquí detectamos si un fondo apuesta en contra o se cubre
 class DerivativePosition(Base):
     __tablename__ = 'derivatives'
+    # Llave natural: una posición PUT y/o una CALL por fondo, empresa y trimestre
+    __table_args__ = (
+        Index('uq_derivatives_fund_company_date_type', 'fund_id', 'company_id', 'report_date', 'derivative_type', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     fund_id = Column(Integer, ForeignKey('funds.id'), nullable=False)
@@ -130,6 +142,10 @@ class SupplyChainRelationship(Base):
 # 7. EJECUTIVOS Y JUNTA DIRECTIVA (El Grafo Humano)
 class KeyExecutive(Base):
     __tablename__ = 'key_executives'
+    # Llave natural: una persona con un cargo por empresa
+    __table_args__ = (
+        Index('uq_key_executives_company_name_role', 'company_id', 'name', 'role', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
@@ -138,4 +154,123 @@ class KeyExecutive(Base):
     role = Column(String, nullable=False) # Ej: "CEO", "CFO", "Board Member"
     is_insider = Column(Boolean, default=False) # ¿Es considerado 'Insider' por la SEC?
     
-    company = relationship("Company", back_populates="key_people")
\ No newline at end of file
+    company = relationship("Company", back_populates="key_people")
+
+# 8. MANIFIESTO DE INGESTA (Carga Incremental)
+# Un registro por reporte 13F ya cargado. Permite saltar lo que no cambió sin abrir el archivo.
+class IngestManifest(Base):
+    __tablename__ = 'ingest_manifest'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    accession = Column(String, unique=True, nullable=False) # Ej: 0001364742-25-000123
+    fund_id = Column(Integer, ForeignKey('funds.id'), nullable=False)
+    report_date = Column(Date, nullable=True)
+
+    # Huella del archivo
+    file_path = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    file_mtime_ns = Column(BigInteger, nullable=False)
+    content_hash = Column(String, nullable=False) # SHA-256
+
+    # Resultado de la carga ('loaded' o 'failed': XML corrupto, se salta mientras el hash no cambie)
+    status = Column(String, nullable=False, default='loaded', server_default='loaded')
+    stock_rows = Column(Integer, default=0)
+    derivative_rows = Column(Integer, default=0)
+    loaded_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<IngestManifest(accession='{self.accession}', status='{self.status}', rows={self.stock_rows}+{self.derivative_rows})>"
+
+# 9. RESUMEN DE CARTERA (Tabla Materializada por Fondo y Trimestre)
+# Se recalcula de forma incremental: solo los (fondo, trimestre) que tocó la última ingesta.
+class FundQuarterSummary(Base):
+    __tablename__ = 'fund_quarter_summary'
+
+    fund_id = Column(Integer, ForeignKey('funds.id'), primary_key=True)
+    quarter = Column(String, primary_key=True) # Ej: 2025Q3
+    report_date = Column(Date, nullable=False)
+
+    aum = Column(Float, nullable=False)             # Suma del valor de las posiciones (USD)
+    positions = Column(Integer, nullable=False)     # Número de empresas en cartera
+    top10_value = Column(Float, nullable=False)
+    top10_concentration = Column(Float, nullable=False) # top10_value / aum
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<FundQuarterSummary(fund_id={self.fund_id}, quarter='{self.quarter}', aum={self.aum:,.0f})>"
+
+# 10. PESOS POR SECTOR (Tabla Materializada por Fondo, Trimestre y Sector)
+class FundSectorWeight(Base):
+    __tablename__ = 'fund_quarter_sectors'
+
+    fund_id = Column(Integer, ForeignKey('funds.id'), primary_key=True)
+    quarter = Column(String, primary_key=True)
+    sector = Column(String, primary_key=True) # 'Unknown' si la empresa no tiene sector
+
+    value = Column(Float, nullable=False)
+    weight = Column(Float, nullable=False)    # value / aum del fondo en ese trimestre
+    positions = Column(Integer, nullable=False)
+
+# 11. CAMBIOS DE POSICIÓN (Trimestre contra Trimestre)
+# Qué compró y vendió cada fondo respecto a su reporte del trimestre anterior.
+# Solo se guardan posiciones que cambiaron; "top compras del trimestre" es un recorrido del índice.
+class PositionChange(Base):
+    __tablename__ = 'position_changes'
+    __table_args__ = (
+        Index('ix_position_changes_quarter_value', 'quarter', 'value_change'),
+    )
+
+    fund_id = Column(Integer, ForeignKey('funds.id'), primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id'), primary_key=True)
+    quarter = Column(String, primary_key=True) # Trimestre del reporte nuevo, ej: 2025Q3
+
+    change_type = Column(String, nullable=False) # 'new', 'add', 'trim' o 'exit'
+    prev_shares = Column(Float, nullable=False)  # 0 si es 'new'
+    shares = Column(Float, nullable=False)       # 0 si es 'exit'
+    share_change = Column(Float, nullable=False)
+    prev_value = Column(Float, nullable=False)
+    value = Column(Float, nullable=False)
+    value_change = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PositionChange(fund_id={self.fund_id}, company_id={self.company_id}, quarter='{self.quarter}', {self.change_type})>"
+
+# 12. DECISIONES DE MAPEO (Nombre 13F -> Ticker oficial de la SEC)
+# Una fila por empresa ya evaluada: el matcher nunca vuelve a calcularla.
+# method: 'exact', 'fuzzy', 'manual' o 'none' (sin match; se reintenta solo con un snapshot SEC más nuevo).
+class TickerMatch(Base):
+    __tablename__ = 'ticker_matches'
+
+    company_id = Column(Integer, ForeignKey('companies.id'), primary_key=True)
+    method = Column(String, nullable=False)
+    score = Column(Float, nullable=False)       # Jaccard de trigramas (1.0 en exact/manual, mejor candidato en 'none')
+    sec_name = Column(String, nullable=True)    # Título SEC normalizado del candidato elegido
+    ticker = Column(String, nullable=True)
+    cik = Column(String, nullable=True)
+    ref_version = Column(Integer, nullable=True) # Versión del snapshot company_tickers.json usado
+    decided_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<TickerMatch(company_id={self.company_id}, method='{self.method}', ticker='{self.ticker}')>"
+
+# 13. FONDOS MÁS PARECIDOS (Overlap Matrix)
+# Top-k vecinos de cada fondo por trimestre y por métrica, precalculados sobre carteras ponderadas por valor.
+# metric: 'cosine', 'jaccard' o 'weight_overlap'; cada fila guarda también las otras dos métricas del par.
+class FundSimilarity(Base):
+    __tablename__ = 'fund_similarity'
+
+    fund_id = Column(Integer, ForeignKey('funds.id'), primary_key=True)
+    quarter = Column(String, primary_key=True)  # Ej: 2025Q3
+    metric = Column(String, primary_key=True)
+    rank = Column(Integer, primary_key=True)    # 1 = el más parecido
+
+    other_fund_id = Column(Integer, ForeignKey('funds.id'), nullable=False)
+    cosine = Column(Float, nullable=False)          # Coseno entre vectores de pesos
+    jaccard = Column(Float, nullable=False)         # |A ∩ B| / |A ∪ B| por empresa
+    weight_overlap = Column(Float, nullable=False)  # Σ min(peso_a, peso_b): 1.0 = carteras idénticas
+    common_positions = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<FundSimilarity(fund_id={self.fund_id}, quarter='{self.quarter}', {self.metric} #{self.rank} -> {self.other_fund_id})>"
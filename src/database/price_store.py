@@ -0,0 +1,295 @@
+# src/database/price_store.py
+# Almacén de precios en matrices densas (fechas x empresas), float32 y memory-mapped.
+# Compañero de la tabla 'stock_prices': la tabla sigue siendo la fuente de verdad,
+# y aquí se guarda la misma información alineada por fecha para cálculos vectorizados:
+#   data/processed/prices/close.f32    (n_días x capacidad_columnas, NaN = sin precio)
+#   data/processed/prices/volume.f32
+#   data/processed/prices/dates.npy    (datetime64[D], ordenadas)
+#   data/processed/prices/company_ids.npy  (columna -> company_id)
+#   data/processed/prices/checksums.npy  (columna -> filas, Σ cierres y Σ volúmenes de 'stock_prices' ya copiados)
+#   data/processed/prices/meta.json
+# Días nuevos -> se añaden filas al final del archivo. Empresas nuevas -> columnas libres (reserva).
+# Filas que llegan tarde, se borran o se corrigen (fecha ya guardada) -> la suma de control de la empresa
+# no cuadra con la tabla y su columna se reescribe.
+#
+#   from src.database.price_store import price_window, returns, correlation
+#   dates, tickers, close = price_window(["AAPL", "MSFT"], "2024-01-01", "2024-12-31")
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, cast, BigInteger
+from sqlalchemy.orm import Session
+from src.database.connection import engine, get_db
+from src.database.models import Company, StockPrice
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+STORE_DIR = BASE_DIR / "data" / "processed" / "prices"
+
+STORE_VERSION = 3
+FIELDS = ("close", "volume")
+COLUMN_BLOCK = 256  # Las columnas se reservan en bloques: empresas nuevas no obligan a reescribir
+IN_CHUNK = 500      # company_ids por cláusula IN (límite de variables de SQLite)
+PRICE_SCALE = 10_000  # Cierres a enteros (1/10000 de dólar) para sumas de control exactas en SQL
+
+class PriceMatrix(NamedTuple):
+    """Vista del almacén: arrays memory-mapped (solo lectura), sin copiar."""
+    dates: np.ndarray        # (n_días,) datetime64[D]
+    company_ids: np.ndarray  # (n_columnas,) int64
+    close: np.ndarray        # (n_días, n_columnas) float32
+    volume: np.ndarray       # (n_días, n_columnas) float32
+
+    def column_of(self, company_ids):
+        """company_id -> índice de columna (-1 si la empresa no está en el almacén)."""
+        ids = np.asarray(company_ids, dtype=np.int64)
+        if len(self.company_ids) == 0: return np.full(len(ids), -1)
+        order = np.argsort(self.company_ids)
+        cols = order[np.minimum(np.searchsorted(self.company_ids, ids, sorter=order), len(order) - 1)]
+        return np.where(self.company_ids[cols] == ids, cols, -1)
+
+    def rows_between(self, start=None, end=None):
+        """slice de filas para un rango de fechas (incluyente): una vista, no una copia."""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "D"), side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "D"), side="right"))
+        return slice(lo, hi)
+
+def _read_meta():
+    try:
+        with open(STORE_DIR / "meta.json", "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == STORE_VERSION else None
+
+def _write_meta(meta, directory=STORE_DIR):
+    tmp = directory / "meta.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, directory / "meta.json")
+
+def _capacity(n_cols):
+    """Columnas ocupadas + al menos un bloque libre, redondeado a bloques."""
+    return (n_cols // COLUMN_BLOCK + 2) * COLUMN_BLOCK
+
+def _memmap(field, n_days, capacity, mode="r", directory=STORE_DIR):
+    return np.memmap(directory / f"{field}.f32", dtype=np.float32, mode=mode, shape=(n_days, capacity))
+
+def open_store():
+    """PriceMatrix con los archivos memory-mapped, o None si el almacén no existe."""
+    meta = _read_meta()
+    if meta is None or meta["n_days"] == 0: return None
+    n_days, n_cols, capacity = meta["n_days"], meta["n_cols"], meta["capacity"]
+    dates = np.load(STORE_DIR / "dates.npy", mmap_mode="r")
+    company_ids = np.load(STORE_DIR / "company_ids.npy")
+    fields = [_memmap(field, n_days, capacity)[:, :n_cols] for field in FIELDS]
+    return PriceMatrix(dates, company_ids, *fields)
+
+def _columns(company_ids, ids):
+    """Columna de cada company_id de ids (todos presentes en company_ids, que puede no estar ordenado)."""
+    order = np.argsort(company_ids)
+    return order[np.searchsorted(company_ids, ids, sorter=order)]
+
+def _pivot(df, dates, company_ids):
+    """Filas (company_id, date, close_price, volume) -> matrices float32 alineadas (NaN donde no hay dato)."""
+    rows = np.searchsorted(dates, df["date"].to_numpy(dtype="datetime64[D]"))
+    cols = _columns(company_ids, df["company_id"].to_numpy(dtype=np.int64))
+    out = []
+    for src in ("close_price", "volume"):
+        m = np.full((len(dates), len(company_ids)), np.nan, dtype=np.float32)
+        m[rows, cols] = df[src].to_numpy(dtype=np.float32, na_value=np.nan)
+        out.append(m)
+    return out
+
+def _read_prices(conn, since=None, until=None, company_ids=None):
+    """Filas de 'stock_prices' con since < date <= until, opcionalmente solo de esas empresas."""
+    stmt = select(StockPrice.company_id, StockPrice.date, StockPrice.close_price, StockPrice.volume)
+    if since is not None:
+        stmt = stmt.where(StockPrice.date > since)
+    if until is not None:
+        stmt = stmt.where(StockPrice.date <= until)
+    if company_ids is None:
+        df = pd.read_sql(stmt, conn)
+    else:
+        ids = list(company_ids)
+        df = pd.concat([pd.read_sql(stmt.where(StockPrice.company_id.in_(ids[i:i + IN_CHUNK])), conn)
+                        for i in range(0, len(ids), IN_CHUNK)], ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+def _checksums(conn, company_ids, last):
+    """
+    Sumas de control por empresa en UNA pasada: (hasta last, después de last), cada una (n_columnas, 3) int64
+    con filas, Σ round(cierre * PRICE_SCALE) y Σ round(volumen). Enteros: exactas y sin depender del orden,
+    así una corrección de un cierre ya guardado también cambia la suma.
+    """
+    old = (StockPrice.date <= last).label("old")
+    stmt = (select(StockPrice.company_id, old, func.count(),
+                   func.coalesce(func.sum(cast(func.round(StockPrice.close_price * PRICE_SCALE), BigInteger)), 0),
+                   func.coalesce(func.sum(cast(func.round(StockPrice.volume), BigInteger)), 0))
+            .group_by(StockPrice.company_id, old))
+    sums = {(cid, bool(is_old)): values for cid, is_old, *values in conn.execute(stmt)}
+    return tuple(np.array([sums.get((cid, part), (0, 0, 0)) for cid in company_ids.tolist()], dtype=np.int64)
+                 .reshape(len(company_ids), 3) for part in (True, False))
+
+def rebuild():
+    """Reconstruye el almacén completo desde 'stock_prices' (directorio temporal + rename)."""
+    with engine.connect() as conn:
+        df = _read_prices(conn)
+        dates = np.unique(df["date"].to_numpy(dtype="datetime64[D]"))
+        company_ids = np.unique(df["company_id"].to_numpy(dtype=np.int64))
+        # Después de leer: una fila que entre en medio queda en la suma pero no en el almacén -> se relee luego
+        checksums = sum(_checksums(conn, company_ids, dates[-1].astype(object))) if len(dates) else np.zeros((0, 3), np.int64)
+    capacity = _capacity(len(company_ids))
+
+    tmp_dir = STORE_DIR.with_name(f".prices.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for field, matrix in zip(FIELDS, _pivot(df, dates, company_ids)):
+        full = np.full((len(dates), capacity), np.nan, dtype=np.float32)
+        full[:, :len(company_ids)] = matrix
+        full.tofile(tmp_dir / f"{field}.f32")
+    np.save(tmp_dir / "dates.npy", dates)
+    np.save(tmp_dir / "company_ids.npy", company_ids)
+    np.save(tmp_dir / "checksums.npy", checksums)
+    _write_meta({"version": STORE_VERSION, "n_days": len(dates), "n_cols": len(company_ids),
+                 "capacity": capacity}, tmp_dir)
+
+    old_dir = None
+    if STORE_DIR.exists():
+        old_dir = STORE_DIR.with_name(f".prices.old-{os.getpid()}")
+        os.replace(STORE_DIR, old_dir)
+    os.replace(tmp_dir, STORE_DIR)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"   Almacén de precios: {len(dates)} días x {len(company_ids)} empresas (reconstruido).")
+    return len(df)
+
+def sync_store():
+    """
+    Lleva al almacén lo nuevo de 'stock_prices' sin reescribirlo:
+    - Días posteriores al último guardado -> filas añadidas al final de los archivos.
+    - Empresas nuevas -> ocupan columnas libres de la reserva.
+    - Empresas cuya suma de control hasta el último día no cuadra con la guardada (filas tardías,
+      borradas o corregidas) -> su columna se reescribe en su sitio (memmap r+).
+    Si una empresa nueva trae historia anterior, una fila tardía cae en un día que el almacén no tiene,
+    o se acaba la reserva, se reconstruye.
+    """
+    meta = _read_meta()
+    if meta is None or meta["n_days"] == 0:
+        return rebuild()
+
+    dates = np.load(STORE_DIR / "dates.npy")
+    company_ids = np.load(STORE_DIR / "company_ids.npy")
+    checksums = np.load(STORE_DIR / "checksums.npy")
+    last = dates[-1].astype(object)
+
+    with engine.connect() as conn:
+        known = set(company_ids.tolist())
+        # Empresas con precios que aún no tienen columna: ¿tienen historia anterior al último día?
+        db_ids = {cid for (cid,) in conn.execute(select(StockPrice.company_id).distinct())}
+        new_ids = sorted(db_ids - known)
+        if new_ids:
+            first_new = conn.execute(select(func.min(StockPrice.date)).where(StockPrice.company_id.in_(new_ids))).scalar()
+            if first_new <= last or meta["n_cols"] + len(new_ids) > meta["capacity"]:
+                return rebuild()
+        # Sumas antes de leer: una fila que entre en medio solo hace que se relea la próxima vez
+        all_ids = np.concatenate([company_ids, np.array(new_ids, dtype=np.int64)])
+        table_old, table_new = _checksums(conn, all_ids, last)
+        stale = np.flatnonzero((table_old[:len(company_ids)] != checksums).any(axis=1))
+        late = _read_prices(conn, until=last, company_ids=company_ids[stale].tolist()) if len(stale) else None
+        df = _read_prices(conn, since=last)
+
+    if late is not None:
+        if not np.isin(late["date"].to_numpy(dtype="datetime64[D]"), dates).all():
+            return rebuild()  # Días intermedios que el almacén no tiene: no se pueden insertar filas en medio
+        for field, matrix in zip(FIELDS, _pivot(late, dates, company_ids[stale])):
+            stored = _memmap(field, len(dates), meta["capacity"], mode="r+")
+            stored[:, stale] = matrix  # Columna completa: también desaparecen las filas borradas
+            stored.flush()
+            del stored
+
+    if df.empty and late is None: return 0
+
+    company_ids = np.concatenate([company_ids, np.array(new_ids, dtype=np.int64)])
+    new_dates = np.unique(df["date"].to_numpy(dtype="datetime64[D]"))
+    capacity = meta["capacity"]
+    for field, matrix in zip(FIELDS, _pivot(df, new_dates, company_ids)):
+        block = np.full((len(new_dates), capacity), np.nan, dtype=np.float32)
+        block[:, :len(company_ids)] = matrix
+        with open(STORE_DIR / f"{field}.f32", "ab") as f:
+            block.tofile(f)
+    checksums = table_old + table_new  # Todo lo copiado, hasta el nuevo último día
+
+    # Primero los datos, luego los índices y al final meta.json: un lector nunca ve más filas de las escritas
+    _save_atomic(STORE_DIR / "dates.npy", np.concatenate([dates, new_dates]))
+    _save_atomic(STORE_DIR / "company_ids.npy", company_ids)
+    _save_atomic(STORE_DIR / "checksums.npy", checksums)
+    _write_meta({**meta, "n_days": len(dates) + len(new_dates), "n_cols": len(company_ids)})
+    print(f"   Almacén de precios: +{len(new_dates)} días, +{len(new_ids)} empresas, "
+          f"{len(stale)} empresas con filas tardías o corregidas reescritas.")
+    return len(df) + (0 if late is None else len(late))
+
+def _save_atomic(path, arr):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+# LECTURA
+def company_ids_for(db: Session, tickers):
+    """Tickers -> company_ids (en el mismo orden; -1 si el ticker no existe)."""
+    mapping = dict(db.query(Company.ticker, Company.id).filter(Company.ticker.in_(list(tickers))))
+    return np.array([mapping.get(t, -1) for t in tickers], dtype=np.int64)
+
+def price_window(tickers=None, start=None, end=None, field="close", store=None):
+    """
+    (fechas, tickers, matriz) para un conjunto de tickers y un rango de fechas.
+    El rango de fechas es una vista del memory-map; elegir columnas copia solo las pedidas.
+    tickers=None -> todas las empresas (vista sin copia, columnas en el orden de store.company_ids).
+    """
+    store = store or open_store()
+    if store is None:
+        raise FileNotFoundError(f"No existe el almacén de precios en {STORE_DIR}. Ejecuta: python -m src.database.price_store --rebuild")
+    rows = store.rows_between(start, end)
+    matrix = getattr(store, field)[rows]
+    if tickers is None:
+        return store.dates[rows], None, matrix
+
+    tickers = list(tickers)
+    db = next(get_db())
+    try:
+        cols = store.column_of(company_ids_for(db, tickers))
+    finally:
+        db.close()
+    keep = cols >= 0
+    return store.dates[rows], [t for t, k in zip(tickers, keep) if k], matrix[:, cols[keep]]
+
+def returns(prices, log=False):
+    """Rendimientos diarios por columna (float32; NaN donde falta algún precio)."""
+    prices = np.asarray(prices, dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if log:
+            return np.diff(np.log(prices), axis=0)
+        return prices[1:] / prices[:-1] - 1.0
+
+def portfolio_returns(prices, weights):
+    """Rendimiento diario de una cartera con pesos fijos (días sin precio cuentan como 0)."""
+    r = np.nan_to_num(returns(prices))
+    return r @ np.asarray(weights, dtype=np.float32)
+
+def correlation(tickers, start=None, end=None):
+    """Matriz de correlación de rendimientos diarios (solo días con precio para todos los tickers)."""
+    _, found, close = price_window(tickers, start, end)
+    r = returns(close)
+    r = r[~np.isnan(r).any(axis=1)]
+    return found, np.corrcoef(r, rowvar=False)
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        rebuild()
+    else:
+        sync_store()
@@ -0,0 +1,24 @@
+# src/database/quarters.py
+# Utilidades de trimestre (la unidad de tiempo de los 13F): '2025Q3' <-> rango de fechas.
+from datetime import date, timedelta
+
+def quarter_of(d):
+    """date(2025, 9, 30) -> '2025Q3'"""
+    return f"{d.year}Q{(d.month - 1) // 3 + 1}"
+
+def quarter_bounds(quarter):
+    """'2025Q3' -> (date(2025, 7, 1), date(2025, 9, 30))"""
+    year, q = int(quarter[:4]), int(quarter[-1])
+    start = date(year, 3 * (q - 1) + 1, 1)
+    end = date(year + (q == 4), (3 * q) % 12 + 1, 1) - timedelta(days=1)
+    return start, end
+
+def previous_quarter(quarter):
+    """'2025Q1' -> '2024Q4'"""
+    year, q = int(quarter[:4]), int(quarter[-1])
+    return f"{year - 1}Q4" if q == 1 else f"{year}Q{q - 1}"
+
+def next_quarter(quarter):
+    """'2024Q4' -> '2025Q1'"""
+    year, q = int(quarter[:4]), int(quarter[-1])
+    return f"{year + 1}Q1" if q == 4 else f"{year}Q{q + 1}"
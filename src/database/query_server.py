@@ -0,0 +1,91 @@
+# src/database/query_server.py
+# Endpoint HTTP local (solo librería estándar) sobre src/database/query_service.py.
+# Respuestas JSON, mismas operaciones y misma caché que el módulo:
+#   GET /fund_holdings?fund_id=7&as_of=2025-09-30&limit=50
+#   GET /top_holders?ticker=AAPL&as_of=2025-09-30&limit=10
+#   GET /put_call_exposure?ticker=TSLA
+#   GET /fund_overlap?fund_a=1&fund_b=2
+#   GET /search?q=appl&kind=company&limit=5
+#   GET /version
+#
+#   python -m src.database.query_server --port 8765
+# Para pruebas: start_stub_server() levanta el servidor en un puerto libre dentro de un hilo.
+import argparse
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from src.database import query_service as qs
+
+# Parámetros permitidos por operación -> conversión desde el query string
+PARAMS = {
+    "fund_holdings": {"fund_id": int, "as_of": str, "limit": int},
+    "top_holders": {"ticker": str, "as_of": str, "limit": int},
+    "put_call_exposure": {"ticker": str, "as_of": str},
+    "fund_overlap": {"fund_a": int, "fund_b": int, "as_of": str, "limit": int},
+    "similar_funds": {"fund_id": int, "quarter": str, "metric": str, "limit": int},
+    "search": {"q": str, "kind": str, "limit": int},
+}
+
+def to_json(value):
+    """NamedTuples -> dicts, tuplas -> listas, fechas -> ISO."""
+    if hasattr(value, "_asdict"):
+        return {k: to_json(v) for k, v in value._asdict().items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = url.path.strip("/")
+        if name == "version":
+            return self._send(200, qs.cache_stats())
+        if name not in qs.OPERATIONS:
+            return self._send(404, {"error": f"Operación desconocida: '{name}'", "operations": sorted(qs.OPERATIONS)})
+
+        query = parse_qs(url.query)
+        try:
+            args = {k: PARAMS[name][k](v[-1]) for k, v in query.items() if k in PARAMS[name]}
+            result = qs.OPERATIONS[name](**args)
+        except (TypeError, ValueError) as e:
+            return self._send(400, {"error": str(e)})
+        except KeyError as e:
+            return self._send(404, {"error": str(e.args[0]) if e.args else str(e)})
+        self._send(200, {"version": qs.current_version(), "result": to_json(result)})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Sin ruido en consola por cada petición
+
+def make_server(host="127.0.0.1", port=8765):
+    return ThreadingHTTPServer((host, port), QueryHandler)
+
+def start_stub_server(host="127.0.0.1", port=0):
+    """Servidor en segundo plano (port=0 -> puerto libre). Devuelve (servidor, url_base); cerrar con server.shutdown()."""
+    server = make_server(host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="API de lectura del warehouse para el agente")
+    cli.add_argument("--host", default="127.0.0.1")
+    cli.add_argument("--port", type=int, default=8765)
+    args = cli.parse_args()
+    server = make_server(args.host, args.port)
+    print(f"Sirviendo consultas en http://{args.host}:{args.port} (versión del warehouse: {qs.current_version()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
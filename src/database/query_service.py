@@ -0,0 +1,303 @@
+# src/database/query_service.py
+# Servicio de lectura para el agente financiero (el "cerebro" del README).
+# Operaciones tipadas sobre el warehouse con caché LRU + TTL en memoria.
+# La llave de la caché incluye la VERSIÓN del warehouse: cada corrida del pipeline la incrementa
+# (bump_version) y las respuestas viejas dejan de coincidir sin necesidad de vaciar nada.
+#
+#   from src.database import query_service as qs
+#   qs.top_holders("AAPL", as_of="2025-09-30", limit=10)
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import NamedTuple, Optional
+from sqlalchemy import select, func, and_
+from src.database.connection import SessionLocal
+from src.database.models import Fund, Company, Holding, DerivativePosition, FundSimilarity
+from src.database.search import search
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+VERSION_FILE = BASE_DIR / "data" / "warehouse_version.json"
+
+CACHE_SIZE = 1024   # Respuestas en memoria (LRU)
+CACHE_TTL = 300.0   # Segundos: red de seguridad si alguien escribe sin incrementar la versión
+
+# TIPOS DE RESPUESTA (inmutables: se pueden compartir desde la caché)
+class HoldingRow(NamedTuple):
+    company_id: int
+    ticker: Optional[str]
+    name: str
+    cusip: str
+    shares: float
+    value: float
+    weight: float
+
+class FundHoldings(NamedTuple):
+    fund_id: int
+    fund_name: str
+    report_date: Optional[date]
+    aum: float
+    holdings: tuple  # de HoldingRow, mayor valor primero
+
+class HolderRow(NamedTuple):
+    fund_id: int
+    fund_name: str
+    report_date: date
+    shares: float
+    value: float
+
+class PutCallRow(NamedTuple):
+    fund_id: int
+    fund_name: str
+    report_date: date
+    put_value: float
+    call_value: float
+
+class PutCallExposure(NamedTuple):
+    ticker: str
+    put_value: float
+    call_value: float
+    put_call_ratio: Optional[float]  # None si no hay calls
+    funds: tuple  # de PutCallRow
+
+class FundOverlap(NamedTuple):
+    fund_a: int
+    fund_b: int
+    common_positions: int
+    jaccard: float          # |A ∩ B| / |A ∪ B| por empresa
+    weight_overlap: float   # Σ min(peso_a, peso_b): 1.0 = carteras idénticas
+    common: tuple           # de (company_id, ticker, peso_a, peso_b), mayor solapamiento primero
+
+class SimilarFund(NamedTuple):
+    rank: int
+    fund_id: int
+    fund_name: str
+    cosine: float
+    jaccard: float
+    weight_overlap: float
+    common_positions: int
+
+class FundNeighbors(NamedTuple):
+    fund_id: int
+    quarter: Optional[str]  # None si el fondo no tiene similitudes calculadas
+    metric: str
+    funds: tuple  # de SimilarFund, más parecido primero
+
+# VERSIÓN DEL WAREHOUSE
+# Archivo pequeño junto a la DB: comprobarlo cuesta un stat() (microsegundos), no una consulta.
+_version_lock = threading.Lock()
+_version_cache = [None, 0]  # [(mtime_ns, size), versión]
+
+def current_version():
+    """Versión actual del warehouse (0 si nunca se incrementó)."""
+    try:
+        st = os.stat(VERSION_FILE)
+    except FileNotFoundError:
+        return 0
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _version_cache[0] != stamp:
+        with _version_lock:
+            try:
+                with open(VERSION_FILE, "r") as f:
+                    _version_cache[1] = int(json.load(f)["version"])
+            except (OSError, ValueError, KeyError):
+                _version_cache[1] = 0
+            _version_cache[0] = stamp
+    return _version_cache[1]
+
+def bump_version(reason=""):
+    """Incrementa la versión (al final de cada etapa que escribe en el warehouse)."""
+    VERSION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    version = current_version() + 1
+    tmp = VERSION_FILE.with_name(f".{VERSION_FILE.name}.tmp-{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump({"version": version, "reason": reason, "bumped_at": time.time()}, f)
+    os.replace(tmp, VERSION_FILE)
+    return version
+
+# CACHÉ LRU + TTL
+class _Cache:
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+CACHE = _Cache()
+
+def cached(fn):
+    """Memoriza fn(*args) bajo (versión del warehouse, nombre, args). Los args deben ser hashables."""
+    def wrapper(*args, **kwargs):
+        key = (current_version(), fn.__name__, args, tuple(sorted(kwargs.items())))
+        result = CACHE.get(key)
+        if result is None:
+            result = fn(*args, **kwargs)
+            CACHE.put(key, result)
+        return result
+    wrapper.__name__, wrapper.__doc__, wrapper.uncached = fn.__name__, fn.__doc__, fn
+    return wrapper
+
+def _as_date(value):
+    if value is None: return date.today()
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def _latest_dates(as_of):
+    """Subconsulta: último report_date <= as_of de cada fondo."""
+    return (select(Holding.fund_id, func.max(Holding.report_date).label("report_date"))
+            .where(Holding.report_date <= as_of)
+            .group_by(Holding.fund_id)
+            .subquery())
+
+def _company_by_ticker(db, ticker):
+    return db.execute(select(Company.id, Company.ticker).where(Company.ticker == ticker.upper())).first()
+
+# OPERACIONES
+@cached
+def fund_holdings(fund_id, as_of=None, limit=None):
+    """Cartera de un fondo en su último reporte hasta as_of (por defecto hoy)."""
+    as_of = _as_date(as_of)
+    with SessionLocal() as db:
+        fund_name = db.scalar(select(Fund.name).where(Fund.id == fund_id))
+        if fund_name is None:
+            raise KeyError(f"Fondo {fund_id} no existe")
+        report_date = db.scalar(select(func.max(Holding.report_date))
+                                .where(Holding.fund_id == fund_id, Holding.report_date <= as_of))
+        if report_date is None:
+            return FundHoldings(fund_id, fund_name, None, 0.0, ())
+
+        stmt = (select(Company.id, Company.ticker, Company.name, Company.cusip, Holding.shares, Holding.value)
+                .join(Company, Company.id == Holding.company_id)
+                .where(Holding.fund_id == fund_id, Holding.report_date == report_date)
+                .order_by(Holding.value.desc()))
+        rows = db.execute(stmt).all()
+
+    aum = sum(r.value for r in rows)
+    rows = rows[:limit] if limit else rows
+    holdings = tuple(HoldingRow(*r, weight=r.value / aum if aum else 0.0) for r in rows)
+    return FundHoldings(fund_id, fund_name, report_date, aum, holdings)
+
+@cached
+def top_holders(ticker, as_of=None, limit=20):
+    """Fondos con mayor posición en un ticker (último reporte de cada fondo hasta as_of)."""
+    as_of = _as_date(as_of)
+    with SessionLocal() as db:
+        company = _company_by_ticker(db, ticker)
+        if company is None: return ()
+        latest = _latest_dates(as_of)
+        stmt = (select(Fund.id, Fund.name, Holding.report_date, Holding.shares, Holding.value)
+                .join(latest, and_(latest.c.fund_id == Holding.fund_id, latest.c.report_date == Holding.report_date))
+                .join(Fund, Fund.id == Holding.fund_id)
+                .where(Holding.company_id == company.id)
+                .order_by(Holding.value.desc())
+                .limit(limit))
+        return tuple(HolderRow(*r) for r in db.execute(stmt))
+
+@cached
+def put_call_exposure(ticker, as_of=None):
+    """Valor nocional en PUTs y CALLs sobre una empresa, por fondo y total."""
+    as_of = _as_date(as_of)
+    with SessionLocal() as db:
+        company = _company_by_ticker(db, ticker)
+        if company is None:
+            return PutCallExposure(ticker.upper(), 0.0, 0.0, None, ())
+        latest = (select(DerivativePosition.fund_id, func.max(DerivativePosition.report_date).label("report_date"))
+                  .where(DerivativePosition.report_date <= as_of, DerivativePosition.company_id == company.id)
+                  .group_by(DerivativePosition.fund_id)
+                  .subquery())
+        stmt = (select(Fund.id, Fund.name, DerivativePosition.report_date,
+                       func.sum(DerivativePosition.value).filter(DerivativePosition.derivative_type == "PUT"),
+                       func.sum(DerivativePosition.value).filter(DerivativePosition.derivative_type == "CALL"))
+                .join(latest, and_(latest.c.fund_id == DerivativePosition.fund_id,
+                                   latest.c.report_date == DerivativePosition.report_date))
+                .join(Fund, Fund.id == DerivativePosition.fund_id)
+                .where(DerivativePosition.company_id == company.id)
+                .group_by(Fund.id, Fund.name, DerivativePosition.report_date))
+        funds = tuple(PutCallRow(fid, name, d, puts or 0.0, calls or 0.0) for fid, name, d, puts, calls in db.execute(stmt))
+
+    puts = sum(f.put_value for f in funds)
+    calls = sum(f.call_value for f in funds)
+    funds = tuple(sorted(funds, key=lambda f: f.put_value + f.call_value, reverse=True))
+    return PutCallExposure(company.ticker, puts, calls, puts / calls if calls else None, funds)
+
+@cached
+def fund_overlap(fund_a, fund_b, as_of=None, limit=20):
+    """Solapamiento entre dos carteras (por empresa y por peso)."""
+    a = fund_holdings(fund_a, as_of)
+    b = fund_holdings(fund_b, as_of)
+    weights_a = {h.company_id: (h.ticker, h.weight) for h in a.holdings}
+    weights_b = {h.company_id: h.weight for h in b.holdings}
+
+    common_ids = weights_a.keys() & weights_b.keys()
+    union = len(weights_a.keys() | weights_b.keys())
+    common = sorted(((cid, weights_a[cid][0], weights_a[cid][1], weights_b[cid]) for cid in common_ids),
+                    key=lambda c: min(c[2], c[3]), reverse=True)
+    return FundOverlap(
+        fund_a, fund_b, len(common_ids),
+        len(common_ids) / union if union else 0.0,
+        sum(min(wa, wb) for _, _, wa, wb in common),
+        tuple(common[:limit] if limit else common),
+    )
+
+@cached
+def similar_funds(fund_id, quarter=None, metric="weight_overlap", limit=10):
+    """Fondos más parecidos (precalculados en fund_similarity); quarter por defecto = el último calculado."""
+    if metric not in ("cosine", "jaccard", "weight_overlap"):
+        raise ValueError(f"Métrica desconocida: '{metric}'")
+    with SessionLocal() as db:
+        if quarter is None:
+            quarter = db.scalar(select(func.max(FundSimilarity.quarter)).where(FundSimilarity.fund_id == fund_id))
+        stmt = (select(FundSimilarity.rank, Fund.id, Fund.name, FundSimilarity.cosine, FundSimilarity.jaccard,
+                       FundSimilarity.weight_overlap, FundSimilarity.common_positions)
+                .join(Fund, Fund.id == FundSimilarity.other_fund_id)
+                .where(FundSimilarity.fund_id == fund_id, FundSimilarity.quarter == quarter,
+                       FundSimilarity.metric == metric)
+                .order_by(FundSimilarity.rank)
+                .limit(limit))
+        return FundNeighbors(fund_id, quarter, metric, tuple(SimilarFund(*r) for r in db.execute(stmt)))
+
+def search_names(q, kind=None, limit=10):
+    """Typeahead sobre empresas y fondos. Sin caché: el índice FTS5 ya responde en microsegundos."""
+    return search(q, kind, limit)
+
+OPERATIONS = {
+    "fund_holdings": fund_holdings,
+    "top_holders": top_holders,
+    "put_call_exposure": put_call_exposure,
+    "fund_overlap": fund_overlap,
+    "similar_funds": similar_funds,
+    "search": search_names,
+}
+
+def cache_stats():
+    return {"version": current_version(), "entries": len(CACHE._data), "hits": CACHE.hits, "misses": CACHE.misses}
+
+if __name__ == "__main__":
+    if "--bump" in sys.argv:
+        print(f"Versión del warehouse: {bump_version('manual')}")
+    else:
+        print(f"Versión del warehouse: {current_version()}")
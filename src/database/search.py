@@ -0,0 +1,174 @@
+# src/database/search.py
+# Búsqueda por nombre sobre empresas y fondos (ETL de mapeo, agente y búsqueda interactiva).
+#   SQLite: tabla virtual FTS5 'name_search' sincronizada con 'companies' y 'funds' por triggers.
+#     rowid = companies.id para empresas y -funds.id para fondos (el trigger borra por rowid, sin escanear).
+#     Índices de prefijo de 2-4 caracteres: el typeahead ("APP" -> APPLE) no recorre todo el vocabulario.
+#   PostgreSQL: mismo API con ILIKE (sin índice de texto; suficiente para el ETL, no para typeahead).
+#
+#   from src.database.search import search, find_companies
+#   search("berk hath", limit=5)       -> empresas y fondos por relevancia (cada término como prefijo)
+#   find_companies("APPLE INC")        -> ids de empresas cuyo nombre contiene la frase completa
+import re
+import sys
+import time
+from typing import NamedTuple, Optional
+from sqlalchemy import text
+from src.database.connection import SessionLocal, engine
+
+FTS_TABLE = "name_search"
+# Pesos bm25 por columna (kind, name, ticker, code): un ticker exacto pesa más que una palabra del nombre
+BM25_WEIGHTS = (0.0, 1.0, 10.0, 5.0)
+_TOKEN = re.compile(r"[^\W_]+")  # Igual que el tokenizer unicode61: letras y dígitos
+
+class SearchHit(NamedTuple):
+    kind: str               # 'company' o 'fund'
+    id: int
+    name: str
+    ticker: Optional[str]
+    code: Optional[str]     # CUSIP (empresa) o CIK (fondo)
+    score: float            # bm25 (menor = más relevante) en SQLite; 0.0 en PostgreSQL
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        kind UNINDEXED, name, ticker, code,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_companies_ai AFTER INSERT ON companies BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, kind, name, ticker, code) VALUES (new.id, 'company', new.name, new.ticker, new.cusip);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_companies_ad AFTER DELETE ON companies BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    # Solo las columnas indexadas: actualizar sector o is_sp500 no toca el índice
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_companies_au AFTER UPDATE OF name, ticker, cusip ON companies BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, kind, name, ticker, code) VALUES (new.id, 'company', new.name, new.ticker, new.cusip);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_funds_ai AFTER INSERT ON funds BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, kind, name, ticker, code) VALUES (-new.id, 'fund', new.name, NULL, new.cik);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_funds_ad AFTER DELETE ON funds BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = -old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_funds_au AFTER UPDATE OF name, cik ON funds BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = -old.id;
+        INSERT INTO {FTS_TABLE}(rowid, kind, name, ticker, code) VALUES (-new.id, 'fund', new.name, NULL, new.cik);
+    END""",
+]
+
+def _is_sqlite(conn):
+    return conn.dialect.name == "sqlite"
+
+def _table_exists(conn):
+    return conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": FTS_TABLE}).first() is not None
+
+def rebuild_search_index(conn):
+    """Vuelve a llenar el índice desde 'companies' y 'funds' (DBs antiguas o tras cargas sin triggers)."""
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, kind, name, ticker, code) "
+                      f"SELECT id, 'company', name, ticker, cusip FROM companies"))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, kind, name, ticker, code) "
+                      f"SELECT -id, 'fund', name, NULL, cik FROM funds"))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+def ensure_search_index(conn=None):
+    """Crea la tabla FTS5 y sus triggers si faltan (idempotente); si la tabla es nueva, la llena. No-op en PostgreSQL."""
+    if conn is None:
+        with engine.begin() as conn:
+            return ensure_search_index(conn)
+    if not _is_sqlite(conn): return False
+    created = not _table_exists(conn)
+    for ddl in _DDL:
+        conn.execute(text(ddl))
+    if created:
+        rebuild_search_index(conn)
+    return created
+
+# CONSULTAS
+def fts_query(user_text, prefix="all"):
+    """
+    Texto libre -> expresión FTS5 segura (cada término entre comillas, AND implícito).
+    prefix: 'all' (cada término es prefijo), 'last' (solo el último, lo que se está tecleando) o None (términos completos).
+    """
+    tokens = _TOKEN.findall(user_text or "")
+    if not tokens: return None
+    terms = [f'"{t}"' for t in tokens]
+    if prefix == "all":
+        terms = [t + "*" for t in terms]
+    elif prefix == "last":
+        terms[-1] += "*"
+    return " ".join(terms)
+
+def _search_sqlite(db, user_text, kind, limit, prefix):
+    match = fts_query(user_text, prefix)
+    if match is None: return ()
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    kind_sql = "AND kind = :kind" if kind else ""
+    rows = db.execute(text(
+        f"SELECT kind, rowid, name, ticker, code, bm25({FTS_TABLE}, {weights}) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match {kind_sql} ORDER BY score LIMIT :limit"
+    ), {"match": match, "kind": kind, "limit": limit})
+    return tuple(SearchHit(k, abs(rowid), name, ticker, code, score) for k, rowid, name, ticker, code, score in rows)
+
+def _search_postgresql(db, user_text, kind, limit, prefix):
+    tokens = _TOKEN.findall(user_text or "")
+    if not tokens: return ()
+    # Cada término debe aparecer en el nombre (o ser el ticker/código exacto)
+    like = " AND ".join(f"name ILIKE :t{i}" for i in range(len(tokens)))
+    params = {f"t{i}": f"%{t}%" for i, t in enumerate(tokens)}
+    params.update(q=user_text.strip().upper(), limit=limit)
+    parts = []
+    if kind in (None, "company"):
+        parts.append(f"SELECT 'company' AS kind, id, name, ticker, cusip AS code FROM companies "
+                     f"WHERE ({like}) OR ticker = :q OR cusip = :q")
+    if kind in (None, "fund"):
+        parts.append(f"SELECT 'fund' AS kind, id, name, NULL AS ticker, cik AS code FROM funds WHERE ({like}) OR cik = :q")
+    rows = db.execute(text(
+        f"SELECT * FROM ({' UNION ALL '.join(parts)}) s "
+        f"ORDER BY (ticker = :q) IS TRUE DESC, LENGTH(name) LIMIT :limit"), params)
+    return tuple(SearchHit(*r, score=0.0) for r in rows)
+
+def search(user_text, kind=None, limit=10, prefix="all", db=None):
+    """Empresas y fondos por relevancia. kind: None, 'company' o 'fund'."""
+    if db is None:
+        with SessionLocal() as db:
+            return search(user_text, kind, limit, prefix, db)
+    if _is_sqlite(db.get_bind()):
+        return _search_sqlite(db, user_text, kind, limit, prefix)
+    return _search_postgresql(db, user_text, kind, limit, prefix)
+
+def find_companies(phrase, db=None, limit=1000):
+    """
+    Ids de empresas cuyo nombre contiene la frase (palabras completas y consecutivas).
+    Reemplaza los LIKE '%...%' del ETL: usa el índice y no confunde 'AMD' con 'CAMDEN'.
+    """
+    if db is None:
+        with SessionLocal() as db:
+            return find_companies(phrase, db, limit)
+    tokens = _TOKEN.findall(phrase or "")
+    if not tokens: return []
+    if _is_sqlite(db.get_bind()):
+        match = 'name : "' + " ".join(tokens) + '"'
+        rows = db.execute(text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match AND kind = 'company' LIMIT :limit"
+        ), {"match": match, "limit": limit})
+    else:
+        rows = db.execute(text("SELECT id FROM companies WHERE name ~* :pattern LIMIT :limit"),
+                          {"pattern": r"\m" + r"\W+".join(re.escape(t) for t in tokens) + r"\M", "limit": limit})
+    return [r[0] for r in rows]
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        with engine.begin() as conn:
+            ensure_search_index(conn)
+            if _is_sqlite(conn):
+                rebuild_search_index(conn)
+        print("Índice de búsqueda reconstruido.")
+    terms = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if terms:
+        with SessionLocal() as db:
+            t0 = time.perf_counter()
+            hits = search(" ".join(terms), db=db)
+            elapsed = (time.perf_counter() - t0) * 1000
+        for h in hits:
+            print(f"   [{h.kind:<7}] {h.id:>6}  {h.ticker or '':<6} {h.name}  ({h.code})")
+        print(f"{len(hits)} resultados en {elapsed:.2f} ms")
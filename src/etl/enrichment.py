@@ -0,0 +1,174 @@
+# src/etl/enrichment.py
+# Cliente de enriquecimiento compartido por fill_metadata.py y fetch_executives.py.
+#   - Concurrencia acotada: pool de hilos con una ventana fija de peticiones en vuelo.
+#   - Límite de tasa: token bucket (peticiones/segundo con ráfaga máxima) compartido por todos los hilos.
+#   - Reintentos con backoff exponencial y jitter cuando el origen nos frena (HTTP 429 / "Too Many Requests").
+#   - Los resultados vuelven al hilo que llama, en orden de llegada: ese hilo es el ÚNICO escritor de la DB.
+# Fuentes: Yahoo Finance (yf.Ticker(t).info) o un servidor HTTP (el stub local de este módulo, para pruebas).
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import urlopen
+
+# CONFIGURACIÓN (valores prudentes para no ser bloqueados por Yahoo)
+WORKERS = 8
+RATE = 8.0          # Peticiones por segundo (promedio sostenido): ~12k empresas en ~25 min
+BURST = 16          # Ráfaga máxima
+RETRIES = 4
+BACKOFF = 1.0       # Segundos base del backoff exponencial
+TIMEOUT = 20.0
+
+class ThrottledError(Exception):
+    """El origen pidió bajar el ritmo (HTTP 429 o equivalente)."""
+
+THROTTLE_HINTS = ("too many requests", "rate limit", "429")
+TRANSIENT_ERRORS = (ThrottledError, ConnectionError, TimeoutError, URLError)
+
+def _is_retryable(exc):
+    return isinstance(exc, TRANSIENT_ERRORS) or any(h in str(exc).lower() for h in THROTTLE_HINTS)
+
+class TokenBucket:
+    """Límite de tasa compartido entre hilos: acquire() bloquea hasta que haya un token."""
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate, self.capacity = float(rate), float(burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                delay = (1.0 - self.tokens) / self.rate
+            time.sleep(delay)
+
+# FUENTES: ticker -> dict con la misma forma que yf.Ticker(t).info
+def yahoo_info(ticker):
+    import yfinance as yf  # Import diferido: el stub no necesita yfinance
+    return yf.Ticker(ticker).info or {}
+
+def http_info(base_url, timeout=TIMEOUT):
+    """Fuente HTTP: GET {base_url}/info/{ticker} -> JSON. 429 -> ThrottledError."""
+    def fetch(ticker):
+        try:
+            with urlopen(f"{base_url}/info/{quote(ticker)}", timeout=timeout) as r:
+                return json.load(r)
+        except HTTPError as e:
+            if e.code == 429: raise ThrottledError(f"429 para {ticker}") from e
+            if e.code == 404: return {}
+            raise
+    return fetch
+
+def make_source(name="yahoo", url=None):
+    if name == "yahoo": return yahoo_info
+    if name == "http": return http_info(url)
+    raise ValueError(f"Fuente de enriquecimiento desconocida: '{name}' (opciones: yahoo, http)")
+
+class EnrichmentClient:
+    """
+    client = EnrichmentClient(yahoo_info)
+    for ticker, info, error in client.map(tickers):
+        ...  # escribir en la DB (este hilo)
+    """
+    def __init__(self, fetch, workers=WORKERS, rate=RATE, burst=BURST, retries=RETRIES, backoff=BACKOFF):
+        self.fetch = fetch
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.retries, self.backoff = retries, backoff
+        self.calls = self.throttled = 0
+        self._stats_lock = threading.Lock()
+
+    def _fetch_with_retry(self, ticker):
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            with self._stats_lock:
+                self.calls += 1
+            try:
+                return self.fetch(ticker)
+            except Exception as e:
+                if attempt == self.retries or not _is_retryable(e):
+                    raise
+                with self._stats_lock:
+                    self.throttled += 1
+                # Backoff exponencial con jitter: los hilos no vuelven a golpear todos a la vez
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def _call(self, ticker):
+        try:
+            return ticker, self._fetch_with_retry(ticker), None
+        except Exception as e:
+            return ticker, None, e
+
+    def map(self, tickers):
+        """
+        Genera (ticker, info, error) en orden de llegada (un ticker en backoff no frena a los demás).
+        Como mucho workers*2 peticiones en vuelo: la memoria no crece si el escritor va más lento.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            for t in tickers:
+                pending.add(pool.submit(self._call, t))
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+# SERVIDOR STUB (pruebas y benchmarks sin red)
+def fake_info(ticker):
+    """Respuesta determinista con la forma de yfinance .info"""
+    r = random.Random(ticker)
+    return {
+        "symbol": ticker,
+        "sector": r.choice(["Technology", "Healthcare", "Financial Services", "Energy", "Industrials"]),
+        "industry": f"Industry {r.randrange(40)}",
+        "country": r.choice(["United States", "Canada", "United Kingdom"]),
+        "longBusinessSummary": f"{ticker} is a company.",
+        "companyOfficers": [
+            {"name": f"{ticker} Chief {i}", "title": title}
+            for i, title in enumerate(["CEO", "CFO", "General Counsel"][:r.randrange(1, 4)])
+        ],
+    }
+
+def start_stub_server(info=fake_info, throttle_rate=0.0, latency=0.0, host="127.0.0.1", port=0):
+    """
+    Servidor HTTP local que imita la fuente: GET /info/<TICKER>.
+    throttle_rate: fracción de peticiones que responden 429. latency: segundos por respuesta.
+    Devuelve (servidor, url_base); cerrar con server.shutdown().
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if latency: time.sleep(latency)
+            if not self.path.startswith("/info/"):
+                return self._send(404, {"error": "not found"})
+            if throttle_rate and random.random() < throttle_rate:
+                return self._send(429, {"error": "Too Many Requests"})
+            self._send(200, info(self.path[len("/info/"):]))
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
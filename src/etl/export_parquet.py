@@ -0,0 +1,142 @@
+# src/etl/export_parquet.py
+# Exporta el warehouse a Parquet particionado (estilo Hive) para análisis columnar con DuckDB:
+#   data/processed/lake/holdings/quarter=2025Q3/fund_id=7/part-0.parquet
+#   data/processed/lake/derivatives/quarter=.../fund_id=.../part-0.parquet
+#   data/processed/lake/stock_prices/quarter=.../part-0.parquet
+#   data/processed/lake/companies/part-0.parquet   (dimensión, se reescribe completa)
+#   data/processed/lake/funds/part-0.parquet
+# Incremental: una huella por partición (filas, sumas, max id) decide qué se reescribe.
+import json
+import os
+import shutil
+from collections import defaultdict
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select, func
+from src.database.connection import engine
+from src.database.models import Fund, Company, Holding, DerivativePosition, StockPrice
+from src.database.quarters import quarter_of, quarter_bounds
+
+# CONFIGURACIÓN
+BASE_DIR = Path(__file__).resolve().parents[2]
+LAKE_DIR = BASE_DIR / "data" / "processed" / "lake"
+STATE_FILE = LAKE_DIR / "_export_state.json"
+
+# tabla -> (modelo, columna de fecha, columna de medida para la huella, ¿particionar por fondo?)
+FACT_TABLES = {
+    "holdings": (Holding, Holding.report_date, Holding.value, True),
+    "derivatives": (DerivativePosition, DerivativePosition.report_date, DerivativePosition.value, True),
+    "stock_prices": (StockPrice, StockPrice.date, StockPrice.close_price, False),
+}
+DIMENSION_TABLES = {"companies": Company, "funds": Fund}
+
+def _load_state():
+    if STATE_FILE.exists():
+        with open(STATE_FILE, "r") as f:
+            return json.load(f)
+    return {}
+
+def _save_state(state):
+    tmp = STATE_FILE.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, STATE_FILE)
+
+def _partition_dir(table_name, quarter, fund_id=None):
+    path = LAKE_DIR / table_name / f"quarter={quarter}"
+    return path / f"fund_id={fund_id}" if fund_id is not None else path
+
+def _partition_key(quarter, fund_id=None):
+    return f"{quarter}/{fund_id}" if fund_id is not None else quarter
+
+def _write_atomic(df, directory):
+    """Escribe part-0.parquet vía archivo temporal + rename (los lectores nunca ven medio archivo)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / ".part-0.parquet.tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="zstd")
+    os.replace(tmp, directory / "part-0.parquet")
+
+def partition_fingerprints(conn, table_name):
+    """
+    Huella por partición con UNA consulta agregada: {clave: [filas, suma medida, max id]}.
+    Se agrupa por fecha (y fondo) en SQL y se pliega a trimestre en Python.
+    """
+    model, date_col, measure_col, by_fund = FACT_TABLES[table_name]
+    group_cols = [date_col, model.fund_id] if by_fund else [date_col]
+    stmt = select(*group_cols, func.count(), func.sum(measure_col), func.max(model.id)).group_by(*group_cols)
+
+    prints = defaultdict(lambda: [0, 0.0, 0])
+    for row in conn.execute(stmt):
+        if by_fund:
+            d, fund_id, n, total, max_id = row
+            key = _partition_key(quarter_of(d), fund_id)
+        else:
+            d, n, total, max_id = row
+            key = _partition_key(quarter_of(d))
+        fp = prints[key]
+        fp[0] += n
+        fp[1] += total or 0.0
+        fp[2] = max(fp[2], max_id)
+    # Redondeo para que la huella sea estable frente a ruido de coma flotante
+    return {k: [n, round(total, 2), max_id] for k, (n, total, max_id) in prints.items()}
+
+def _read_partition(conn, table_name, key):
+    model, date_col, _, by_fund = FACT_TABLES[table_name]
+    quarter, _, fund_id = key.partition("/")
+    start, end = quarter_bounds(quarter)
+    stmt = select(model.__table__).where(date_col.between(start, end))
+    if by_fund:
+        stmt = stmt.where(model.fund_id == int(fund_id))
+    df = pd.read_sql(stmt, conn)
+    # Las columnas de partición viven en la ruta, no dentro del archivo
+    return df.drop(columns=["fund_id"]) if by_fund else df
+
+def export_table(conn, table_name, state, full=False):
+    """Reescribe solo las particiones nuevas o cuya huella cambió; borra las que ya no existen."""
+    _, _, _, by_fund = FACT_TABLES[table_name]
+    if full:
+        shutil.rmtree(LAKE_DIR / table_name, ignore_errors=True)
+    previous = {} if full else state.get(table_name, {})
+    current = partition_fingerprints(conn, table_name)
+
+    written = 0
+    for key, fp in sorted(current.items()):
+        if previous.get(key) == fp: continue
+        quarter, _, fund_id = key.partition("/")
+        _write_atomic(_read_partition(conn, table_name, key),
+                      _partition_dir(table_name, quarter, fund_id if by_fund else None))
+        written += 1
+
+    removed = 0
+    for key in set(previous) - set(current):
+        quarter, _, fund_id = key.partition("/")
+        shutil.rmtree(_partition_dir(table_name, quarter, fund_id if by_fund else None), ignore_errors=True)
+        removed += 1
+
+    state[table_name] = current
+    print(f"   {table_name:<14} {len(current):>5} particiones | {written} reescritas | {removed} eliminadas")
+
+def export_dimension(conn, table_name):
+    model = DIMENSION_TABLES[table_name]
+    _write_atomic(pd.read_sql(select(model.__table__), conn), LAKE_DIR / table_name)
+    print(f"   {table_name:<14} dimensión completa reescrita")
+
+def run_export(full=False):
+    print(f"Exportando warehouse a Parquet particionado en: {LAKE_DIR}")
+    LAKE_DIR.mkdir(parents=True, exist_ok=True)
+    state = {} if full else _load_state()
+
+    with engine.connect() as conn:
+        for table_name in DIMENSION_TABLES:
+            export_dimension(conn, table_name)
+        for table_name in FACT_TABLES:
+            export_table(conn, table_name, state, full=full)
+
+    _save_state(state)
+    print("Exportación completada.")
+
+if __name__ == "__main__":
+    import sys
+    run_export(full="--full" in sys.argv)
@@ -1,61 +1,74 @@
-# src/etl/fetch_executives.py
-import yfinance as yf
+# src/etl/fetch_executives.py (Versión 2: Cliente concurrente con límite de tasa)
+import argparse
+import time
+from collections import defaultdict
+import pandas as pd
+from sqlalchemy import select
 from src.database.connection import get_db
 from src.database.models import Company, KeyExecutive
-import time
+from src.database.bulk import load_frame
+from src.database.query_service import bump_version
+from src.etl.enrichment import EnrichmentClient, make_source, WORKERS, RATE
+
+COMMIT_EVERY = 100  # Empresas por transacción del escritor
+EXECUTIVE_KEY = ['company_id', 'name', 'role']  # Llave natural (índice único en models.py)
+INSIDER_ROLES = ['CEO', 'CFO', 'PRESIDENT', 'CHAIRMAN', 'COO']
+
+def officers_to_rows(company_id, officers):
+    rows = []
+    for off in officers or []:
+        name = off.get('name')
+        title = off.get('title')
+        if name and title:
+            # Detectar si es importante
+            is_insider = any(role in title.upper() for role in INSIDER_ROLES)
+            rows.append({"company_id": company_id, "name": name, "role": title, "is_insider": is_insider})
+    return rows
 
-def fetch_executives():
+def fetch_executives(source="yahoo", url=None, workers=WORKERS, rate=RATE):
     db = next(get_db())
-    
-    # 1. Obtener empresas que tienen Ticker pero NO tienen ejecutivos
-    # (Hacemos un LEFT JOIN o chequeo simple para no repetir trabajo)
-    # Por simplicidad, traemos todas con Ticker y verificamos en el loop
-    companies = db.query(Company).filter(Company.ticker != None).all()
-    
-    print(f"Buscando ejecutivos para {len(companies)} empresas...")
-    
-    for c in companies:
-        # Verificar si ya tiene ejecutivos
-        if len(c.key_people) > 0:
+
+    # 1. Empresas con Ticker que NO tienen ejecutivos (una sola consulta, sin cargar relaciones)
+    with_people = select(KeyExecutive.company_id).distinct()
+    # Varias empresas (clases de acción) pueden compartir ticker: una sola petición por ticker
+    targets = defaultdict(list)
+    for ticker, cid in db.query(Company.ticker, Company.id).filter(
+            Company.ticker != None, Company.id.not_in(with_people)):
+        targets[ticker].append(cid)
+
+    print(f"Buscando ejecutivos para {len(targets)} empresas ({workers} hilos, {rate:g} peticiones/s)...")
+
+    t0 = time.perf_counter()
+    client = EnrichmentClient(make_source(source, url), workers=workers, rate=rate)
+    rows, done, total, errors = [], 0, 0, 0
+    # Los hilos solo descargan; este bucle es el único escritor
+    for ticker, info, error in client.map(targets):
+        if error is not None:
+            errors += 1
+            print(f"   {ticker}: Error {error}")
             continue
-            
-        print(f"   {c.name} ({c.ticker})...", end=" ")
-        
-        try:
-            ticker = yf.Ticker(c.ticker)
-            officers = ticker.info.get('companyOfficers', [])
-            
-            new_execs = []
-            for off in officers:
-                name = off.get('name')
-                title = off.get('title')
-                
-                if name and title:
-                    # Detectar si es importante
-                    is_insider = any(role in title.upper() for role in ['CEO', 'CFO', 'PRESIDENT', 'CHAIRMAN', 'COO'])
-                    
-                    new_execs.append(KeyExecutive(
-                        company_id=c.id,
-                        name=name,
-                        role=title,
-                        is_insider=is_insider
-                    ))
-            
-            if new_execs:
-                db.bulk_save_objects(new_execs)
-                db.commit()
-                print(f" {len(new_execs)} agregados.")
-            else:
-                print(" Sin datos.")
-                
-        except Exception as e:
-            print(f" Error: {e}")
-        
-        # Respetar límites de API
-        # time.sleep(0.2) 
+        for cid in targets[ticker]:
+            rows.extend(officers_to_rows(cid, info.get('companyOfficers')))
+        done += 1
+        if done % COMMIT_EVERY == 0:
+            total += load_frame(db, KeyExecutive, pd.DataFrame(rows), EXECUTIVE_KEY)
+            db.commit()
+            rows = []
+            print(f"   {done} empresas consultadas, {total} ejecutivos agregados...")
 
+    total += load_frame(db, KeyExecutive, pd.DataFrame(rows), EXECUTIVE_KEY)
+    db.commit()
     db.close()
-    print("Tabla 'key_executives' actualizada.")
+    bump_version("fetch_executives")
+    elapsed = time.perf_counter() - t0
+    print(f"Tabla 'key_executives' actualizada: {total} ejecutivos de {done} empresas, {errors} errores, "
+          f"{client.calls} peticiones ({client.throttled} reintentos) en {elapsed:.1f}s.")
 
 if __name__ == "__main__":
-    fetch_executives()
+    cli = argparse.ArgumentParser(description="Ejecutivos clave de las empresas con ticker")
+    cli.add_argument("--source", choices=["yahoo", "http"], default="yahoo")
+    cli.add_argument("--url", help="URL base para --source http (por ejemplo, el stub de src/etl/enrichment.py)")
+    cli.add_argument("--workers", type=int, default=WORKERS)
+    cli.add_argument("--rate", type=float, default=RATE, help="Peticiones por segundo")
+    args = cli.parse_args()
+    fetch_executives(args.source, args.url, args.workers, args.rate)
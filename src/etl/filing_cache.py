@@ -0,0 +1,108 @@
+# src/etl/filing_cache.py
+# Caché de reportes ya decodificados. Cada tabla de información se decodifica UNA vez
+# y se guarda en formato binario compacto (.npy por columna) bajo data/processed/filings/<ACCESSION>/.
+# Los consumidores (parser, impute_derivatives, backfills) la abren con memory-mapping
+# y se saltan el XML por completo.
+import json
+import os
+import shutil
+from datetime import date
+from pathlib import Path
+import numpy as np
+from src.etl.infotable import InfoBatch, read_info_table, filing_report_date
+from src.etl.manifest import accession_of, file_sha256
+
+# CONFIGURACIÓN
+BASE_DIR = Path(__file__).resolve().parents[2]
+CACHE_DIR = BASE_DIR / "data" / "processed" / "filings"
+
+META_FILE = "meta.json"
+CACHE_VERSION = 1  # Subir si cambia el formato del decodificador -> invalida todo
+
+def _entry_dir(accession):
+    return CACHE_DIR / accession
+
+def _read_meta(entry_dir):
+    try:
+        with open(entry_dir / META_FILE, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+def load(accession, content_hash=None, stat=None):
+    """
+    Devuelve (report_date, InfoBatch con columnas memory-mapped, content_hash) o None si no hay caché válida.
+    Validación: mismo hash de contenido o, si no lo conocemos, (atajo) mismo tamaño y mtime del archivo original.
+    """
+    entry_dir = _entry_dir(accession)
+    meta = _read_meta(entry_dir)
+    if meta is None: return None
+
+    if content_hash is not None:
+        if meta["content_hash"] != content_hash: return None
+    elif stat is None or meta["file_size"] != stat.st_size or meta["file_mtime_ns"] != stat.st_mtime_ns:
+        return None
+
+    batch = InfoBatch(*(np.load(entry_dir / f"{col}.npy", mmap_mode="r") for col in InfoBatch._fields))
+    return date.fromisoformat(meta["report_date"]), batch, meta["content_hash"]
+
+def store(accession, content_hash, stat, report_date, batch):
+    """Escribe la entrada de forma atómica (directorio temporal + rename)."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    final_dir = _entry_dir(accession)
+    tmp_dir = CACHE_DIR / f".{accession}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+
+    for col, arr in zip(InfoBatch._fields, batch):
+        np.save(tmp_dir / f"{col}.npy", np.ascontiguousarray(arr))
+    meta = {
+        "version": CACHE_VERSION,
+        "accession": accession,
+        "content_hash": content_hash,
+        "file_size": stat.st_size,
+        "file_mtime_ns": stat.st_mtime_ns,
+        "report_date": report_date.isoformat(),
+        "rows": len(batch),
+    }
+    with open(tmp_dir / META_FILE, "w") as f:
+        json.dump(meta, f)
+
+    # Reemplazo: la versión vieja se aparta antes de mover la nueva a su lugar
+    old_dir = None
+    if final_dir.exists():
+        old_dir = CACHE_DIR / f".{accession}.old-{os.getpid()}"
+        os.replace(final_dir, old_dir)
+    os.replace(tmp_dir, final_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+def load_or_decode(file_path, content_hash=None, use_cache=True):
+    """
+    Punto de entrada para los consumidores del Data Lake.
+    Devuelve (report_date, InfoBatch, content_hash). Lanza ET.ParseError si hay que decodificar y el XML está corrupto.
+    """
+    accession = accession_of(file_path)
+    stat = file_path.stat()
+
+    if use_cache:
+        hit = load(accession, content_hash, stat)
+        if hit is None and content_hash is None:
+            # El atajo por stat falló: confirmamos por contenido antes de decodificar
+            content_hash = file_sha256(file_path)
+            hit = load(accession, content_hash, stat)
+        if hit is not None:
+            return hit
+
+    if content_hash is None:
+        content_hash = file_sha256(file_path)
+    report_date = filing_report_date(file_path)
+    batch = read_info_table(file_path)
+    if use_cache:
+        store(accession, content_hash, stat, report_date, batch)
+    return report_date, batch, content_hash
+
+def clear_cache():
+    """Borra toda la caché (por ejemplo, tras cambiar el decodificador)."""
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
@@ -1,49 +1,70 @@
-# src/etl/fill_metadata.py
-import yfinance as yf
+# src/etl/fill_metadata.py (Versión 2: Cliente concurrente con límite de tasa)
+import argparse
+import time
+from collections import defaultdict
+import pandas as pd
 from src.database.connection import get_db
 from src.database.models import Company
-import time
+from src.database.bulk import update_frame
+from src.database.query_service import bump_version
+from src.etl.enrichment import EnrichmentClient, make_source, WORKERS, RATE
+
+COMMIT_EVERY = 100  # Filas por transacción del escritor
+
+def fill_gaps(source="yahoo", url=None, workers=WORKERS, rate=RATE):
+    db = next(get_db())
 
-def fill_gaps():
-    db = next(get_db()) 
-    
     # Buscamos empresas que tienen Ticker PERO les falta Sector o País
-    targets = db.query(Company).filter(
+    # Varias empresas (clases de acción) pueden compartir ticker: una sola petición por ticker
+    targets = defaultdict(list)
+    for ticker, cid in db.query(Company.ticker, Company.id).filter(
         Company.ticker != None,
         (Company.sector == None) | (Company.sector == "Unknown") | (Company.country == None)
-    ).all()
-    
-    print(f"🛠️  Rellenando metadatos para {len(targets)} empresas...")
-    
-    count = 0
-    for c in targets:
-        try:
-            print(f"    {c.ticker}...", end=" ")
-            info = yf.Ticker(c.ticker).info
-            
-            # Solo actualizamos si Yahoo nos da algo útil
-            if 'sector' in info:
-                c.sector = info.get('sector')
-                c.industry = info.get('industry')
-                c.country = info.get('country')
-                c.description = info.get('longBusinessSummary', '')[:500] # Primeros 500 chars
-                count += 1
-                print("Ok")
-            else:
-                print(" Sin datos en Yahoo")
-                
-            # Guardamos cada 10 para no perder progreso
-            if count % 10 == 0:
-                db.commit()
-                
-            time.sleep(0.1) # Pausa técnica
-            
-        except Exception as e:
-            print(f"Error {e}")
+    ):
+        targets[ticker].append(cid)
+
+    print(f"🛠️  Rellenando metadatos para {len(targets)} empresas ({workers} hilos, {rate:g} peticiones/s)...")
+
+    t0 = time.perf_counter()
+    client = EnrichmentClient(make_source(source, url), workers=workers, rate=rate)
+    pending, count, errors = [], 0, 0
+    # Los hilos solo descargan; este bucle es el único escritor
+    for ticker, info, error in client.map(targets):
+        if error is not None:
+            errors += 1
+            print(f"    {ticker}: Error {error}")
+            continue
+        # Solo actualizamos si Yahoo nos da algo útil
+        if 'sector' not in info: continue
+        pending.extend({
+            "id": cid,
+            "sector": info.get('sector'),
+            "industry": info.get('industry'),
+            "country": info.get('country'),
+            "description": (info.get('longBusinessSummary') or '')[:500],  # Primeros 500 chars
+        } for cid in targets[ticker])
+        if len(pending) >= COMMIT_EVERY:
+            update_frame(db, Company, pd.DataFrame(pending))
+            db.commit()
+            count += len(pending)
+            pending = []
+            print(f"    {count} empresas enriquecidas...")
 
+    if pending:
+        update_frame(db, Company, pd.DataFrame(pending))
+        count += len(pending)
     db.commit()
     db.close()
-    print(f" Proceso terminado. {count} empresas enriquecidas.")
+    bump_version("fill_metadata")
+    elapsed = time.perf_counter() - t0
+    print(f" Proceso terminado. {count} empresas enriquecidas, {errors} errores, "
+          f"{client.calls} peticiones ({client.throttled} reintentos) en {elapsed:.1f}s.")
 
 if __name__ == "__main__":
-    fill_gaps()
+    cli = argparse.ArgumentParser(description="Sector, industria y país de las empresas con ticker")
+    cli.add_argument("--source", choices=["yahoo", "http"], default="yahoo")
+    cli.add_argument("--url", help="URL base para --source http (por ejemplo, el stub de src/etl/enrichment.py)")
+    cli.add_argument("--workers", type=int, default=WORKERS)
+    cli.add_argument("--rate", type=float, default=RATE, help="Peticiones por segundo")
+    args = cli.parse_args()
+    fill_gaps(args.source, args.url, args.workers, args.rate)
@@ -1,27 +1,18 @@
 # src/etl/impute_derivatives.py
-import re
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from datetime import datetime
 from sqlalchemy import text
-from src.database.connection import get_db
+from src.database.connection import get_db, BACKEND
+from src.database.bulk import insert_ignore, report_load_stats
 from src.database.models import Fund, Company, DerivativePosition
+from src.etl.filing_cache import load_or_decode
+from src.etl.parser import aggregate_batch, DERIVATIVE_KEY
+from src.database.query_service import bump_version
 
 # Configuración
 BASE_DIR = Path(__file__).resolve().parents[2]
 DATA_RAW_PATH = BASE_DIR / "data" / "raw"
 
-NAMESPACES = {
-    'ns1': 'http://www.sec.gov/edgar/document/thirteenf/informationtable',
-    'ns2': 'http://www.sec.gov/edgar/thirteenf/informationtable'
-}
-
-def get_text(elem, tag):
-    for ns in NAMESPACES.values():
-        res = elem.find(f'{{{ns}}}{tag}')
-        if res is not None: return res.text
-    return elem.find(tag).text if elem.find(tag) is not None else None
-
 def impute_derivatives():
     print("INICIANDO IMPUTACIÓN QUIRÚRGICA DE DERIVADOS...")
     db = next(get_db())
@@ -65,72 +56,37 @@ def impute_derivatives():
         
         if not fund_id: continue # Si no tenemos el fondo registrado, saltamos
 
-        # Leer XML
+        # Leer el reporte en modo columnar (desde la caché binaria si ya fue decodificado)
+        # y consolidar igual que el parser (mismo lote -> acciones y derivados)
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            match = re.search(r'<informationTable.*?>.*?</informationTable>', content, re.DOTALL | re.IGNORECASE)
-            if not match: continue
-            
-            root = ET.fromstring(match.group(0))
-        except: continue
-
-        report_date = datetime.fromtimestamp(file_path.stat().st_mtime).date()
-        
-        # Buscar filas
-        rows = root.findall('.//{http://www.sec.gov/edgar/document/thirteenf/informationtable}infoTable')
-        if not rows:
-            rows = root.findall('.//{http://www.sec.gov/edgar/thirteenf/informationtable}infoTable')
+            report_date, info, _ = load_or_decode(file_path)
+            positions = aggregate_batch(info)
+        except ET.ParseError: continue
 
+        # AQUÍ ESTÁ EL FILTRO: solo filas con putCall PUT/CALL (el decodificador ya normaliza "Put" -> "PUT")
+        d = positions.put_call != ""
         batch = []
-        for row in rows:
-            # AQUÍ ESTÁ EL FILTRO
-            raw_pc = get_text(row, 'putCall')
-            # Si no tiene etiqueta putCall, IGNORAR (Ahorramos 90% de tiempo)
-            if not raw_pc: continue
-            
-            # Normalizar: "Put" -> "PUT"
-            put_call = raw_pc.strip().upper()
-            
-            if put_call not in ['PUT', 'CALL']: continue
-
-            # Si llegamos aquí, ES UN DERIVADO. Lo procesamos.
-            cusip = get_text(row, 'cusip')
-            val_str = get_text(row, 'value')
-            
+        for cusip, put_call, shares, value in zip(positions.cusip[d].tolist(), positions.put_call[d].tolist(),
+                                                  positions.shares[d].tolist(), positions.value[d].tolist()):
             # Buscar Company ID en memoria
             comp_id = comp_map.get(cusip)
-            
             # Si la empresa no existe (raro, pero posible), la saltamos para no complicar el script rápido
             if not comp_id: continue
-
-            # Obtener shares
-            shrs_node = None
-            for ns in NAMESPACES.values():
-                n = row.find(f'{{{ns}}}shrsOrPrnAmt')
-                if n is not None: shrs_node = n; break
-            if shrs_node is None: shrs_node = row.find('shrsOrPrnAmt')
-            shrs_str = get_text(shrs_node, 'sshPrnamt') if shrs_node is not None else "0"
-
-            batch.append(DerivativePosition(
-                fund_id=fund_id,
-                company_id=comp_id,
-                report_date=report_date,
-                derivative_type=put_call,
-                value=float(val_str) * 1000,
-                shares_underlying=float(shrs_str)
-            ))
+            batch.append({"fund_id": fund_id, "company_id": comp_id, "report_date": report_date,
+                          "derivative_type": put_call, "value": value, "shares_underlying": shares})
 
         if batch:
-            db.bulk_save_objects(batch)
+            insert_ignore(db, DerivativePosition, batch, DERIVATIVE_KEY)
             total_derivs += len(batch)
             print(f"   Injectando {len(batch)} derivados para CIK {cik_found}")
 
     db.commit()
     db.close()
+    bump_version("impute_derivatives")  # put_call_exposure en caché leía la tabla anterior
     print("="*50)
     print(f"OPERACIÓN COMPLETADA. Total derivados rescatados: {total_derivs}")
     print("="*50)
+    report_load_stats(BACKEND)
 
 if __name__ == "__main__":
     impute_derivatives()
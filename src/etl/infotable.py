@@ -0,0 +1,287 @@
+# src/etl/infotable.py
+# Decodificador en streaming de la Tabla de Información (informationTable) de los 13F.
+# En vez de leer el .txt completo + regex + árbol XML entero, leemos por bloques,
+# alimentamos un parser incremental y emitimos una fila <infoTable> a la vez.
+# La memoria pico queda plana sin importar el tamaño del reporte (BlackRock, Vanguard...).
+# Modo columnar (iter_info_batches / read_info_table): lotes de arrays NumPy, sin objetos por fila.
+import re
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+import numpy as np
+
+# CONFIGURACIÓN
+BASE_DIR = Path(__file__).resolve().parents[2]
+DATA_RAW_PATH = BASE_DIR / "data" / "raw"
+
+CHUNK_SIZE = 1 << 16  # 64 KB por lectura
+_TAIL = 64            # Cola que retenemos por si una etiqueta queda partida entre bloques
+BATCH_ROWS = 50_000   # Filas por lote en el modo columnar
+VALUE_SCALE = 1000    # La SEC reporta 'value' en miles de USD
+DERIVATIVE_TYPES = ("PUT", "CALL")
+
+# Aceptamos la etiqueta con o sin prefijo (<informationTable> o <ns1:informationTable>)
+_OPEN_TAG = re.compile(r'<(?:[\w.-]+:)?informationTable[\s>]', re.IGNORECASE)
+_CLOSE_TAG = re.compile(r'</(?:[\w.-]+:)?informationTable\s*>', re.IGNORECASE)
+_PERIOD = re.compile(r'CONFORMED PERIOD OF REPORT:\s*(\d{8})')
+
+
+class InfoRow(NamedTuple):
+    """Una fila cruda de la tabla de información (textos tal cual vienen en el XML)."""
+    name: Optional[str]
+    cusip: Optional[str]
+    value: Optional[str]      # En miles de USD (formato SEC)
+    shares: Optional[str]
+    put_call: Optional[str]   # 'PUT', 'CALL' o None (ya normalizado a mayúsculas)
+
+
+class InfoBatch(NamedTuple):
+    """Lote columnar de filas. Mismo orden que en el XML; un índice = una fila."""
+    name: np.ndarray      # str ('' si falta)
+    cusip: np.ndarray     # str ('' si falta)
+    value: np.ndarray     # float64 en USD (ya escalado x1000); NaN si falta
+    shares: np.ndarray    # float64 (0 si falta, como la ruta original)
+    put_call: np.ndarray  # str: 'PUT', 'CALL' o ''
+
+    def __len__(self):
+        return len(self.cusip)
+
+    @property
+    def is_derivative(self):
+        """Máscara booleana: filas que son opciones (PUT/CALL)."""
+        return np.isin(self.put_call, DERIVATIVE_TYPES)
+
+
+class _Tags:
+    """Nombres calificados de las etiquetas, resueltos UNA vez por documento."""
+    def __init__(self, ns):
+        self.row = f"{ns}infoTable"
+        self.name = f"{ns}nameOfIssuer"
+        self.cusip = f"{ns}cusip"
+        self.value = f"{ns}value"
+        self.shrs_node = f"{ns}shrsOrPrnAmt"
+        self.shares = f"{ns}sshPrnamt"
+        self.put_call = f"{ns}putCall"
+
+
+def _iter_table_chunks(f):
+    """Recorre el archivo por bloques y entrega solo el texto de <informationTable>...</informationTable>."""
+    buf = ""
+    # 1. Localizar la apertura de la tabla
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk: return
+        buf += chunk
+        m = _OPEN_TAG.search(buf)
+        if m:
+            buf = buf[m.start():]
+            break
+        buf = buf[-_TAIL:]
+
+    # 2. Emitir bloques hasta encontrar el cierre
+    while True:
+        m = _CLOSE_TAG.search(buf)
+        if m:
+            yield buf[:m.end()]
+            return
+        if len(buf) > _TAIL:
+            yield buf[:-_TAIL]
+            buf = buf[-_TAIL:]
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            yield buf  # Documento truncado: que el parser decida
+            return
+        buf += chunk
+
+
+def filing_report_date(file_path):
+    """
+    Fecha de corte del reporte (trimestre). Se lee del encabezado SEC
+    ("CONFORMED PERIOD OF REPORT: 20250930"), que está en los primeros KB del .txt.
+    Si no aparece, usamos la fecha de modificación del archivo (comportamiento histórico).
+    """
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        head = f.read(CHUNK_SIZE)
+    m = _PERIOD.search(head)
+    if m:
+        return datetime.strptime(m.group(1), "%Y%m%d").date()
+    return datetime.fromtimestamp(Path(file_path).stat().st_mtime).date()
+
+
+def _decode_row(row, tags):
+    shrs_node = row.find(tags.shrs_node)
+    shares = shrs_node.findtext(tags.shares) if shrs_node is not None else None
+    put_call = row.findtext(tags.put_call)
+    if put_call:
+        put_call = put_call.strip().upper() or None
+    return InfoRow(
+        name=row.findtext(tags.name),
+        cusip=row.findtext(tags.cusip),
+        value=row.findtext(tags.value),
+        shares=shares,
+        put_call=put_call or None,
+    )
+
+
+def _iter_row_elements(file_path):
+    """
+    Genera (elemento <infoTable>, tags) uno a uno. El elemento solo es válido hasta el siguiente
+    next(): después se libera para mantener la memoria acotada.
+    Lanza ET.ParseError si el XML está corrupto (el consumidor decide si descarta el reporte).
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    tags = None
+
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        for piece in _iter_table_chunks(f):
+            parser.feed(piece)
+            for event, elem in parser.read_events():
+                if root is None:
+                    # Primer evento = raíz. Aquí detectamos el namespace una sola vez.
+                    root = elem
+                    ns = elem.tag[:elem.tag.index("}") + 1] if elem.tag.startswith("{") else ""
+                    tags = _Tags(ns)
+                    continue
+                if event == "end" and elem.tag == tags.row:
+                    yield elem, tags
+                    # Liberar las filas ya procesadas (memoria acotada)
+                    root.clear()
+    if root is not None:
+        parser.close()
+
+
+def iter_info_rows(file_path):
+    """Genera las filas (InfoRow) de la tabla de información de un reporte EDGAR .txt."""
+    for row, tags in _iter_row_elements(file_path):
+        yield _decode_row(row, tags)
+
+
+def _to_float(strings, fill):
+    arr = np.array(strings, dtype=str)
+    arr[arr == ""] = fill
+    return arr.astype(np.float64)
+
+
+def _build_batch(names, cusips, values, shares, put_calls):
+    # Conversión y escalado vectorizados (una sola pasada por columna)
+    put_call = np.char.upper(np.char.strip(np.array(put_calls, dtype=str)))
+    return InfoBatch(
+        name=np.array(names, dtype=str),
+        cusip=np.char.strip(np.array(cusips, dtype=str)),
+        value=_to_float(values, "nan") * VALUE_SCALE,
+        shares=_to_float(shares, "0"),
+        put_call=np.where(np.isin(put_call, DERIVATIVE_TYPES), put_call, ""),
+    )
+
+
+def iter_info_batches(file_path, batch_size=BATCH_ROWS):
+    """
+    Modo columnar: genera InfoBatch de hasta batch_size filas.
+    Los textos se acumulan en listas planas y se convierten a arrays por lote.
+    """
+    cols = ([], [], [], [], [])
+    names, cusips, values, shares, put_calls = cols
+    for row, tags in _iter_row_elements(file_path):
+        shrs_node = row.find(tags.shrs_node)
+        names.append(row.findtext(tags.name) or "")
+        cusips.append(row.findtext(tags.cusip) or "")
+        values.append(row.findtext(tags.value) or "")
+        shares.append((shrs_node.findtext(tags.shares) if shrs_node is not None else None) or "")
+        put_calls.append(row.findtext(tags.put_call) or "")
+        if len(cusips) >= batch_size:
+            yield _build_batch(*cols)
+            for col in cols: col.clear()
+    if cusips:
+        yield _build_batch(*cols)
+
+
+def empty_batch():
+    return _build_batch([], [], [], [], [])
+
+
+def concat_batches(batches):
+    batches = list(batches)
+    if not batches: return empty_batch()
+    if len(batches) == 1: return batches[0]
+    return InfoBatch(*(np.concatenate(cols) for cols in zip(*batches)))
+
+
+def read_info_table(file_path):
+    """Tabla de información completa de un reporte como un único InfoBatch."""
+    return concat_batches(iter_info_batches(file_path))
+
+
+# BENCHMARK: Ruta antigua (regex + árbol completo) vs streaming
+def _legacy_rows(file_path):
+    """Réplica de la ruta original: leer todo, regex DOTALL, ET.fromstring y findall."""
+    namespaces = [
+        'http://www.sec.gov/edgar/document/thirteenf/informationtable',
+        'http://www.sec.gov/edgar/thirteenf/informationtable'
+    ]
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    match = re.search(r'<informationTable.*?>.*?</informationTable>', content, re.DOTALL | re.IGNORECASE)
+    if not match: return []
+    root = ET.fromstring(match.group(0))
+    rows = root.findall(f'.//{{{namespaces[0]}}}infoTable') or root.findall(f'.//{{{namespaces[1]}}}infoTable')
+
+    def get_text(elem, tag):
+        for ns in namespaces:
+            res = elem.find(f'{{{ns}}}{tag}')
+            if res is not None: return res.text
+        return elem.find(tag).text if elem.find(tag) is not None else None
+
+    out = []
+    for row in rows:
+        shrs_node = None
+        for ns in namespaces:
+            n = row.find(f'{{{ns}}}shrsOrPrnAmt')
+            if n is not None: shrs_node = n; break
+        out.append((get_text(row, 'nameOfIssuer'), get_text(row, 'cusip'), get_text(row, 'value'),
+                    get_text(shrs_node, 'sshPrnamt') if shrs_node is not None else "0",
+                    get_text(row, 'putCall')))
+    return out
+
+
+def _measure(fn, file_path):
+    # Tiempo y memoria en pasadas separadas (tracemalloc distorsiona el cronómetro)
+    t0 = time.perf_counter()
+    n = sum(1 for _ in fn(file_path))
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    for _ in fn(file_path): pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return n, elapsed, peak
+
+
+def benchmark(top_n=5):
+    """Compara throughput y memoria pico en los reportes más grandes del Data Lake."""
+    files = sorted(DATA_RAW_PATH.rglob("*.txt"), key=lambda p: p.stat().st_size, reverse=True)[:top_n]
+    if not files:
+        print(" ERROR: No hay reportes en data/raw")
+        return
+
+    print(f"Benchmark sobre los {len(files)} reportes más grandes:")
+    print(f"{'Archivo':<40} {'MB':>7} {'Filas':>8} {'Legacy f/s':>12} {'Stream f/s':>12} {'Batch f/s':>12} {'Legacy MB':>10} {'Stream MB':>10}")
+    for path in files:
+        size_mb = path.stat().st_size / 1e6
+        n_old, t_old, peak_old = _measure(_legacy_rows, path)
+        n_new, t_new, peak_new = _measure(iter_info_rows, path)
+        t0 = time.perf_counter()
+        n_batch = len(read_info_table(path))
+        t_batch = time.perf_counter() - t0
+        label = f"{path.parent.name}/{path.name}"[-40:]
+        print(f"{label:<40} {size_mb:>7.1f} {n_new:>8} {n_old / max(t_old, 1e-9):>12,.0f} "
+              f"{n_new / max(t_new, 1e-9):>12,.0f} {n_batch / max(t_batch, 1e-9):>12,.0f} "
+              f"{peak_old / 1e6:>10.1f} {peak_new / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
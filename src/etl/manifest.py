@@ -0,0 +1,90 @@
+# src/etl/manifest.py
+# Manifiesto de ingesta: qué reportes ya están cargados y con qué huella (tamaño, mtime, hash).
+# Fase 2 del Roadmap: carga incremental. Una re-ejecución sin cambios solo hace stat() de los archivos.
+import hashlib
+from datetime import datetime
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from src.database.connection import engine
+from src.database.models import IngestManifest, Holding, DerivativePosition
+
+HASH_CHUNK = 1 << 20  # 1 MB
+
+def ensure_manifest_table():
+    """Crea la tabla del manifiesto en bases de datos antiguas (idempotente)."""
+    IngestManifest.__table__.create(bind=engine, checkfirst=True)
+
+def accession_of(file_path):
+    """sec-edgar-downloader guarda cada reporte en data/raw/.../<CIK>/13F-HR/<ACCESSION>/full-submission.txt"""
+    return file_path.parent.name
+
+def file_sha256(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(db: Session):
+    """{accession: IngestManifest} cargado una vez por corrida."""
+    return {m.accession: m for m in db.query(IngestManifest)}
+
+def is_unchanged(entry, stat):
+    """Atajo sin abrir el archivo: mismo tamaño y misma fecha de modificación."""
+    return entry is not None and entry.file_size == stat.st_size and entry.file_mtime_ns == stat.st_mtime_ns
+
+def purge_filing_rows(db: Session, entry):
+    """
+    Borra las posiciones de una versión anterior del reporte (mismo fondo y fecha de corte).
+    El downloader baja solo 13F-HR (sin enmiendas /A): un accession <-> un (fondo, trimestre).
+    """
+    if entry.report_date is None: return
+    db.execute(delete(Holding).where(Holding.fund_id == entry.fund_id, Holding.report_date == entry.report_date))
+    db.execute(delete(DerivativePosition).where(
+        DerivativePosition.fund_id == entry.fund_id, DerivativePosition.report_date == entry.report_date))
+
+def record_filing(db: Session, manifest, file_path, stat, content_hash, fund_id, report_date, stock_rows, derivative_rows):
+    """Inserta o actualiza la entrada del manifiesto (se confirma junto con las posiciones)."""
+    accession = accession_of(file_path)
+    entry = manifest.get(accession)
+    if entry is None:
+        entry = IngestManifest(accession=accession)
+        db.add(entry)
+        manifest[accession] = entry
+
+    entry.fund_id = fund_id
+    entry.report_date = report_date
+    entry.file_path = str(file_path)
+    entry.file_size = stat.st_size
+    entry.file_mtime_ns = stat.st_mtime_ns
+    entry.content_hash = content_hash
+    entry.status = "loaded"
+    entry.stock_rows = stock_rows
+    entry.derivative_rows = derivative_rows
+    entry.loaded_at = datetime.utcnow()
+    return entry
+
+def record_failure(db: Session, manifest, file_path, stat, content_hash, fund_id):
+    """
+    Reporte que no se pudo decodificar (XML corrupto): se guarda su huella con status 'failed'
+    para no volver a hashearlo ni decodificarlo mientras el contenido no cambie.
+    Las posiciones de una carga anterior buena (y su report_date) se conservan.
+    """
+    accession = accession_of(file_path)
+    entry = manifest.get(accession)
+    if entry is None:
+        entry = IngestManifest(accession=accession, fund_id=fund_id, stock_rows=0, derivative_rows=0)
+        db.add(entry)
+        manifest[accession] = entry
+
+    entry.file_path = str(file_path)
+    entry.file_size = stat.st_size
+    entry.file_mtime_ns = stat.st_mtime_ns
+    entry.content_hash = content_hash
+    entry.status = "failed"
+    return entry
+
+def touch_filing(entry, stat):
+    """Contenido idéntico pero con otra fecha de modificación: solo refrescamos la huella."""
+    entry.file_size = stat.st_size
+    entry.file_mtime_ns = stat.st_mtime_ns
@@ -1,6 +1,12 @@
 # src/etl/map_tickers.py
-from sqlalchemy import text
+from datetime import datetime
+import pandas as pd
 from src.database.connection import get_db
+from src.database.models import Company, TickerMatch
+from src.database.bulk import load_frame, update_frame
+from src.database.search import find_companies, ensure_search_index
+from src.etl.name_matcher import ensure_matches_table
+from src.database.query_service import bump_version
 
 # Diccionario de emergencia para las Top 30 empresas que mueven el mercado
 # Esto cubre probablemente el 70% del valor de los portafolios
@@ -28,22 +34,32 @@ MANUAL_MAP = {
 }
 
 def map_tickers():
+    # find_companies consulta name_search: en una DB sin migrar la tabla FTS5 todavía no existe
+    ensure_search_index()
     db = next(get_db())
+    ensure_matches_table()
     print("Asignando Tickers a las empresas Top...")
-    
-    count = 0
-    # Recorremos el diccionario y actualizamos la DB
+
+    # Cada patrón es una búsqueda de frase en el índice de nombres (antes: UPDATE ... LIKE '%...%' sobre toda la tabla)
+    found = {}
     for name_pattern, ticker in MANUAL_MAP.items():
-        # Usamos LIKE para encontrar "APPLE INC" o "APPLE INC."
-        query = text("UPDATE companies SET ticker = :t WHERE name LIKE :n AND ticker IS NULL")
-        result = db.execute(query, {"t": ticker, "n": f"%{name_pattern}%"})
-        
-        if result.rowcount > 0:
-            print(f"   {name_pattern} -> {ticker} ({result.rowcount} registros actualizados)")
-            count += result.rowcount
-            
+        for cid in find_companies(name_pattern, db):
+            found.setdefault(cid, ticker)  # Gana el primer patrón del diccionario
+    matched = pd.DataFrame(db.query(Company.id).filter(Company.id.in_(list(found)), Company.ticker == None).all(),
+                           columns=["id"])
+    matched["ticker"] = matched["id"].map(found)
+    for ticker, n in matched["ticker"].value_counts(sort=False).items():
+        print(f"   {ticker} ({n} registros actualizados)")
+
+    count = update_frame(db, Company, matched[["id", "ticker"]])
+    # Decisión manual: el matcher automático ya no vuelve a evaluar estas empresas
+    load_frame(db, TickerMatch, pd.DataFrame({
+        "company_id": matched["id"], "method": "manual", "score": 1.0, "ticker": matched["ticker"],
+        "decided_at": datetime.utcnow()}), ['company_id'], ["*"])
+
     db.commit()
     db.close()
+    bump_version("map_tickers")
     print(f"Mapeo terminado. {count} empresas ahora tienen Ticker y son rastreables.")
 
 if __name__ == "__main__":
@@ -1,77 +1,167 @@
-# src/etl/market_data.py (Versión Final: Precios + Metadatos)
-import yfinance as yf
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from src.database.connection import get_db
-from src.database.models import Company, StockPrice
+# src/etl/market_data.py (Versión 2: Descarga por lotes multi-ticker + Proveedores intercambiables + Carga vectorizada)
+import argparse
+import tempfile
 import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from src.database.connection import get_db, DB_CONFIG
+from src.database.backends import create_sqlite_engine
+from src.database.models import Base, Company, StockPrice
+from src.database.bulk import load_frame
+from src.database.price_store import sync_store
+from src.database.query_service import bump_version
+from src.etl.price_providers import make_provider, PROVIDERS
+
+CHUNK_TICKERS = 100  # Tickers por petición multi-ticker
+HISTORY_DAYS = 365 * 3  # Rango inicial: últimos 3 años (coincide con nuestros datos 13F)
+
+def plan_downloads(db, end_date):
+    """
+    Agrupa los tickers por fecha de inicio requerida: {start: {ticker: [company_id, ...]}}.
+    Varias empresas (clases de acción) pueden compartir ticker: se descarga una vez, desde la fecha
+    más antigua que necesite cualquiera de ellas, y las filas se reparten a todas.
+    Las últimas fechas salen de UN solo GROUP BY (no una consulta por empresa).
+    """
+    last_dates = dict(db.query(StockPrice.company_id, func.max(StockPrice.date)).group_by(StockPrice.company_id))
+    default_start = end_date - timedelta(days=HISTORY_DAYS)
 
-def fetch_market_data():
+    starts, ids_by_ticker = {}, defaultdict(list)
+    for cid, ticker in db.query(Company.id, Company.ticker).filter(Company.ticker != None):
+        last = last_dates.get(cid)
+        start = last + timedelta(days=1) if last else default_start
+        if start >= end_date: continue  # Ya actualizado
+        starts[ticker] = min(start, starts.get(ticker, start))
+        ids_by_ticker[ticker].append(cid)
+
+    groups = defaultdict(dict)
+    for ticker, start in starts.items():
+        groups[start][ticker] = ids_by_ticker[ticker]
+    return groups
+
+def to_price_frame(df, ids_by_ticker):
+    """
+    Formato del proveedor (ticker, date, close, volume) -> columnas de 'stock_prices' (vectorizado).
+    ids_by_ticker = {ticker: [company_id, ...]}: cada fila se repite para todas las empresas del ticker.
+    """
+    ids = pd.DataFrame([(t, cid) for t, cids in ids_by_ticker.items() for cid in cids],
+                       columns=["ticker", "company_id"])
+    rows = df[["ticker", "date", "close", "volume"]].merge(ids, on="ticker")
+    return pd.DataFrame({
+        "company_id": rows["company_id"].astype(np.int64),
+        "date": pd.to_datetime(rows["date"]),
+        "close_price": rows["close"].astype(np.float64),
+        "volume": rows["volume"].astype(np.float64).fillna(0.0),
+    })
+
+def fetch_market_data(provider="yahoo", path=None, chunk=CHUNK_TICKERS):
+    provider = make_provider(provider, path)
     db = next(get_db())
-    
-    # Traer empresas con Ticker
-    companies = db.query(Company).filter(Company.ticker != None).all()
-    print(f" Descargando precios históricos para {len(companies)} empresas...")
-    
-    # Rango: Últimos 3 años (coincide con nuestros datos 13F)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=365*3)
-    
-    for c in companies:
-        print(f"    {c.ticker}...", end=" ")
-        
-        try:
-            # 1. Metadatos (Sector/Industria) si faltan
-            if not c.sector or c.sector == "Unknown":
-                tick_info = yf.Ticker(c.ticker).info
-                c.sector = tick_info.get('sector', 'Unknown')
-                c.industry = tick_info.get('industry', 'Unknown')
-                c.country = tick_info.get('country', 'Unknown')
-                c.description = tick_info.get('longBusinessSummary', '')[:500]
-                db.commit()
-                print(f"[Info Updated]", end=" ")
-
-            # 2. Precios
-            # Verificamos si ya tiene precios recientes para no bajar todo de nuevo
-            last_price = db.query(StockPrice).filter(StockPrice.company_id == c.id).order_by(StockPrice.date.desc()).first()
-            
-            if last_price:
-                current_start = last_price.date + timedelta(days=1)
-                if current_start >= end_date.date():
-                    print(" Actualizado.")
-                    continue
-            else:
-                current_start = start_date
-
-            # Descarga
-            df = yf.download(c.ticker, start=current_start, end=end_date, progress=False, multi_level_index=False)
-            
-            if df.empty:
-                print(" Sin datos nuevos.")
+
+    end_date = datetime.now().date()
+    groups = plan_downloads(db, end_date)
+    n_tickers = sum(len(g) for g in groups.values())
+    n_companies = sum(len(ids) for g in groups.values() for ids in g.values())
+    print(f" Descargando precios para {n_companies} empresas ({n_tickers} tickers) en {len(groups)} grupos por fecha ({provider.name})...")
+
+    t0 = time.perf_counter()
+    total = 0
+    for start, members in sorted(groups.items()):
+        tickers = list(members)
+        for i in range(0, len(tickers), chunk):
+            batch = tickers[i:i + chunk]
+            ids_by_ticker = {t: members[t] for t in batch}
+            try:
+                df = provider.download(batch, start, end_date)
+            except Exception as e:
+                print(f"    Lote desde {start} ({len(batch)} tickers): {e}")
                 continue
-                
-            prices_batch = []
-            for dt, row in df.iterrows():
-                # Manejo de escalares de pandas
-                close = row['Close'].item() if hasattr(row['Close'], 'item') else row['Close']
-                vol = row['Volume'].item() if hasattr(row['Volume'], 'item') else row['Volume']
-                
-                prices_batch.append(StockPrice(
-                    company_id=c.id,
-                    date=dt.date(),
-                    close_price=float(close),
-                    volume=float(vol)
-                ))
-            
-            db.bulk_save_objects(prices_batch)
+            if df.empty: continue
+
+            frame = to_price_frame(df, ids_by_ticker)
+            # Llave natural (company_id, date): si el proveedor corrige un cierre, se actualiza
+            load_frame(db, StockPrice, frame, ['company_id', 'date'], ["*"])
             db.commit()
-            print(f" +{len(prices_batch)} días.")
-            
-        except Exception as e:
-            print(f" {e}")
-            
+            total += len(frame)
+            print(f"    Desde {start}: {len(batch)} tickers -> +{len(frame)} filas")
+
     db.close()
-    print(" Tabla 'stock_prices' lista.")
+    elapsed = time.perf_counter() - t0
+    print(f" Tabla 'stock_prices' lista: {total} filas en {provider.requests} peticiones ({elapsed:.1f}s).")
+    # Matriz densa memory-mapped para rendimientos/correlaciones (solo añade lo nuevo)
+    sync_store()
+    bump_version("market_data")
+
+# BENCHMARK: carga de un backfill sintético (tickers x 3 años) en una SQLite temporal
+def _synthetic_prices(n_tickers, days):
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    rng = np.random.default_rng(0)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, (days, n_tickers)), axis=0)
+    return pd.DataFrame({
+        "ticker": np.repeat([f"T{i}" for i in range(n_tickers)], days),
+        "date": np.tile(dates.to_numpy(), n_tickers),
+        "close": close.T.ravel(),
+        "volume": rng.integers(1_000, 10_000_000, n_tickers * days).astype(np.float64),
+    })
+
+def _legacy_load(db, df, ids_by_ticker):
+    """Camino anterior: iterrows + .item() + un StockPrice por fila + bulk_save_objects, empresa por empresa."""
+    for ticker, sub in df.groupby("ticker", sort=False):
+        objs = []
+        for _, row in sub.set_index("date").iterrows():
+            close = row['close'].item() if hasattr(row['close'], 'item') else row['close']
+            vol = row['volume'].item() if hasattr(row['volume'], 'item') else row['volume']
+            objs.extend(StockPrice(company_id=cid, date=row.name.date(), close_price=float(close), volume=float(vol))
+                        for cid in ids_by_ticker[ticker])
+        db.bulk_save_objects(objs)
+        db.commit()
+
+def _vectorized_load(db, df, ids_by_ticker, chunk=CHUNK_TICKERS):
+    tickers = df["ticker"].unique()
+    for i in range(0, len(tickers), chunk):
+        sub = df[df["ticker"].isin(tickers[i:i + chunk])]
+        load_frame(db, StockPrice, to_price_frame(sub, ids_by_ticker), ['company_id', 'date'], ["*"])
+        db.commit()
+
+def benchmark(n_tickers=5000, years=3, legacy_tickers=500):
+    """rows/s del camino anterior (sobre legacy_tickers) contra load_frame (sobre n_tickers)."""
+    days = 252 * years
+    df = _synthetic_prices(n_tickers, days)
+    ids_by_ticker = {f"T{i}": [i + 1] for i in range(n_tickers)}
+    print(f"Benchmark de carga: {n_tickers} tickers x {days} días = {len(df):,} filas (SQLite temporal)")
+
+    results = {}
+    for label, loader, sample in (("legacy (iterrows + ORM)", _legacy_load, legacy_tickers),
+                                  ("load_frame (executemany)", _vectorized_load, n_tickers)):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = {"sqlite": {"url": f"sqlite:///{Path(tmp) / 'bench.db'}", "pragmas": DB_CONFIG["sqlite"].get("pragmas") or {}}}
+            engine = create_sqlite_engine(config)
+            Base.metadata.create_all(bind=engine, tables=[Company.__table__, StockPrice.__table__])
+            db = sessionmaker(bind=engine)()
+            part = df[df["ticker"].isin([f"T{i}" for i in range(min(sample, n_tickers))])]
+            t0 = time.perf_counter()
+            loader(db, part, ids_by_ticker)
+            elapsed = time.perf_counter() - t0
+            db.close()
+            engine.dispose()
+        results[label] = len(part) / elapsed
+        print(f"   {label:<26} {len(part):>10,} filas en {elapsed:7.2f}s -> {results[label]:>12,.0f} filas/s")
+    speedup = results["load_frame (executemany)"] / results["legacy (iterrows + ORM)"]
+    print(f"   Aceleración: {speedup:.1f}x")
 
 if __name__ == "__main__":
-    fetch_market_data()
+    cli = argparse.ArgumentParser(description="Descarga de precios históricos (stock_prices)")
+    cli.add_argument("--provider", choices=sorted(PROVIDERS), default="yahoo")
+    cli.add_argument("--path", help="Carpeta o archivo CSV/Parquet para --provider local")
+    cli.add_argument("--chunk", type=int, default=CHUNK_TICKERS, help="Tickers por petición")
+    cli.add_argument("--benchmark", type=int, metavar="TICKERS", nargs="?", const=5000,
+                     help="Comparar la carga anterior con load_frame en un backfill sintético de 3 años")
+    args = cli.parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        fetch_market_data(args.provider, args.path, args.chunk)
@@ -1,91 +1,70 @@
 # src/etl/master_ticker_map.py
-import requests
+import argparse
+import time
 import pandas as pd
-from sqlalchemy import text
 from src.database.connection import get_db
 from src.database.models import Company
+from src.database.bulk import update_frame
+from src.database.query_service import bump_version
+from src.etl.name_matcher import ensure_matches_table, match_unmapped
+from src.etl.reference_cache import sec_lookup, sp500_tickers, snapshot_version
 
-def normalize_name(name):
-    """Limpia el nombre para mejorar el match (QUITA INC, CORP, LTD, PUNTOS)."""
-    if not name: return ""
-    name = name.upper()
-    remove_list = [" INC", " CORP", " CO", " LTD", " PLC", " AG", " SA", ".", ","]
-    for word in remove_list:
-        name = name.replace(word, "")
-    return name.strip()
-
-def run_master_mapping():
+def run_master_mapping(offline=None, refresh=False):
     db = next(get_db())
     print("Iniciando Mapeo Maestro de Tickers y S&P 500...")
+    ttl = 0 if refresh else None  # refresh -> revalidar ya (GET condicional), sin esperar al TTL
 
-    # --- 1. OBTENER DICCIONARIO OFICIAL SEC ---
-    print("Descargando company_tickers.json de la SEC...", end=" ")
-    headers = {'User-Agent': 'Institutional Radar Project (education@example.com)'}
-    url = "https://www.sec.gov/files/company_tickers.json"
-    
+    # --- 1. DICCIONARIO OFICIAL SEC (caché de referencia: solo se descarga si cambió) ---
+    t0 = time.perf_counter()
+    print("Cargando company_tickers.json de la SEC...", end=" ")
     try:
-        r = requests.get(url, headers=headers)
-        raw_data = r.json()
-        # Convertir a DataFrame
-        sec_df = pd.DataFrame.from_dict(raw_data, orient='index')
-        # Normalizar nombres del SEC
-        sec_df['clean_title'] = sec_df['title'].apply(normalize_name)
-        print(f"Listo. {len(sec_df)} empresas oficiales cargadas.")
+        sec_map = sec_lookup(offline, ttl)
+        print(f"Listo. {len(sec_map)} empresas oficiales cargadas.")
     except Exception as e:
-        print(f"Error descargando SEC data: {e}")
+        print(f"Error cargando SEC data: {e}")
         return
 
-    # --- 2. OBTENER LISTA S&P 500 (Wikipedia) ---
-    print("Descargando lista S&P 500 de Wikipedia...", end=" ")
+    # --- 2. LISTA S&P 500 (Wikipedia, misma caché) ---
+    print("Cargando lista S&P 500 de Wikipedia...", end=" ")
     try:
-        sp500_table = pd.read_html('https://en.wikipedia.org/wiki/List_of_S%26P_500_companies')[0]
-        sp500_tickers = set(sp500_table['Symbol'].unique())
-        print(f"Listo. {len(sp500_tickers)} componentes identificados.")
+        sp500 = sp500_tickers(offline, ttl)
+        print(f"Listo. {len(sp500)} componentes identificados.")
     except Exception as e:
-        print(f" Error descargando S&P 500: {e}")
-        sp500_tickers = set()
+        print(f" Error cargando S&P 500: {e}")
+        sp500 = frozenset()
+    print(f"Datos de referencia listos en {(time.perf_counter() - t0) * 1000:.0f} ms.")
+
+    # --- 3. MAPEO DE TICKERS (solo empresas sin ticker ni decisión previa; ver name_matcher.py) ---
+    ensure_matches_table()
+    t1 = time.perf_counter()
+    decisions = match_unmapped(db, sec_map, snapshot_version("sec_company_tickers"))
+    methods = decisions["method"].value_counts()
+    print(f"Analizadas {len(decisions)} empresas pendientes en {time.perf_counter() - t1:.2f}s.")
 
-    # --- 3. PROCESO DE MAPEO EN BASE DE DATOS ---
-    # Traemos empresas que NO tienen Ticker o NO sabemos si son SP500
-    companies = db.query(Company).all()
-    print(f"Analizando {len(companies)} empresas en nuestra DB...")
-    
-    updated_tickers = 0
+    # --- 4. FLAGS S&P 500 (solo las empresas cuyo flag cambia) ---
     updated_sp500 = 0
-    
-    # Creamos un diccionario rápido para búsqueda por nombre {NOMBRE_LIMPIO: (TICKER, CIK)}
-    sec_map = dict(zip(sec_df['clean_title'], zip(sec_df['ticker'], sec_df['cik_str'])))
+    if sp500:
+        flags = pd.DataFrame(db.query(Company.id, Company.ticker, Company.is_sp500).filter(Company.ticker != None).all(),
+                             columns=["id", "ticker", "is_sp500"])
+        flags["in_sp"] = flags["ticker"].isin(sp500)
+        changed = flags[flags["in_sp"] != flags["is_sp500"].fillna(False).astype(bool)]
+        updated_sp500 = update_frame(db, Company, pd.DataFrame({"id": changed["id"], "is_sp500": changed["in_sp"]}))
 
-    for c in companies:
-        cambio = False
-        
-        # A. INTENTAR LLENAR TICKER SI FALTA
-        if not c.ticker:
-            my_clean_name = normalize_name(c.name)
-            match = sec_map.get(my_clean_name)
-            
-            if match:
-                c.ticker = match[0]
-                c.cik = str(match[1]).zfill(10) # Guardamos el CIK de la empresa también
-                updated_tickers += 1
-                cambio = True
-        
-        # B. VERIFICAR S&P 500 (Si tiene ticker)
-        if c.ticker:
-            is_in_sp = c.ticker in sp500_tickers
-            if c.is_sp500 != is_in_sp:
-                c.is_sp500 = is_in_sp
-                updated_sp500 += 1
-                cambio = True
-    
     db.commit()
     db.close()
-    
+    bump_version("master_ticker_map")
+
     print("-" * 50)
     print(f" RESULTADOS:")
-    print(f"   - Tickers Nuevos Asignados: {updated_tickers}")
+    print(f"   - Tickers Nuevos Asignados: {methods.get('exact', 0) + methods.get('fuzzy', 0)} "
+          f"(exactos: {methods.get('exact', 0)}, difusos: {methods.get('fuzzy', 0)})")
+    print(f"   - Sin Match (no se recalculan hasta un snapshot SEC nuevo): {methods.get('none', 0)}")
     print(f"   - Flags S&P 500 Actualizados: {updated_sp500}")
     print("-" * 50)
 
 if __name__ == "__main__":
-    run_master_mapping()
+    cli = argparse.ArgumentParser(description="Tickers oficiales (SEC) y flags S&P 500")
+    cli.add_argument("--offline", action="store_true", help="Usar solo los snapshots locales (sin red)")
+    cli.add_argument("--refresh", action="store_true", help="Revalidar ya los datos de referencia (ignora el TTL)")
+    args = cli.parse_args()
+    run_master_mapping(offline=args.offline or None, refresh=args.refresh)
@@ -0,0 +1,203 @@
+# src/etl/name_matcher.py
+# Motor de matching: nombre de la empresa en el 13F -> título oficial de la SEC (ticker + CIK).
+#   1. Exacto: mismo normalize_name (búsqueda binaria sobre NameLookup).
+#   2. Difuso con bloqueo: solo se comparan pares que comparten un token del título, y solo tokens
+#      "raros" abren bloque (HOLDINGS, GROUP, BANCORP... aparecen en cientos de títulos y no discriminan).
+#      Cada par candidato se puntúa con Jaccard de trigramas, vectorizado en NumPy sobre todo el lote.
+# Solo se procesan empresas sin ticker y sin decisión previa. Cada decisión (incluido "sin match")
+# queda en 'ticker_matches' y no se recalcula; los "sin match" se reintentan con un snapshot SEC más nuevo.
+import sys
+import time
+from datetime import datetime
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, or_
+from sqlalchemy.orm import Session
+from src.database.connection import engine, get_db
+from src.database.models import Company, TickerMatch
+from src.database.bulk import load_frame, update_frame
+from src.etl.reference_cache import NameLookup, normalize_name
+
+# CONFIGURACIÓN
+MIN_SCORE = 0.75     # Jaccard de trigramas mínimo para aceptar un match difuso
+MIN_MARGIN = 0.05    # El mejor candidato debe superar al segundo por este margen (si no, es ambiguo)
+MAX_BLOCK = 100      # Un token presente en más títulos SEC no abre bloque
+MIN_TOKEN = 2        # Tokens más cortos (iniciales, "&") no abren bloque
+PAIR_CHUNK = 2_000   # Empresas por lote de pares (acota la memoria)
+_CODE_BITS = 24      # Un trigrama son 3 bytes -> 24 bits; la fila va en los bits de arriba
+_CODE_MASK = (1 << _CODE_BITS) - 1
+
+def ensure_matches_table():
+    """Crea la tabla de decisiones en bases de datos antiguas (idempotente)."""
+    TickerMatch.__table__.create(bind=engine, checkfirst=True)
+
+# ÍNDICE DE BLOQUEO
+def _ragged(starts, counts):
+    """Posiciones starts[i] .. starts[i] + counts[i] - 1 de todos los i, concatenadas (sin bucle)."""
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+def _trigrams(names):
+    """
+    Trigramas únicos de cada nombre (con un espacio de relleno a cada lado), en formato CSR:
+    keys = fila << 24 | trigrama, ordenado; los de la fila i están en keys[ptr[i]:ptr[i + 1]].
+    """
+    padded = [f" {n} ".encode("ascii", "replace") for n in names]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    buf = np.frombuffer(b"".join(padded), dtype=np.uint8).astype(np.int64)
+    counts = np.maximum(lengths - 2, 0)
+    pos = _ragged(np.cumsum(lengths) - lengths, counts)
+    codes = buf[pos] << 16 | buf[pos + 1] << 8 | buf[pos + 2]
+    owner = np.repeat(np.arange(len(padded), dtype=np.int64), counts)
+    keys = np.unique(owner << _CODE_BITS | codes)
+    ptr = np.searchsorted(keys >> _CODE_BITS, np.arange(len(padded) + 1))
+    return ptr, keys
+
+def _tokens(names):
+    """(token, row) únicos de cada nombre."""
+    s = pd.Series(list(names), dtype=object).str.split().explode().dropna()
+    df = pd.DataFrame({"token": s.to_numpy(), "row": s.index.to_numpy(dtype=np.int64)})
+    return df[df["token"].str.len() >= MIN_TOKEN].drop_duplicates()
+
+class BlockingIndex(NamedTuple):
+    """Títulos SEC preparados para el matching difuso."""
+    lookup: NameLookup
+    ptr: np.ndarray        # CSR de trigramas por título
+    keys: np.ndarray
+    blocks: pd.DataFrame   # (token, row) solo de tokens con <= MAX_BLOCK títulos
+
+def build_index(lookup: NameLookup):
+    names = np.asarray(lookup.names)
+    ptr, keys = _trigrams(names)
+    tokens = _tokens(names)
+    size = tokens.groupby("token")["row"].transform("size")
+    return BlockingIndex(lookup, ptr, keys, tokens[size <= MAX_BLOCK])
+
+# PUNTUACIÓN
+def score_pairs(c_ptr, c_keys, index: BlockingIndex, crow, srow):
+    """Jaccard de trigramas de cada par (empresa crow[k], título srow[k]); todos los pares a la vez."""
+    if len(crow) == 0 or len(index.keys) == 0:
+        return np.zeros(len(crow))
+    c_len = np.diff(c_ptr)[crow]
+    pair = np.repeat(np.arange(len(crow)), c_len)
+    codes = c_keys[_ragged(c_ptr[:-1][crow], c_len)] & _CODE_MASK
+    probe = srow[pair] << _CODE_BITS | codes
+    pos = np.minimum(np.searchsorted(index.keys, probe), len(index.keys) - 1)
+    inter = np.bincount(pair, weights=index.keys[pos] == probe, minlength=len(crow))
+    union = c_len + np.diff(index.ptr)[srow] - inter
+    return np.divide(inter, union, out=np.zeros(len(crow)), where=union > 0)
+
+def fuzzy_match(index: BlockingIndex, clean_names):
+    """
+    Mejor título SEC para cada nombre limpio: (fila, score, aceptado) con fila = -1 si no hubo candidatos.
+    Se acepta si score >= MIN_SCORE y no hay un segundo candidato (de otro ticker) a menos de MIN_MARGIN.
+    """
+    n = len(clean_names)
+    best_row = np.full(n, -1, dtype=np.int64)
+    best_score = np.zeros(n)
+    accepted = np.zeros(n, dtype=bool)
+    tickers = index.lookup.tickers
+
+    for lo in range(0, n, PAIR_CHUNK):
+        chunk = clean_names[lo:lo + PAIR_CHUNK]
+        pairs = _tokens(chunk).merge(index.blocks, on="token", suffixes=("_c", "_s"))
+        pairs = pairs[["row_c", "row_s"]].drop_duplicates()
+        if pairs.empty: continue
+        crow = pairs["row_c"].to_numpy(dtype=np.int64)
+        srow = pairs["row_s"].to_numpy(dtype=np.int64)
+        c_ptr, c_keys = _trigrams(chunk)
+        score = score_pairs(c_ptr, c_keys, index, crow, srow)
+
+        # Por empresa: mejor y segundo mejor candidato
+        order = np.lexsort((-score, crow))
+        crow, srow, score = crow[order], srow[order], score[order]
+        first = np.flatnonzero(np.r_[True, crow[1:] != crow[:-1]])
+        has_second = np.r_[first[1:], len(crow)] - first > 1
+        second = np.where(has_second, first + 1, first)
+        margin = np.where(has_second & (tickers[srow[second]] != tickers[srow[first]]),
+                          score[first] - score[second], 1.0)
+
+        rows = lo + crow[first]
+        best_row[rows] = srow[first]
+        best_score[rows] = score[first]
+        accepted[rows] = (score[first] >= MIN_SCORE) & (margin >= MIN_MARGIN)
+    return best_row, best_score, accepted
+
+# MAPEO INCREMENTAL
+def pending_companies(db: Session, ref_version):
+    """Empresas sin ticker y sin decisión vigente: (ids, nombres)."""
+    decided = select(TickerMatch.company_id).where(or_(
+        TickerMatch.method != 'none', func.coalesce(TickerMatch.ref_version, 0) >= ref_version))
+    rows = db.query(Company.id, Company.name).filter(Company.ticker == None, Company.id.not_in(decided)).all()
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    return ids, [r[1] for r in rows]
+
+def match_unmapped(db: Session, lookup: NameLookup, ref_version):
+    """
+    Asigna ticker y CIK a las empresas pendientes (exacto y luego difuso) y guarda cada decisión.
+    No hace commit. Devuelve el DataFrame de decisiones (columnas de 'ticker_matches').
+    """
+    ids, names = pending_companies(db, ref_version)
+    if len(ids) == 0 or len(lookup) == 0:
+        return pd.DataFrame(columns=["company_id", "method", "score", "ticker"])
+
+    clean = np.array([normalize_name(n) for n in names], dtype=str)
+    sec_names = np.asarray(lookup.names)
+
+    # 1. Exacto (búsqueda binaria sobre los títulos ordenados)
+    row = np.minimum(np.searchsorted(sec_names, clean), len(sec_names) - 1)
+    exact = (sec_names[row] == clean) & (clean != "")
+    score = exact.astype(np.float64)
+    method = np.where(exact, "exact", "none").astype(object)
+
+    # 2. Difuso con bloqueo, solo sobre lo que no salió exacto
+    rest = np.flatnonzero(~exact)
+    if len(rest):
+        fuzzy_row, fuzzy_score, accepted = fuzzy_match(build_index(lookup), clean[rest])
+        row[rest] = fuzzy_row
+        score[rest] = fuzzy_score
+        method[rest[accepted]] = "fuzzy"
+
+    found = row >= 0
+    decisions = pd.DataFrame({
+        "company_id": ids,
+        "method": method,
+        "score": score,
+        "sec_name": np.where(found, sec_names[row], None),
+        "ticker": np.where(found, np.asarray(lookup.tickers)[row], None),
+        "cik": np.where(found, [str(c).zfill(10) for c in np.asarray(lookup.ciks)[row]], None),
+        "ref_version": ref_version,
+        "decided_at": datetime.utcnow(),
+    })
+    # Un 'none' guarda el mejor candidato (para revisión), pero no toca 'companies'
+    load_frame(db, TickerMatch, decisions, ['company_id'], ["*"])
+    matched = decisions[decisions["method"] != "none"]
+    update_frame(db, Company, pd.DataFrame({
+        "id": matched["company_id"], "ticker": matched["ticker"], "cik": matched["cik"]}))
+    return decisions
+
+def summary(db: Session):
+    """Decisiones guardadas por método: {method: (empresas, score medio)}."""
+    rows = db.execute(select(TickerMatch.method, func.count(), func.avg(TickerMatch.score)).group_by(TickerMatch.method))
+    return {method: (n, avg) for method, n, avg in rows}
+
+if __name__ == "__main__":
+    ensure_matches_table()
+    db = next(get_db())
+    if len(sys.argv) > 1:
+        # Diagnóstico: python -m src.etl.name_matcher "NOMBRE EN EL 13F"
+        from src.etl.reference_cache import sec_lookup
+        t0 = time.perf_counter()
+        index = build_index(sec_lookup())
+        print(f"Índice de bloqueo: {len(index.lookup)} títulos, {len(index.blocks)} entradas ({time.perf_counter() - t0:.2f}s)")
+        clean = np.array([normalize_name(sys.argv[1])], dtype=str)
+        row, score, accepted = fuzzy_match(index, clean)
+        if row[0] < 0:
+            print(f"   '{clean[0]}': sin candidatos")
+        else:
+            print(f"   '{clean[0]}' -> '{index.lookup.names[row[0]]}' ({index.lookup.tickers[row[0]]}) "
+                  f"score={score[0]:.2f} {'ACEPTADO' if accepted[0] else 'rechazado'}")
+    for method, (n, avg) in sorted(summary(db).items()):
+        print(f"   {method:<8} {n:>7} empresas | score medio {avg:.2f}")
+    db.close()
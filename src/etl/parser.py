@@ -1,161 +1,270 @@
-# src/etl/parser.py (Versión 2.0 - Con soporte para Derivados)
-import re
+# src/etl/parser.py (Versión 3.3 - Caché de identidad + Lotes + Multiproceso + Carga Incremental + Caché binaria)
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from datetime import datetime
+from typing import NamedTuple
+import numpy as np
 from sqlalchemy.orm import Session
-from src.database.connection import get_db
+from src.database.connection import get_db, BACKEND
+from src.database.bulk import insert_ignore, report_load_stats
 from src.database.models import Fund, Company, Holding, DerivativePosition
+from src.etl import manifest as mf
+from src.etl import filing_cache
+from src.database.quarters import quarter_of
+from src.features.portfolio_summary import refresh_summaries
+from src.features.position_changes import refresh_changes
+from src.database.query_service import bump_version
 
 # CONFIGURACIÓN
 BASE_DIR = Path(__file__).resolve().parents[2]
 DATA_RAW_PATH = BASE_DIR / "data" / "raw"
 
-NAMESPACES = {
-    'ns1': 'http://www.sec.gov/edgar/document/thirteenf/informationtable',
-    'ns2': 'http://www.sec.gov/edgar/thirteenf/informationtable'
-}
+IN_CHUNK = 500  # Tamaño de lote para cláusulas IN (límite de variables de SQLite)
+COMMIT_EVERY = 8  # Reportes por transacción en el escritor
+
+# Llaves naturales (índices únicos en models.py)
+HOLDING_KEY = ['fund_id', 'company_id', 'report_date']
+DERIVATIVE_KEY = ['fund_id', 'company_id', 'report_date', 'derivative_type']
+
+def _chunks(seq, size=IN_CHUNK):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def load_identity_maps(db: Session):
+    """Carga UNA vez por corrida los mapas {CIK: fund_id} y {CUSIP: company_id}."""
+    fund_map = {cik: fid for cik, fid in db.query(Fund.cik, Fund.id)}
+    comp_map = {cusip: cid for cusip, cid in db.query(Company.cusip, Company.id)}
+    return fund_map, comp_map
+
+def resolve_fund_id(cik, fund_map):
+    """Intento exacto y luego "sin ceros" (carpeta 000123 vs DB 123)."""
+    return fund_map.get(cik) or fund_map.get(cik.lstrip("0"))
+
+class Positions(NamedTuple):
+    """Posiciones consolidadas de un reporte (columnar, una entrada por CUSIP y tipo)."""
+    cusip: np.ndarray
+    name: np.ndarray
+    put_call: np.ndarray   # '' = acción común, 'PUT'/'CALL' = derivado
+    shares: np.ndarray
+    value: np.ndarray
+
+    def __len__(self):
+        return len(self.cusip)
+
+def aggregate_batch(batch):
+    """
+    Consolida (vectorizado) las filas de un reporte por CUSIP y tipo.
+    Un mismo CUSIP puede venir en varias filas (otros managers, discreción compartida);
+    la posición real del fondo es la SUMA de todas ellas.
+    El mismo lote alimenta acciones y derivados: put_call separa ambos.
+    """
+    valid = (batch.cusip != "") & ~np.isnan(batch.value)
+    cusip, put_call = batch.cusip[valid], batch.put_call[valid]
+
+    keys = np.char.add(np.char.add(cusip, "|"), put_call)
+    uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    names = batch.name[valid][first]
+    return Positions(
+        cusip=cusip[first],
+        name=np.where(names == "", cusip[first], names),
+        put_call=put_call[first],
+        shares=np.bincount(inverse, weights=batch.shares[valid], minlength=len(uniq)),
+        value=np.bincount(inverse, weights=batch.value[valid], minlength=len(uniq)),
+    )
+
+def ensure_companies(db: Session, positions, comp_map):
+    """Crea en lote las empresas nuevas y actualiza el mapa en memoria con sus IDs."""
+    cusips, first = np.unique(positions.cusip, return_index=True)
+    new = [(c, n) for c, n in zip(cusips.tolist(), positions.name[first].tolist()) if c not in comp_map]
+    if not new: return 0
+
+    insert_ignore(db, Company, [{"name": n, "cusip": c, "sector": "Unknown"} for c, n in new], ['cusip'])
+
+    for chunk in _chunks([c for c, _ in new]):
+        for cusip, cid in db.query(Company.cusip, Company.id).filter(Company.cusip.in_(chunk)):
+            comp_map[cusip] = cid
+    return len(new)
+
+def write_filing(db: Session, fund_id, report_date, positions, comp_map, commit=True):
+    """
+    Inserta las posiciones de un reporte con operaciones por conjunto.
+    Lo ya cargado se ignora vía ON CONFLICT sobre la llave natural (índices únicos): sin consultas previas.
+    """
+    ensure_companies(db, positions, comp_map)
+    company_ids = np.fromiter((comp_map[c] for c in positions.cusip.tolist()), dtype=np.int64, count=len(positions))
+    is_deriv = positions.put_call != ""
+
+    s = ~is_deriv
+    holding_rows = [
+        {"fund_id": fund_id, "company_id": cid, "report_date": report_date, "shares": sh, "value": val}
+        for cid, sh, val in zip(company_ids[s].tolist(), positions.shares[s].tolist(), positions.value[s].tolist())
+    ]
+    d = is_deriv
+    deriv_rows = [
+        {"fund_id": fund_id, "company_id": cid, "report_date": report_date,
+         "derivative_type": pc, "shares_underlying": sh, "value": val}
+        for cid, pc, sh, val in zip(company_ids[d].tolist(), positions.put_call[d].tolist(),
+                                    positions.shares[d].tolist(), positions.value[d].tolist())
+    ]
+
+    count_stock = insert_ignore(db, Holding, holding_rows, HOLDING_KEY)
+    count_deriv = insert_ignore(db, DerivativePosition, deriv_rows, DERIVATIVE_KEY)
+    if commit: db.commit()
+    return count_stock, count_deriv
+
+def decode_filing(file_path, known_hash=None, use_cache=True):
+    """
+    Parte CPU del trabajo (sin tocar la DB): XML -> posiciones consolidadas en arrays (Positions).
+    Se puede ejecutar en un proceso hijo; el resultado viaja serializado al escritor.
+    Si el hash coincide con known_hash (contenido ya cargado) no se decodifica nada.
+    Si el reporte ya está en la caché binaria (data/processed/filings) no se toca el XML.
+    Devuelve (report_date, content_hash, decoded); decoded es None si no hay nada que escribir.
+    """
+    content_hash = mf.file_sha256(file_path)
+    if content_hash == known_hash:
+        return None, content_hash, None
 
-def extract_xml_from_text(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-        match = re.search(r'<informationTable.*?>.*?</informationTable>', content, re.DOTALL | re.IGNORECASE)
-        if match: return match.group(0)
-        return None
-    except Exception as e:
-        print(f"      Error leyendo archivo {file_path.name}: {e}")
-        return None
-
-def parse_13f_filing(file_path, cik, db: Session):
+        report_date, batch, _ = filing_cache.load_or_decode(file_path, content_hash, use_cache)
+        return report_date, content_hash, aggregate_batch(batch)
+    except ET.ParseError as e:
+        print(f"      XML corrupto en {file_path.name}: {e}")
+        return None, content_hash, None
+
+def parse_13f_filing(file_path, cik, db: Session, fund_map=None, comp_map=None, use_cache=True):
     print(f"  Procesando: {file_path.name}")
-    
-    xml_content = extract_xml_from_text(file_path)
-    if not xml_content: return
 
-    try:
-        root = ET.fromstring(xml_content)
-    except ET.ParseError: return
-
-    # Buscar el Fondo en la BD (Lógica Robusta)
-    # 1. Intento Exacto
-    fund = db.query(Fund).filter(Fund.cik == cik).first()
-    
-    # 2. Intento "Sin Ceros" (Si en la carpeta es 000123 y en la DB es 123)
-    if not fund:
-        cik_no_zeros = cik.lstrip("0")
-        fund = db.query(Fund).filter(Fund.cik == cik_no_zeros).first()
-
-    if not fund:
+    # Mapas de identidad (si no vienen de run_parser, los cargamos aquí)
+    if fund_map is None or comp_map is None:
+        fund_map, comp_map = load_identity_maps(db)
+
+    fund_id = resolve_fund_id(cik, fund_map)
+    if not fund_id:
         print(f"      CIK {cik} (ni {cik.lstrip('0')}) encontrado en tabla 'funds'. Ejecuta populate_funds.py")
-        return
+        return 0
 
-    report_date = datetime.fromtimestamp(file_path.stat().st_mtime).date()
-    
-    # Búsqueda de filas
-    rows = root.findall('.//{http://www.sec.gov/edgar/document/thirteenf/informationtable}infoTable')
-    if not rows:
-        rows = root.findall('.//{http://www.sec.gov/edgar/thirteenf/informationtable}infoTable')
-    
-    count_stock = 0
-    count_deriv = 0
-    
-    for row in rows:
-        def get_text(elem, tag):
-            for ns in NAMESPACES.values():
-                res = elem.find(f'{{{ns}}}{tag}')
-                if res is not None: return res.text
-            return elem.find(tag).text if elem.find(tag) is not None else None
-
-        name = get_text(row, 'nameOfIssuer')
-        cusip = get_text(row, 'cusip')
-        val_str = get_text(row, 'value')
-        put_call = get_text(row, 'putCall') # <--- AQUÍ ESTÁ LA MAGIA (PUT/CALL/None)
-        
-        # Extraer shares
-        shrs_node = None
-        for ns in NAMESPACES.values():
-            n = row.find(f'{{{ns}}}shrsOrPrnAmt')
-            if n is not None: 
-                shrs_node = n; break
-        if shrs_node is None: shrs_node = row.find('shrsOrPrnAmt')
-        shrs_str = get_text(shrs_node, 'sshPrnamt') if shrs_node is not None else "0"
-
-        if not cusip or not val_str: continue
-
-        # 1. Gestionar Empresa
-        company = db.query(Company).filter(Company.cusip == cusip).first()
-        if not company:
-            company = Company(name=name, cusip=cusip, sector="Unknown")
-            db.add(company)
-            db.flush()
-
-        # 2. Lógica de Derivados vs Acciones
-        if put_call in ['PUT', 'CALL']:
-            # Es un derivado
-            exists = db.query(DerivativePosition.id).filter(
-                DerivativePosition.fund_id == fund.id,
-                DerivativePosition.company_id == company.id,
-                DerivativePosition.report_date == report_date,
-                DerivativePosition.derivative_type == put_call
-            ).first()
-
-            if not exists:
-                deriv = DerivativePosition(
-                    fund_id=fund.id,
-                    company_id=company.id,
-                    report_date=report_date,
-                    derivative_type=put_call,
-                    value=float(val_str) * 1000,
-                    shares_underlying=float(shrs_str)
-                )
-                db.add(deriv)
-                count_deriv += 1
-        else:
-            # Es una acción común
-            exists = db.query(Holding.id).filter(
-                Holding.fund_id == fund.id,
-                Holding.company_id == company.id,
-                Holding.report_date == report_date
-            ).first()
-
-            if not exists:
-                holding = Holding(
-                    fund_id=fund.id,
-                    company_id=company.id,
-                    report_date=report_date,
-                    value=float(val_str) * 1000,
-                    shares=float(shrs_str)
-                )
-                db.add(holding)
-                count_stock += 1
-            
-    db.commit()
+    report_date, _, decoded = decode_filing(file_path, use_cache=use_cache)
+    if decoded is None: return 0
+    return sum(_store(db, file_path, fund_id, report_date, decoded, comp_map))
+
+def _store(db: Session, file_path, fund_id, report_date, positions, comp_map, commit=True):
+    count_stock, count_deriv = write_filing(db, fund_id, report_date, positions, comp_map, commit=commit)
     if count_stock > 0 or count_deriv > 0:
-        print(f"      Guardadas: {count_stock} Acciones | {count_deriv} Derivados (Puts/Calls)")
+        print(f"      {file_path.parent.name}: {count_stock} Acciones | {count_deriv} Derivados (Puts/Calls)")
+    n_deriv = int(np.count_nonzero(positions.put_call != ""))
+    return len(positions) - n_deriv, n_deriv
 
-def run_parser():
-    print("Iniciando Parser V2 (Soporte Derivados)...")
-    db = next(get_db())
-    
+def discover_filings(fund_map):
+    """Lista ORDENADA de (cik, fund_id, archivo) -> resultados deterministas entre corridas."""
     # Búsqueda recursiva mejorada
     all_folders = list(DATA_RAW_PATH.rglob("*"))
-    cik_folders = list(set([f for f in all_folders if f.is_dir() and f.name.isdigit() and len(f.name) > 4]))
-    
+    cik_folders = sorted(set([f for f in all_folders if f.is_dir() and f.name.isdigit() and len(f.name) > 4]))
+
+    jobs = []
+    for fund_folder in cik_folders:
+        cik = fund_folder.name
+        fund_id = resolve_fund_id(cik, fund_map)
+        if not fund_id:
+            print(f"   CIK {cik} no está en tabla 'funds'. Ejecuta populate_funds.py")
+            continue
+        for f in sorted(fund_folder.rglob("*.txt")):
+            jobs.append((cik, fund_id, f))
+    return cik_folders, jobs
+
+def _decode_in_order(tasks, workers):
+    """
+    Decodifica en un pool de procesos y entrega los resultados EN EL ORDEN de entrada.
+    Ventana acotada de tareas en vuelo: la memoria no crece si el escritor va más lento.
+    tasks: lista de (archivo, hash_conocido, usar_cache)
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield decode_filing(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(decode_filing, *task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def run_parser(workers=1, force=False, use_cache=True):
+    print(f"Iniciando Parser V3 (Caché de identidad + Lotes, {workers} proceso(s))...")
+    mf.ensure_manifest_table()
+    db = next(get_db())
+
+    # CACHÉ EN MEMORIA: una sola carga por corrida
+    fund_map, comp_map = load_identity_maps(db)
+    manifest = mf.load_manifest(db)
+    print(f"   Memorizados {len(fund_map)} Fondos, {len(comp_map)} Empresas y {len(manifest)} reportes ya cargados.")
+
+    cik_folders, jobs = discover_filings(fund_map)
     if not cik_folders:
         print(" ERROR: No encontré carpetas de CIK en data/raw")
         return
 
-    print(f"Procesando {len(cik_folders)} Fondos...")
-    for fund_folder in cik_folders:
-        cik = fund_folder.name
-        filing_files = list(fund_folder.rglob("*.txt"))
-        if filing_files:
-            print(f"\n Fondo CIK: {cik}")
-            for f in filing_files: parse_13f_filing(f, cik, db)
-    
+    # CARGA INCREMENTAL: descartar por stat() (sin abrir) los reportes que no cambiaron
+    pending = []
+    for cik, fund_id, path in jobs:
+        stat = path.stat()
+        entry = manifest.get(mf.accession_of(path))
+        if not force and mf.is_unchanged(entry, stat): continue
+        pending.append((cik, fund_id, path, stat, entry))
+
+    print(f"Procesando {len(pending)} reportes nuevos/modificados de {len(jobs)} en {len(cik_folders)} Fondos...")
+    t0 = time.perf_counter()
+    total_rows = 0
+    touched = set()  # (fund_id, trimestre) cuyos resúmenes y cambios de posición hay que recalcular
+
+    # Los procesos solo decodifican; ESTE proceso es el único escritor (sin contención del lock de SQLite).
+    # Las empresas nuevas se crean aquí, en orden, así que un mismo CUSIP visto por dos
+    # reportes en paralelo se inserta una sola vez y con el mismo nombre en cada corrida.
+    tasks = [(path, None if (force or entry is None) else entry.content_hash, use_cache)
+             for _, _, path, _, entry in pending]
+    decoded_stream = _decode_in_order(tasks, workers)
+    for i, ((cik, fund_id, path, stat, entry), (report_date, content_hash, decoded)) in enumerate(zip(pending, decoded_stream), 1):
+        if entry is not None and content_hash == entry.content_hash and not force:
+            mf.touch_filing(entry, stat)  # Solo cambió la fecha del archivo
+        elif decoded is not None:
+            if entry is not None:
+                mf.purge_filing_rows(db, entry)  # Versión anterior del mismo reporte
+                if entry.report_date is not None:
+                    touched.add((entry.fund_id, quarter_of(entry.report_date)))
+            n_stock, n_deriv = _store(db, path, fund_id, report_date, decoded, comp_map, commit=False)
+            mf.record_filing(db, manifest, path, stat, content_hash, fund_id, report_date, n_stock, n_deriv)
+            total_rows += n_stock + n_deriv
+            touched.add((fund_id, quarter_of(report_date)))
+        else:
+            mf.record_failure(db, manifest, path, stat, content_hash, fund_id)  # No se reintenta hasta que cambie
+        if i % COMMIT_EVERY == 0:
+            db.commit()
+
+    db.commit()
+    if touched:
+        print(f"Actualizando resúmenes y cambios de posición de {len(touched)} (fondo, trimestre)...")
+        refresh_summaries(db, keys=touched)
+        refresh_changes(db, keys=touched)
+        bump_version("parser")  # Invalida las respuestas en caché del servicio de lectura
     db.close()
-    print("\nETL Completado.")
+    elapsed = time.perf_counter() - t0
+    print(f"\nETL Completado. {total_rows} posiciones en {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} filas/s).")
+    report_load_stats(BACKEND)
 
 if __name__ == "__main__":
-    run_parser()
+    cli = argparse.ArgumentParser(description="Parser de reportes 13F (data/raw -> SQL)")
+    cli.add_argument("--workers", type=int, default=1,
+                     help=f"Procesos para decodificar XML (0 = todos los núcleos: {os.cpu_count()})")
+    cli.add_argument("--force", action="store_true",
+                     help="Ignorar el manifiesto y re-procesar todos los reportes")
+    cli.add_argument("--no-cache", action="store_true",
+                     help="No usar la caché binaria de reportes decodificados (data/processed/filings)")
+    args = cli.parse_args()
+    run_parser(workers=args.workers or os.cpu_count(), force=args.force, use_cache=not args.no_cache)
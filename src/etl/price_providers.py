@@ -0,0 +1,101 @@
+# src/etl/price_providers.py
+# Proveedores de precios para market_data.py. Todos devuelven el mismo formato "largo":
+#   DataFrame(ticker, date, close, volume)  -> una fila por ticker y día (date como datetime64, sin hora)
+# YahooProvider: yfinance con descargas multi-ticker (una petición por lote, no por empresa).
+# LocalProvider: archivos CSV/Parquet en disco (pruebas, benchmarks o datos de otro vendor).
+from pathlib import Path
+import pandas as pd
+
+PRICE_COLUMNS = ["ticker", "date", "close", "volume"]
+
+def _empty():
+    return pd.DataFrame(columns=PRICE_COLUMNS)
+
+class PriceProvider:
+    """Interfaz: download(tickers, start, end) -> DataFrame(ticker, date, close, volume), end exclusivo."""
+    name = "base"
+
+    def __init__(self):
+        self.requests = 0  # Peticiones hechas (para comparar estrategias de descarga)
+
+    def download(self, tickers, start, end):
+        raise NotImplementedError
+
+class YahooProvider(PriceProvider):
+    name = "yahoo"
+
+    def __init__(self, threads=True):
+        super().__init__()
+        import yfinance as yf  # Import diferido: el proveedor local no necesita yfinance
+        self._yf = yf
+        self.threads = threads
+
+    def download(self, tickers, start, end):
+        tickers = list(tickers)
+        self.requests += 1
+        raw = self._yf.download(tickers, start=start, end=end, group_by="ticker",
+                                threads=self.threads, progress=False)
+        if raw is None or raw.empty: return _empty()
+
+        frames = []
+        for t in tickers:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if t not in raw.columns.get_level_values(0): continue
+                sub = raw[t]
+            else:
+                sub = raw  # Versiones viejas de yfinance con un solo ticker
+            sub = sub[["Close", "Volume"]].dropna(subset=["Close"])
+            if sub.empty: continue
+            dates = pd.DatetimeIndex(sub.index)
+            if dates.tz is not None: dates = dates.tz_localize(None)
+            frames.append(pd.DataFrame({
+                "ticker": t,
+                "date": dates.normalize(),
+                "close": sub["Close"].to_numpy(dtype=float),
+                "volume": sub["Volume"].to_numpy(dtype=float),
+            }))
+        return pd.concat(frames, ignore_index=True) if frames else _empty()
+
+class LocalProvider(PriceProvider):
+    """
+    Lee precios de una carpeta (o un archivo) CSV/Parquet. Se aceptan dos formatos:
+      - Un archivo con columnas ticker, date, close, volume (mayúsculas o minúsculas).
+      - Un archivo por ticker (AAPL.csv con Date, Close, Volume, como los exporta yfinance).
+    Todo se carga en memoria una vez; cada download() filtra por tickers y fechas.
+    """
+    name = "local"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = Path(path)
+        self._data = None
+
+    def _read_file(self, f):
+        df = pd.read_parquet(f) if f.suffix == ".parquet" else pd.read_csv(f)
+        df.columns = [c.lower() for c in df.columns]
+        if "ticker" not in df.columns:
+            df["ticker"] = f.stem.upper()
+        return df[PRICE_COLUMNS]
+
+    def _load(self):
+        if self._data is None:
+            files = [self.path] if self.path.is_file() else sorted(
+                f for f in self.path.iterdir() if f.suffix in (".csv", ".parquet"))
+            df = pd.concat([self._read_file(f) for f in files], ignore_index=True) if files else _empty()
+            df["date"] = pd.to_datetime(df["date"]).dt.normalize()
+            self._data = df.sort_values(["ticker", "date"], ignore_index=True)
+        return self._data
+
+    def download(self, tickers, start, end):
+        self.requests += 1
+        df = self._load()
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        mask = df["ticker"].isin(list(tickers)) & (df["date"] >= start) & (df["date"] < end)
+        return df.loc[mask].reset_index(drop=True)
+
+PROVIDERS = {"yahoo": YahooProvider, "local": LocalProvider}
+
+def make_provider(name="yahoo", path=None):
+    if name not in PROVIDERS:
+        raise ValueError(f"Proveedor de precios desconocido: '{name}' (opciones: {', '.join(PROVIDERS)})")
+    return LocalProvider(path) if name == "local" else PROVIDERS[name]()
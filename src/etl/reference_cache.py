@@ -0,0 +1,207 @@
+# src/etl/reference_cache.py
+# Caché de datos de referencia (SEC company_tickers.json, componentes del S&P 500).
+#   data/processed/reference/<fuente>/v<N>.body    -> snapshots versionados del contenido crudo
+#   data/processed/reference/<fuente>/meta.json    -> versión, ETag, Last-Modified, hash, fechas
+#   data/processed/reference/<fuente>/*.npy        -> estructuras de búsqueda ya parseadas (binario, mmap)
+# Revalidación condicional (If-None-Match / If-Modified-Since) solo cuando vence el TTL.
+# Modo offline (o red caída): se usa el último snapshot bueno sin tocar la red.
+import hashlib
+import io
+import json
+import os
+import time
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import requests
+
+# CONFIGURACIÓN
+BASE_DIR = Path(__file__).resolve().parents[2]
+REFERENCE_DIR = BASE_DIR / "data" / "processed" / "reference"
+
+HEADERS = {'User-Agent': 'Institutional Radar Project (education@example.com)'}
+KEEP_VERSIONS = 3      # Snapshots crudos que se conservan por fuente
+PARSER_VERSION = 1     # Subir si cambia normalize_name o el parseo -> se regeneran los .npy
+OFFLINE = os.environ.get("RADAR_OFFLINE", "") not in ("", "0")
+
+# fuente -> (url, TTL en segundos)
+SOURCES = {
+    "sec_company_tickers": ("https://www.sec.gov/files/company_tickers.json", 24 * 3600),
+    "sp500": ("https://en.wikipedia.org/wiki/List_of_S%26P_500_companies", 7 * 24 * 3600),
+}
+
+def _source_dir(name):
+    return REFERENCE_DIR / name
+
+def _read_meta(name):
+    try:
+        with open(_source_dir(name) / "meta.json", "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(name, meta):
+    path = _source_dir(name) / "meta.json"
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, path)
+
+def _body_path(name, version):
+    return _source_dir(name) / f"v{version}.body"
+
+def _prune(name, version):
+    for old in _source_dir(name).glob("v*.body"):
+        if int(old.stem[1:]) <= version - KEEP_VERSIONS:
+            old.unlink(missing_ok=True)
+
+def fetch(name, offline=None, ttl=None):
+    """
+    Devuelve (meta, cambió) del snapshot vigente de una fuente.
+    - Dentro del TTL u offline: ni siquiera se pregunta a la red.
+    - Vencido: GET condicional; 304 -> solo se renueva checked_at; 200 con otro contenido -> nueva versión.
+    - Error de red con snapshot previo: se usa el último bueno.
+    """
+    url, default_ttl = SOURCES[name]
+    ttl = default_ttl if ttl is None else ttl
+    offline = OFFLINE if offline is None else offline
+    meta = _read_meta(name)
+    has_snapshot = meta is not None and _body_path(name, meta["version"]).exists()
+
+    if has_snapshot and (offline or time.time() - meta["checked_at"] < ttl):
+        return meta, False
+    if offline:
+        raise FileNotFoundError(f"Modo offline y sin snapshot local de '{name}' en {_source_dir(name)}")
+
+    headers = dict(HEADERS)
+    if has_snapshot:
+        if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        r = requests.get(url, headers=headers, timeout=30)
+        if r.status_code != 304:
+            r.raise_for_status()
+    except requests.RequestException as e:
+        if not has_snapshot: raise
+        print(f"   Aviso: no se pudo revalidar '{name}' ({e}). Uso el snapshot v{meta['version']}.")
+        return meta, False
+
+    now = time.time()
+    if r.status_code == 304:
+        meta["checked_at"] = now
+        _write_meta(name, meta)
+        return meta, False
+
+    digest = hashlib.sha256(r.content).hexdigest()
+    changed = not has_snapshot or digest != meta["sha256"]
+    if meta is None:
+        version = 1
+    else:
+        # meta.json sin su cuerpo: la versión sigue avanzando (nunca se reutiliza un número) y los .npy
+        # parseados de un cuerpo anterior dejan de valer
+        version = meta["version"] + 1 if changed else meta["version"]
+        if not has_snapshot:
+            meta = {k: v for k, v in meta.items() if k not in ("parsed_version", "parser")}
+    _source_dir(name).mkdir(parents=True, exist_ok=True)
+    if changed:
+        tmp = _body_path(name, version).with_suffix(".tmp")
+        tmp.write_bytes(r.content)
+        os.replace(tmp, _body_path(name, version))
+        _prune(name, version)
+
+    meta = {**(meta or {}), "version": version, "url": url, "sha256": digest,
+            "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+            "checked_at": now, "fetched_at": now if changed else (meta or {}).get("fetched_at", now)}
+    _write_meta(name, meta)
+    return meta, changed
+
+# ESTRUCTURAS DE BÚSQUEDA (binario listo para cargar)
+def normalize_name(name):
+    """Limpia el nombre para mejorar el match (QUITA INC, CORP, LTD, PUNTOS)."""
+    if not name: return ""
+    name = name.upper()
+    remove_list = [" INC", " CORP", " CO", " LTD", " PLC", " AG", " SA", ".", ","]
+    for word in remove_list:
+        name = name.replace(word, "")
+    return name.strip()
+
+class NameLookup(NamedTuple):
+    """Nombre normalizado -> (ticker, CIK) por búsqueda binaria sobre arrays ordenados."""
+    names: np.ndarray
+    tickers: np.ndarray
+    ciks: np.ndarray
+
+    def get(self, clean_name):
+        i = int(np.searchsorted(self.names, clean_name))
+        if i < len(self.names) and self.names[i] == clean_name:
+            return str(self.tickers[i]), int(self.ciks[i])
+        return None
+
+    def __len__(self):
+        return len(self.names)
+
+def _parsed_valid(name, meta, files):
+    d = _source_dir(name)
+    return (meta.get("parsed_version") == meta["version"] and meta.get("parser") == PARSER_VERSION
+            and all((d / f).exists() for f in files))
+
+def _save_arrays(name, meta, arrays):
+    d = _source_dir(name)
+    for fname, arr in arrays.items():
+        tmp = d / f".{fname}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, d / fname)
+    meta.update(parsed_version=meta["version"], parser=PARSER_VERSION)
+    _write_meta(name, meta)
+
+SEC_FILES = ("names.npy", "tickers.npy", "ciks.npy")
+
+def sec_lookup(offline=None, ttl=None):
+    """{NOMBRE_LIMPIO: (TICKER, CIK)} de company_tickers.json de la SEC, como NameLookup."""
+    name = "sec_company_tickers"
+    meta, _ = fetch(name, offline, ttl)
+    d = _source_dir(name)
+    if not _parsed_valid(name, meta, SEC_FILES):
+        raw = json.loads(_body_path(name, meta["version"]).read_bytes())
+        sec_df = pd.DataFrame.from_dict(raw, orient='index')
+        sec_df['clean_title'] = sec_df['title'].apply(normalize_name)
+        # Igual que dict(zip(...)): ante nombres repetidos gana el último
+        sec_df = sec_df.drop_duplicates('clean_title', keep='last').sort_values('clean_title')
+        _save_arrays(name, meta, {
+            "names.npy": sec_df['clean_title'].to_numpy(dtype=str),
+            "tickers.npy": sec_df['ticker'].to_numpy(dtype=str),
+            "ciks.npy": sec_df['cik_str'].to_numpy(dtype=np.int64),
+        })
+    return NameLookup(*(np.load(d / f, mmap_mode="r") for f in SEC_FILES))
+
+def sp500_tickers(offline=None, ttl=None):
+    """Componentes del S&P 500 (Wikipedia) como frozenset de tickers."""
+    name = "sp500"
+    meta, _ = fetch(name, offline, ttl)
+    d = _source_dir(name)
+    if not _parsed_valid(name, meta, ("tickers.npy",)):
+        html = _body_path(name, meta["version"]).read_text(encoding="utf-8")
+        table = pd.read_html(io.StringIO(html))[0]
+        _save_arrays(name, meta, {"tickers.npy": np.unique(table["Symbol"].to_numpy(dtype=str))})
+    return frozenset(np.load(d / "tickers.npy").tolist())
+
+def snapshot_version(name):
+    """Versión del snapshot local de una fuente (None si todavía no se descargó)."""
+    meta = _read_meta(name)
+    return meta["version"] if meta else None
+
+def status():
+    """Resumen de cada fuente: versión, antigüedad y validadores guardados."""
+    for name in SOURCES:
+        meta = _read_meta(name)
+        if meta is None:
+            print(f"   {name:<22} sin snapshot")
+            continue
+        age = (time.time() - meta["checked_at"]) / 3600
+        print(f"   {name:<22} v{meta['version']} | revisado hace {age:.1f} h | "
+              f"ETag={meta.get('etag') or '-'} | Last-Modified={meta.get('last_modified') or '-'}")
+
+if __name__ == "__main__":
+    status()
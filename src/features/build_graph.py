@@ -1,98 +1,72 @@
 # src/features/build_graph.py
-import networkx as nx
-from sqlalchemy.orm import Session
+import argparse
+import time
+from concurrent.futures.process import BrokenProcessPool
 from src.database.connection import get_db
-from src.database.models import Fund, Company, Holding, StockPrice
-import pickle
-from pathlib import Path
+from src.features.graph_engine import build_market_graph, pagerank, in_degree, top_companies
+from src.features.graph_artifact import write_artifact
+from src.features.centrality import centrality_suite, EPSILON
 
-# Rutas
-BASE_DIR = Path(__file__).resolve().parents[2]
-GRAPH_OUTPUT_PATH = BASE_DIR / "data" / "processed" / "market_graph.gpickle"
-
-def build_network():
+def build_network(quarter=None, epsilon=EPSILON, workers=None):
     print("Construyendo el Grafo de Conocimiento Financiero...")
-    
-    db = next(get_db())
-    
-    # 1. Inicializar un Grafo Dirigido (Directed Graph)
-    # Dirigido porque: El Fondo --> POSEE --> La Empresa (la relación tiene dirección)
-    G = nx.DiGraph()
-    
-    # 2. Obtener Nodos (Fondos y Empresas)
-    # Solo traemos empresas que tengan Ticker (las relevantes del sector EV/Tech)
-    tech_companies = db.query(Company).filter(Company.ticker != None).all()
-    funds = db.query(Fund).all()
-    
-    print(f"   🔹 Añadiendo {len(funds)} Fondos y {len(tech_companies)} Empresas clave...")
-    
-    # Añadir Nodos de Empresas
-    for comp in tech_companies:
-        G.add_node(comp.ticker, type='company', name=comp.name, sector=comp.sector)
-        
-    # Añadir Nodos de Fondos (Usamos su CIK o Nombre como ID)
-    for fund in funds:
-        # Limpiamos el nombre para que se vea bien en el grafo
-        short_name = fund.name.replace(" Advisors", "").replace(" Management", "").replace(" Group", "").replace(" Inc", "")
-        G.add_node(short_name, type='fund', name=fund.name, strategy=fund.strategy)
+    t0 = time.perf_counter()
 
-    # 3. Crear las Aristas (Relaciones de Inversión)
-    print("   🔗 Conectando inversiones (esto puede tomar unos segundos)...")
-    
-    # Buscamos holdings SOLO de las empresas tech que filtramos
-    tech_ids = [c.id for c in tech_companies]
-    
-    # Query optimizado: Traer holdings recientes de esas empresas
-    holdings = db.query(Holding).filter(Holding.company_id.in_(tech_ids)).all()
-    
-    edge_count = 0
-    for h in holdings:
-        # Recuperar nombres para los nodos
-        fund_node = h.fund.name.replace(" Advisors", "").replace(" Management", "").replace(" Group", "").replace(" Inc", "")
-        company_node = h.company.ticker
-        
-        if fund_node in G.nodes and company_node in G.nodes:
-            # Añadir arista con peso (Valor de la inversión)
-            G.add_edge(fund_node, company_node, weight=h.value, shares=h.shares)
-            edge_count += 1
+    # 1. Grafo Dirigido como matrices dispersas (ver graph_engine.py)
+    # Dirigido porque: El Fondo --> POSEE --> La Empresa (la relación tiene dirección)
+    db = next(get_db())
+    graph = build_market_graph(db, quarter)
+    db.close()
+    if graph is None:
+        print("   No hay posiciones cargadas: nada que construir.")
+        return None
 
-    print(f"   ✅ Grafo construido con {len(G.nodes)} nodos y {edge_count} conexiones.")
+    print(f"   🔹 {graph.n_funds} Fondos y {len(graph.labels) - graph.n_funds} Empresas clave (trimestre {graph.quarter})...")
+    print(f"   ✅ Grafo construido con {len(graph.labels)} nodos y {graph.n_edges} conexiones ({time.perf_counter() - t0:.1f}s).")
 
     # Data Science
     # Calculamos métricas sobre la estructura de la red
-    
+
     print("Calculando Métricas de Red...")
-    
+    t1 = time.perf_counter()
+
     # 1. Grado de Entrada (In-Degree): ¿Cuántos fondos invierten en esta empresa?
     # Indica "Popularidad Institucional"
-    in_degrees = dict(G.in_degree())
-    nx.set_node_attributes(G, in_degrees, 'institutional_popularity')
-    
+    popularity, invested_value = in_degree(graph)
+
     # 2. Pagerank (Algoritmo de Google):
     # No solo cuántos te compran, sino QUÉ TAN IMPORTANTES son los que te compran.
-    pagerank = nx.pagerank(G, weight='weight')
-    nx.set_node_attributes(G, pagerank, 'importance_score')
-    
-    # Imprimir un top 5 de ejemplo
-    sorted_companies = sorted(
-        [n for n, attr in G.nodes(data=True) if attr['type'] == 'company'],
-        key=lambda x: G.nodes[x]['importance_score'],
-        reverse=True
-    )
-    
+    scores, iterations = pagerank(graph.weights)
+    print(f"   PageRank: {iterations} iteraciones ({(time.perf_counter() - t1) * 1000:.0f} ms)")
+
+    # 3. HITS, vector propio e intermediación (ver centrality.py), repartidos en un pool de procesos
+    # Son métricas opcionales: si el pool no arranca o un proceso muere (memoria, límites del sistema),
+    # el grafo se publica igual con PageRank y grado. Un error de programación sí se propaga.
+    try:
+        centrality, info = centrality_suite(graph, epsilon=epsilon, workers=workers)
+        mode = "exacta" if info["exact"] else f"muestreada: {info['sources']} fuentes, ε={info['epsilon']}"
+        print(f"   Centralidades: HITS, eigenvector e intermediación ({mode}) en {info['seconds']:.1f}s con {info['workers']} proceso(s)")
+    except (BrokenProcessPool, OSError) as e:
+        centrality = {}
+        print(f"   Aviso: no se pudieron calcular las centralidades ({e}); el grafo se guarda sin ellas.")
+
     print("\nTOP 5 EMPRESAS POR IMPORTANCIA SISTÉMICA (PageRank):")
-    for i, ticker in enumerate(sorted_companies[:5]):
-        score = G.nodes[ticker]['importance_score']
-        investors = G.nodes[ticker]['institutional_popularity']
-        print(f"   {i+1}. {ticker} (Score: {score:.4f}) - En carteras de {investors} fondos")
+    for i, node in enumerate(top_companies(graph, scores, 5)):
+        print(f"   {i+1}. {graph.labels[node]} (Score: {scores[node]:.4f}) - En carteras de {popularity[node]} fondos")
 
     # 4. Guardar el Grafo para la App
-    # Usamos pickle para guardar el objeto Python completo
-    with open(GRAPH_OUTPUT_PATH, 'wb') as f:
-        pickle.dump(G, f)
-    
-    print(f"\nGrafo guardado en: {GRAPH_OUTPUT_PATH}")
+    # Versión nueva en columnas .npy (ver graph_artifact.py); el dashboard la abre memory-mapped
+    art = write_artifact(graph, institutional_popularity=popularity, invested_value=invested_value, importance_score=scores,
+                         **centrality)
+
+    print(f"\nGrafo guardado en: {art.path} (versión vigente: {art.version})")
     print("   Listo para ser visualizado en la Terminal.")
+    return graph
 
 if __name__ == "__main__":
-    build_network()
\ No newline at end of file
+    cli = argparse.ArgumentParser(description="Grafo fondos -> empresas de un trimestre")
+    cli.add_argument("--quarter", help="Trimestre a construir, ej: 2025Q3 (por defecto, el último cargado)")
+    cli.add_argument("--epsilon", type=float, default=EPSILON,
+                     help="Error máximo de la intermediación normalizada (más grande = menos fuentes, más rápido)")
+    cli.add_argument("--workers", type=int, default=0, help="Procesos para las centralidades (0 = todos los núcleos)")
+    args = cli.parse_args()
+    build_network(args.quarter, args.epsilon, args.workers or None)
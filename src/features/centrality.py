@@ -0,0 +1,215 @@
+# src/features/centrality.py
+# Centralidades del grafo fondos -> empresas, además de PageRank y grado de entrada (graph_engine.py):
+#   hub_score / authority_score -> HITS: fondos que concentran valor en empresas "autoridad" y viceversa
+#   eigenvector_score           -> vector propio de la proyección de empresas (peso = fondos en común)
+#   betweenness                 -> intermediación en la proyección de empresas, con muestreo de fuentes y error acotado
+# La proyección empresa x empresa NUNCA se materializa (con fondos grandes serían cientos de millones de pares):
+#   eigenvector: P·x = Bᵀ(B·x) - d∘x   (B = fondo x empresa 0/1, d = fondos que tienen cada empresa)
+#   betweenness: BFS sobre el grafo bipartito no dirigido; un camino empresa -> fondo -> empresa es una arista
+#   de la proyección (una por fondo en común, como en un multigrafo). Solo cuentan pares (empresa, empresa);
+#   los fondos también reciben intermediación: cuánto conectan empresas que de otro modo quedan lejos.
+# HITS, eigenvector y cada bloque de fuentes de la intermediación son tareas independientes de un pool de procesos.
+#
+#   from src.features.centrality import centrality_suite
+#   metrics, info = centrality_suite(graph)  -> {"hub_score": array, ..., "betweenness": array} (un valor por nodo)
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.features.graph_engine import MarketGraph, TOL, MAX_ITER
+
+EPSILON = 0.05        # Error máximo de la intermediación normalizada (con probabilidad 1 - DELTA):
+                      # ~2.5k fuentes con ~13k nodos (un trimestre completo); 0.02 pediría más fuentes que empresas
+DELTA = 0.1
+SOURCE_BLOCK = 64     # Fuentes por tarea: BFS simultáneos como columnas de una matriz densa
+METRICS = ("hub_score", "authority_score", "eigenvector_score", "betweenness")
+
+# MÉTRICAS ESPECTRALES
+def hits(weights, tol=TOL, max_iter=MAX_ITER):
+    """
+    HITS ponderado (misma definición que nx.hits): a = Wᵀh, h = W·a, normalizados por suma.
+    Converge cuando Σ|h - h_anterior| < n * tol. Devuelve (hubs, authorities, iteraciones, convergió).
+    Sin convergencia en max_iter (autovalores casi iguales, ej. componentes parecidas) devuelve la última iteración.
+    """
+    n = weights.shape[0]
+    if n == 0: return np.zeros(0), np.zeros(0), 0, True
+    weights_t = weights.T.tocsr()
+    h = np.full(n, 1.0 / n)
+    converged = False
+    for i in range(1, max_iter + 1):
+        last = h
+        a = weights_t @ h
+        h = weights @ a
+        h /= h.max() or 1.0
+        if np.abs(h - last).sum() < n * tol:
+            converged = True
+            break
+    a = weights_t @ h
+    return h / (h.sum() or 1.0), a / (a.sum() or 1.0), i, converged
+
+def eigenvector(weights, tol=TOL, max_iter=MAX_ITER):
+    """
+    Centralidad de vector propio de las empresas en la proyección de co-tenencia (0 en los fondos).
+    Iteración de potencia sobre (P + I)·x como nx.eigenvector_centrality, con norma euclidiana 1.
+    Devuelve (scores, iteraciones, convergió); sin convergencia en max_iter, la última iteración.
+    """
+    n = weights.shape[0]
+    holds = (weights > 0).astype(np.float64).tocsr()  # Fondo -> empresa (filas de fondos, columnas de empresas)
+    holds_t = holds.T.tocsr()
+    holders = np.asarray(holds.sum(axis=0)).ravel()
+    companies = holders > 0
+    if not companies.any(): return np.zeros(n), 0, True
+    x = np.where(companies, 1.0 / companies.sum(), 0.0)
+    for i in range(1, max_iter + 1):
+        last = x
+        x = last + holds_t @ (holds @ last) - holders * last
+        x /= np.linalg.norm(x) or 1.0
+        if np.abs(x - last).sum() < n * tol:
+            return x, i, True
+    return x, max_iter, False
+
+# INTERMEDIACIÓN (Brandes por bloques de fuentes sobre el grafo bipartito, no ponderado)
+def sample_size(n_nodes, epsilon=EPSILON, delta=DELTA):
+    """
+    Fuentes necesarias para que TODAS las intermediaciones normalizadas tengan error <= epsilon
+    con probabilidad 1 - delta (Hoeffding + unión sobre los nodos).
+    """
+    return math.ceil(math.log(2 * n_nodes / delta) / (2 * epsilon ** 2))
+
+def brandes_block(holds, holds_t, sources):
+    """
+    Σ de dependencias δ_s(v) de las empresas fuente del bloque, con metas = todas las empresas.
+    holds: fondo x empresa 0/1 (CSR) y su transpuesta. Devuelve (por fondo, por empresa).
+    Los BFS de todas las fuentes avanzan juntos: cada nivel es UN producto disperso x denso y alterna
+    de lado (niveles impares = fondos, pares = empresas), así cada paso toca solo la mitad del grafo.
+    """
+    shapes = {0: (holds.shape[1], len(sources)), 1: (holds.shape[0], len(sources))}  # 0 = empresas, 1 = fondos
+    step = {0: holds, 1: holds_t}  # Matriz que lleva del lado actual al otro
+    cols = np.arange(len(sources))
+    dist = {side: np.full(shape, -1, dtype=np.int32) for side, shape in shapes.items()}
+    sigma = {side: np.zeros(shape) for side, shape in shapes.items()}
+    dist[0][sources, cols], sigma[0][sources, cols] = 0, 1.0
+    frontier, level = sigma[0].copy(), 0
+    while True:
+        side = (level + 1) % 2
+        reach = step[1 - side] @ frontier  # Caminos más cortos que llegan al siguiente nivel
+        new = (reach > 0) & (dist[side] < 0)
+        if not new.any(): break
+        level += 1
+        dist[side][new], sigma[side][new] = level, reach[new]
+        frontier = np.where(new, sigma[side], 0.0)
+
+    delta = {side: np.zeros(shape) for side, shape in shapes.items()}
+    for lvl in range(level, 0, -1):
+        side = lvl % 2
+        at = dist[side] == lvl
+        target = 1.0 if side == 0 else 0.0  # Solo las empresas son metas
+        coeff = np.where(at, (target + delta[side]) / np.where(at, sigma[side], 1.0), 0.0)
+        prev = 1 - side
+        delta[prev] += np.where(dist[prev] == lvl - 1, sigma[prev] * (step[side] @ coeff), 0.0)
+    delta[0][sources, cols] = 0.0
+    return delta[1].sum(axis=1), delta[0].sum(axis=1)
+
+# POOL DE PROCESOS (el grafo se envía una vez por proceso, no una vez por tarea)
+_worker_graph = {}
+
+def _init_worker(weights, holds, holds_t):
+    _worker_graph.update(weights=weights, holds=holds, holds_t=holds_t)
+
+def _run_task(task):
+    name, arg = task
+    g = _worker_graph
+    t0 = time.perf_counter()
+    if name == "hits":
+        result = hits(g["weights"])
+    elif name == "eigenvector":
+        result = eigenvector(g["weights"])
+    else:
+        result = brandes_block(g["holds"], g["holds_t"], arg)
+    return name, result, time.perf_counter() - t0
+
+def centrality_suite(graph: MarketGraph, epsilon=EPSILON, delta=DELTA, workers=None, seed=0):
+    """
+    HITS, eigenvector e intermediación de todos los nodos del grafo. workers=None -> todos los núcleos.
+    La intermediación usa todas las empresas como fuentes si la muestra necesaria para epsilon no es menor.
+    Devuelve ({métrica: array por nodo}, info con fuentes usadas, iteraciones y tiempos).
+    """
+    weights = graph.weights.tocsr()
+    n = weights.shape[0]
+    is_company = ~np.asarray(graph.is_fund, dtype=bool)
+    funds, companies = np.flatnonzero(~is_company), np.flatnonzero(is_company)
+    holds = (weights[funds][:, companies] > 0).astype(np.float64).tocsr()  # Fondo x empresa 0/1
+    holds_t = holds.T.tocsr()
+
+    # Fuentes = posiciones de columna en holds (empresas)
+    k = sample_size(n, epsilon, delta)
+    rng = np.random.default_rng(seed)
+    sources = np.arange(len(companies))
+    if k < len(companies):
+        sources = np.sort(rng.choice(len(companies), size=k, replace=False))
+    tasks = [("hits", None), ("eigenvector", None)]
+    tasks += [("betweenness", sources[i:i + SOURCE_BLOCK]) for i in range(0, len(sources), SOURCE_BLOCK)]
+
+    workers = workers or os.cpu_count()
+    t0 = time.perf_counter()
+    if workers <= 1:
+        _init_worker(weights, holds, holds_t)
+        results = [_run_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(weights, holds, holds_t)) as pool:
+            results = list(pool.map(_run_task, tasks))
+
+    betweenness, seconds = np.zeros(n), {}
+    for name, result, elapsed in results:
+        seconds[name] = seconds.get(name, 0.0) + elapsed
+        if name == "hits":
+            hubs, authorities, hits_iterations, hits_converged = result
+        elif name == "eigenvector":
+            eigen, eigen_iterations, eigen_converged = result
+        else:
+            betweenness[funds] += result[0]
+            betweenness[companies] += result[1]
+
+    # Pares ordenados (empresa, empresa) que pueden pasar por cada nodo; la muestra se reescala al total
+    n_companies = len(companies)
+    pairs = np.where(is_company, (n_companies - 1) * (n_companies - 2), n_companies * (n_companies - 1))
+    betweenness *= len(companies) / max(len(sources), 1)
+    betweenness = np.divide(betweenness, pairs, out=np.zeros(n), where=pairs > 0)
+
+    for label, converged, iterations in (("HITS", hits_converged, hits_iterations),
+                                         ("Eigenvector", eigen_converged, eigen_iterations)):
+        if not converged:
+            print(f"   Aviso: {label} no convergió en {iterations} iteraciones; se guarda la última iteración.")
+
+    metrics = {"hub_score": hubs, "authority_score": authorities, "eigenvector_score": eigen, "betweenness": betweenness}
+    info = {"sources": len(sources), "exact": len(sources) == n_companies, "epsilon": epsilon, "delta": delta,
+            "hits_iterations": hits_iterations, "eigenvector_iterations": eigen_iterations,
+            "hits_converged": hits_converged, "eigenvector_converged": eigen_converged,
+            "workers": workers, "seconds": time.perf_counter() - t0, "task_seconds": seconds}
+    return metrics, info
+
+if __name__ == "__main__":
+    from src.database.connection import get_db
+    from src.features.graph_engine import build_market_graph
+    cli = argparse.ArgumentParser(description="Centralidades del grafo fondos -> empresas de un trimestre")
+    cli.add_argument("--quarter", help="Trimestre, ej: 2025Q3 (por defecto, el último cargado)")
+    cli.add_argument("--epsilon", type=float, default=EPSILON, help="Error máximo de la intermediación normalizada")
+    cli.add_argument("--workers", type=int, default=0, help=f"Procesos (0 = todos los núcleos: {os.cpu_count()})")
+    args = cli.parse_args()
+
+    db = next(get_db())
+    graph = build_market_graph(db, args.quarter)
+    db.close()
+    if graph is None:
+        print("No hay posiciones cargadas.")
+    else:
+        metrics, info = centrality_suite(graph, epsilon=args.epsilon, workers=args.workers or None)
+        mode = "exacto" if info["exact"] else f"ε={info['epsilon']}"
+        print(f"Grafo {graph.quarter}: {len(graph.labels)} nodos, {graph.n_edges} aristas | {info['workers']} proceso(s), "
+              f"{info['sources']} fuentes ({mode}) en {info['seconds']:.1f}s")
+        for name in METRICS:
+            top = np.argsort(-metrics[name], kind="stable")[:5]
+            print(f"   {name:<18} " + ", ".join(f"{graph.labels[i]} ({metrics[name][i]:.4f})" for i in top))
@@ -0,0 +1,240 @@
+# src/features/fund_similarity.py
+# Motor de similitud entre fondos (Overlap Matrix del README):
+#   fund_similarity -> (fondo, trimestre, métrica, rango): los TOP_K fondos más parecidos y las tres métricas del par
+#     cosine          = coseno entre vectores de pesos (valor de la posición / valor de la cartera)
+#     jaccard         = empresas en común / empresas en la unión
+#     weight_overlap  = Σ min(peso_a, peso_b): la parte de la cartera que ambos fondos tienen igual
+# Todos los pares de un trimestre salen de productos dispersos W · Wᵀ sobre la matriz fondos x empresas
+# (por bloques de fondos): pares sin empresas en común nunca se tocan y no hay bucles de Python por par.
+#
+#   from src.features.fund_similarity import similar_funds
+#   similar_funds(db, fund_id=7, quarter="2025Q3", metric="weight_overlap", k=5)
+import sys
+import time
+from datetime import datetime
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from src.database.connection import engine, get_db
+from src.database.models import Holding, IngestManifest, FundSimilarity
+from src.database.bulk import load_frame
+from src.database.quarters import quarter_of
+from src.features.graph_engine import iter_edges
+from src.database.query_service import bump_version
+
+TOP_K = 10
+METRICS = ("cosine", "jaccard", "weight_overlap")
+PAIR_CHUNK = 4_000_000  # Pares (o posiciones cruzadas) por bloque: acota la memoria con miles de fondos
+
+def ensure_similarity_table():
+    """Crea la tabla de similitudes en bases de datos antiguas (idempotente)."""
+    FundSimilarity.__table__.create(bind=engine, checkfirst=True)
+
+def _ragged(starts, counts):
+    """Posiciones starts[i] .. starts[i] + counts[i] - 1 de todos los i, concatenadas (sin bucle)."""
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+# MATRIZ FONDOS x EMPRESAS
+class FundMatrix(NamedTuple):
+    quarter: str
+    fund_ids: np.ndarray     # fila -> fund_id
+    company_ids: np.ndarray  # columna -> company_id
+    weights: sp.csr_matrix   # peso de cada posición en su cartera (cada fila suma 1)
+
+def fund_matrix(db: Session, quarter):
+    """Carteras del trimestre (último reporte de cada fondo) normalizadas por su valor total."""
+    funds, companies, values = [], [], []
+    for chunk in iter_edges(db, quarter):
+        fund_ids, company_ids, value, _ = (np.array(c) for c in zip(*chunk))
+        funds.append(fund_ids.astype(np.int64))
+        companies.append(company_ids.astype(np.int64))
+        values.append(value.astype(np.float64))
+    if not funds:
+        return FundMatrix(quarter, np.zeros(0, np.int64), np.zeros(0, np.int64), sp.csr_matrix((0, 0)))
+    values = np.clip(np.nan_to_num(np.concatenate(values)), 0, None)  # Pesos >= 0: el mínimo y el coseno lo asumen
+    fund_ids, rows = np.unique(np.concatenate(funds), return_inverse=True)
+    company_ids, cols = np.unique(np.concatenate(companies), return_inverse=True)
+    matrix = sp.csr_matrix((values, (rows, cols)), shape=(len(fund_ids), len(company_ids)))  # Duplicados se suman
+    matrix.eliminate_zeros()
+
+    # Fondos sin valor (reportes vacíos o en cero) no tienen pesos: fuera
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    keep = totals > 0
+    matrix = sp.diags(1.0 / totals[keep]) @ matrix[keep]
+    return FundMatrix(quarter, fund_ids[keep], company_ids, matrix.tocsr())
+
+# TODOS LOS PARES
+def _top_k(rows, others, scores, shape, k):
+    """
+    Posiciones (en scores) de los k mayores de cada fila del bloque y su rango (1 = mejor).
+    rows/others indexan una matriz densa `shape` (filas del bloque x fondos): argpartition por fila.
+    """
+    dense = np.full(shape, -np.inf)
+    dense[rows, others] = scores
+    index = np.full(shape, -1, dtype=np.int64)
+    index[rows, others] = np.arange(len(scores))
+    k = min(k, shape[1])
+    top = np.argpartition(-dense, k - 1, axis=1)[:, :k] if k < shape[1] else np.tile(np.arange(shape[1]), (shape[0], 1))
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(dense, top, axis=1), axis=1, kind="stable"), axis=1)
+    picked = np.take_along_axis(index, top, axis=1)
+    rank = np.broadcast_to(np.arange(1, k + 1), picked.shape)
+    keep = picked >= 0
+    return picked[keep], rank[keep]
+
+def _exact_overlap(weights, dense, lo, rows, others):
+    """
+    Σ min(w_i, w_j) exacto para los pares (rows[p], others[p]), con rows dentro del bloque denso
+    (dense = filas lo.. de la matriz): cada posición de j se compara con el peso de i en esa empresa.
+    """
+    sizes = np.diff(weights.indptr)
+    out = np.zeros(len(rows))
+    cost = np.cumsum(sizes[others])
+    start = 0
+    while start < len(rows):
+        end = max(start + 1, int(np.searchsorted(cost, (cost[start - 1] if start else 0) + PAIR_CHUNK, side="right")))
+        counts = sizes[others[start:end]]
+        pos = _ragged(weights.indptr[others[start:end]], counts)
+        mins = np.minimum(weights.data[pos], dense[np.repeat(rows[start:end] - lo, counts), weights.indices[pos]])
+        out[start:end] = np.bincount(np.repeat(np.arange(end - start), counts), weights=mins, minlength=end - start)
+        start = end
+    return out
+
+def _aligned(product):
+    product.sort_indices()
+    return product
+
+def similarity_frame(fm: FundMatrix, k=TOP_K):
+    """
+    DataFrame de filas para fund_similarity: top-k vecinos de cada fondo en cada métrica.
+    Por bloque de fondos, productos dispersos contra todos los fondos (solo pares con empresas en común):
+      W·Wᵀ -> coseno,  B·Bᵀ (B = posiciones 0/1) -> empresas en común -> Jaccard,
+      W·Bᵀ, B·Wᵀ y √W·√Wᵀ -> cotas superiores del overlap (Σ min <= Σ de pesos en común de cada lado, <= Σ √(w_i·w_j)).
+    El mínimo no es un producto de matrices: se calcula exacto solo para los pares que pueden entrar
+    al top-k (cota > k-ésimo overlap exacto ya visto) y para los vecinos de las otras dos métricas.
+    """
+    weights = fm.weights
+    columns = ["fund_id", "quarter", "metric", "rank", "other_fund_id", *METRICS, "common_positions"]
+    if weights.shape[0] < 2:
+        return pd.DataFrame(columns=columns)
+    weights.sort_indices()
+    n = weights.shape[0]
+    binary = weights.copy()
+    binary.data[:] = 1.0
+    roots = weights.sqrt()
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    sizes = np.diff(weights.indptr)
+    block = max(1, PAIR_CHUNK // max(n, weights.shape[1]))  # Filas por bloque: PAIR_CHUNK pares de salida o celdas densas
+
+    parts = []
+    for lo in range(0, n, block):
+        hi = min(n, lo + block)
+        w_b, b_b = weights[lo:hi], binary[lo:hi]
+        dot, common = _aligned(w_b @ weights.T), _aligned(b_b @ binary.T)
+        sum_i, sum_j = _aligned(w_b @ binary.T), _aligned(b_b @ weights.T)
+        geometric = _aligned(roots[lo:hi] @ roots.T)
+        dense = w_b.toarray()
+        rows = np.repeat(np.arange(lo, hi), np.diff(dot.indptr))
+        others = dot.indices
+        not_self = rows != others
+        rows, others = rows[not_self], others[not_self]
+        shared = common.data[not_self]
+        bound = np.minimum(np.minimum(sum_i.data[not_self], sum_j.data[not_self]), geometric.data[not_self])
+        values = {
+            "cosine": dot.data[not_self] / (norms[rows] * norms[others]),
+            "jaccard": shared / (sizes[rows] + sizes[others] - shared),
+            "weight_overlap": np.full(len(rows), np.nan),
+        }
+        overlap = values["weight_overlap"]
+
+        # Overlap exacto: (1) los k mejores por cota y los vecinos de coseno/Jaccard,
+        # (2) los pares cuya cota supera el k-ésimo overlap exacto de su fila
+        local, shape = rows - lo, (hi - lo, n)
+        top_k = lambda where, scores: _top_k(local[where], others[where], scores, shape, k)
+        everything = slice(None)
+        picks = {m: top_k(everything, values[m]) for m in ("cosine", "jaccard")}
+        first = np.unique(np.concatenate([top_k(everything, bound)[0], *(p for p, _ in picks.values())]))
+        overlap[first] = _exact_overlap(weights, dense, lo, rows[first], others[first])
+        best, _ = top_k(first, overlap[first])
+        kth = np.full(hi - lo, np.inf)  # k-ésimo mejor overlap exacto de cada fila
+        np.minimum.at(kth, local[first][best], overlap[first][best])
+        rest = np.flatnonzero(np.isnan(overlap) & (bound > kth[local]))
+        overlap[rest] = _exact_overlap(weights, dense, lo, rows[rest], others[rest])
+        candidates = np.flatnonzero(~np.isnan(overlap))
+        pick, rank = top_k(candidates, overlap[candidates])
+        picks["weight_overlap"] = (candidates[pick], rank)
+
+        for metric in METRICS:
+            pick, rank = picks[metric]
+            parts.append(pd.DataFrame({
+                "fund_id": fm.fund_ids[rows[pick]], "metric": metric, "rank": rank,
+                "other_fund_id": fm.fund_ids[others[pick]],
+                **{m: values[m][pick] for m in METRICS},
+                "common_positions": shared[pick].astype(np.int64),
+            }))
+    df = pd.concat(parts, ignore_index=True)
+    df.insert(1, "quarter", fm.quarter)
+    return df[columns]
+
+# ACTUALIZACIÓN (un trimestre se recalcula completo: cada fondo nuevo cambia los vecinos de los demás)
+def dirty_quarters(db: Session):
+    """Trimestres cargados sin similitudes o recargados (según el manifiesto) después del último cálculo."""
+    loaded = {quarter_of(d) for (d,) in db.execute(select(Holding.report_date).distinct())}
+    computed = dict(db.execute(select(FundSimilarity.quarter, func.max(FundSimilarity.updated_at))
+                               .group_by(FundSimilarity.quarter)).all())
+    dirty = loaded - computed.keys()
+    for report_date, loaded_at in db.query(IngestManifest.report_date, IngestManifest.loaded_at):
+        if report_date is None or loaded_at is None: continue
+        q = quarter_of(report_date)
+        if q in computed and loaded_at > computed[q]:
+            dirty.add(q)
+    return sorted(dirty)
+
+def refresh_similarity(db: Session, quarters=None, full=False, k=TOP_K):
+    """
+    Recalcula fund_similarity para 'quarters' (por defecto, lo pendiente según dirty_quarters).
+    full=True -> todos los trimestres desde cero. Devuelve las filas escritas.
+    """
+    ensure_similarity_table()
+    if full:
+        db.execute(delete(FundSimilarity))
+        quarters = sorted({quarter_of(d) for (d,) in db.execute(select(Holding.report_date).distinct())})
+    elif quarters is None:
+        quarters = dirty_quarters(db)
+
+    written = 0
+    for quarter in quarters:
+        t0 = time.perf_counter()
+        fm = fund_matrix(db, quarter)
+        df = similarity_frame(fm, k)
+        db.execute(delete(FundSimilarity).where(FundSimilarity.quarter == quarter))
+        written += load_frame(db, FundSimilarity, df.assign(updated_at=datetime.utcnow()))
+        db.commit()
+        print(f"   {quarter}: {len(fm.fund_ids)} fondos x {len(fm.company_ids)} empresas -> "
+              f"{len(df)} vecinos ({time.perf_counter() - t0:.2f}s)")
+    if quarters:
+        bump_version("fund_similarity")  # similar_funds en caché pudo guardar vecinos viejos o vacíos
+    return written
+
+# LECTURA (recorrido de la llave primaria fondo + trimestre + métrica)
+def similar_funds(db: Session, fund_id, quarter=None, metric="weight_overlap", k=TOP_K):
+    """Fondos más parecidos a fund_id en el trimestre (por defecto, el último calculado), mejor primero."""
+    if metric not in METRICS:
+        raise ValueError(f"Métrica desconocida: '{metric}' (usa una de {', '.join(METRICS)})")
+    if quarter is None:
+        quarter = db.scalar(select(func.max(FundSimilarity.quarter)).where(FundSimilarity.fund_id == fund_id))
+    return (db.query(FundSimilarity)
+            .filter(FundSimilarity.fund_id == fund_id, FundSimilarity.quarter == quarter, FundSimilarity.metric == metric)
+            .order_by(FundSimilarity.rank)
+            .limit(k).all())
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv
+    print(f"Calculando similitud entre fondos ({'completo' if full else 'incremental'})...")
+    db = next(get_db())
+    n = refresh_similarity(db, full=full)
+    db.close()
+    print(f"   {n} filas de vecinos escritas.")
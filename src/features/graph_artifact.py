@@ -0,0 +1,168 @@
+# src/features/graph_artifact.py
+# Grafo de mercado en disco como columnas .npy memory-mapped (reemplaza el pickle del DiGraph).
+#   data/processed/market_graph/v<N>/manifest.json  -> versión del formato, trimestre, tamaños y columnas
+#   data/processed/market_graph/v<N>/indptr.npy, indices.npy, weight.npy, shares.npy  -> aristas CSR (fondo -> empresa)
+#   data/processed/market_graph/v<N>/label.npy, is_fund.npy, name.npy, category.npy, <métricas>.npy  -> tabla de nodos
+#   data/processed/market_graph/CURRENT  -> nombre de la versión vigente (se cambia con os.replace)
+# Una versión nueva se escribe completa en su directorio y solo después se apunta CURRENT a ella: un lector
+# abre la versión anterior o la nueva, nunca una a medio escribir. Se conservan las últimas KEEP_VERSIONS.
+#
+#   from src.features.graph_artifact import open_artifact
+#   art = open_artifact()
+#   nodes = art.nodes(["label", "importance_score"])  -> DataFrame (solo esas columnas se leen del disco)
+#   weights = art.edges()                              -> scipy CSR sobre los arrays memory-mapped
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+ARTIFACT_DIR = BASE_DIR / "data" / "processed" / "market_graph"
+
+FORMAT_VERSION = 1
+KEEP_VERSIONS = 2  # La vigente y la anterior (un lector que ya la abrió puede terminar)
+EDGE_FILES = ("indptr", "indices", "weight", "shares")
+BASE_COLUMNS = ("label", "is_fund", "name", "category")
+
+class GraphArtifact(NamedTuple):
+    version: str
+    path: Path
+    manifest: dict
+
+    @property
+    def quarter(self):
+        return self.manifest["quarter"]
+
+    @property
+    def n_nodes(self):
+        return self.manifest["n_nodes"]
+
+    @property
+    def n_edges(self):
+        return self.manifest["n_edges"]
+
+    @property
+    def columns(self):
+        return tuple(self.manifest["columns"])
+
+    def column(self, name):
+        """Una columna de la tabla de nodos (memory-mapped, solo lectura)."""
+        if name not in self.manifest["columns"]:
+            raise KeyError(f"Columna desconocida en el grafo {self.version}: '{name}'")
+        return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+    def nodes(self, columns=None):
+        """DataFrame de nodos (índice = id de nodo) con las columnas pedidas (todas por defecto)."""
+        return pd.DataFrame({name: self.column(name) for name in (columns or self.columns)})
+
+    def edges(self, field="weight"):
+        """Matriz CSR n x n de valor ('weight') o acciones ('shares') sin copiar los arrays."""
+        arrays = {name: np.load(self.path / f"{name}.npy", mmap_mode="r") for name in ("indptr", "indices", field)}
+        return sp.csr_matrix((arrays[field], arrays["indices"], arrays["indptr"]),
+                             shape=(self.n_nodes, self.n_nodes), copy=False)
+
+def _save(directory, name, array):
+    np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+
+def _text(values):
+    """Textos con None -> array de unicode de ancho fijo (memory-mappable, sin objetos de Python)."""
+    return np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+def _versions():
+    if not ARTIFACT_DIR.exists(): return []
+    return sorted((p.name for p in ARTIFACT_DIR.iterdir() if p.is_dir() and p.name[1:].isdigit()),
+                  key=lambda v: int(v[1:]))
+
+def current_version():
+    """Nombre de la versión vigente (ej. 'v7') o None si no hay grafo publicado."""
+    try:
+        version = (ARTIFACT_DIR / "CURRENT").read_text().strip()
+    except OSError:
+        return None
+    return version if (ARTIFACT_DIR / version / "manifest.json").exists() else None
+
+def write_artifact(graph, **node_metrics):
+    """
+    Escribe el MarketGraph y sus métricas por nodo (ej. importance_score=scores) como versión nueva
+    y la publica. Devuelve el GraphArtifact publicado.
+    """
+    ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    versions = _versions()
+    version = f"v{int(versions[-1][1:]) + 1 if versions else 1}"
+    tmp_dir = ARTIFACT_DIR / f".{version}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+
+    weights = graph.weights.tocsr()
+    weights.sort_indices()
+    rows = np.repeat(np.arange(weights.shape[0]), np.diff(weights.indptr))
+    shares = np.asarray(graph.shares[rows, weights.indices]).ravel()
+    for name, array in zip(EDGE_FILES, (weights.indptr, weights.indices, weights.data, shares)):
+        _save(tmp_dir, name, array)
+
+    columns = {"label": _text(graph.labels), "is_fund": np.asarray(graph.is_fund, dtype=bool),
+               "name": _text(graph.names), "category": _text(graph.category)}
+    columns.update({name: np.asarray(values) for name, values in node_metrics.items()})
+    for name, array in columns.items():
+        if len(array) != len(graph.labels):
+            raise ValueError(f"La columna '{name}' tiene {len(array)} valores para {len(graph.labels)} nodos")
+        _save(tmp_dir, name, array)
+
+    manifest = {"format": FORMAT_VERSION, "version": version, "quarter": graph.quarter,
+                "n_nodes": len(graph.labels), "n_edges": int(weights.nnz),
+                "columns": {name: str(array.dtype) for name, array in columns.items()},
+                "built_at": datetime.utcnow().isoformat()}
+    with open(tmp_dir / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    # Publicación: directorio completo -> rename; después el puntero CURRENT -> os.replace
+    os.replace(tmp_dir, ARTIFACT_DIR / version)
+    pointer = ARTIFACT_DIR / "CURRENT.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, ARTIFACT_DIR / "CURRENT")
+    for old in _versions()[:-KEEP_VERSIONS]:
+        shutil.rmtree(ARTIFACT_DIR / old, ignore_errors=True)
+    return GraphArtifact(version, ARTIFACT_DIR / version, manifest)
+
+def open_artifact(version=None):
+    """GraphArtifact de la versión vigente (o la indicada); None si no hay grafo publicado."""
+    version = version or current_version()
+    if version is None: return None
+    path = ARTIFACT_DIR / version
+    with open(path / "manifest.json", "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Formato de grafo {manifest.get('format')} no soportado (se esperaba {FORMAT_VERSION}). "
+                         f"Ejecuta 'python -m src.features.build_graph'.")
+    return GraphArtifact(version, path, manifest)
+
+def to_networkx(art: GraphArtifact):
+    """DiGraph con los mismos atributos que el antiguo pickle (para análisis con networkx)."""
+    import networkx as nx
+    cols = {name: art.column(name).tolist() for name in art.columns}
+    metrics = [c for c in art.columns if c not in BASE_COLUMNS]
+    G = nx.DiGraph(quarter=art.quarter)
+    for i, label in enumerate(cols["label"]):
+        category = cols["category"][i] or None
+        attrs = ({"type": "fund", "name": cols["name"][i], "strategy": category} if cols["is_fund"][i]
+                 else {"type": "company", "name": cols["name"][i], "sector": category})
+        attrs.update({m: cols[m][i] for m in metrics})
+        G.add_node(label, **attrs)
+    weights, shares = art.edges("weight").tocoo(), art.edges("shares").tocoo()
+    labels = np.asarray(cols["label"])
+    G.add_edges_from(zip(labels[weights.row].tolist(), labels[weights.col].tolist(),
+                         ({"weight": w, "shares": s} for w, s in zip(weights.data.tolist(), shares.data.tolist()))))
+    return G
+
+if __name__ == "__main__":
+    art = open_artifact()
+    if art is None:
+        print(f"No hay grafo publicado en {ARTIFACT_DIR}. Ejecuta 'python -m src.features.build_graph'.")
+    else:
+        print(f"Grafo {art.version} ({art.quarter}): {art.n_nodes} nodos, {art.n_edges} aristas, "
+              f"columnas: {', '.join(art.columns)}; versiones en disco: {', '.join(_versions())}")
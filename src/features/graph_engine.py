@@ -0,0 +1,245 @@
+# src/features/graph_engine.py
+# Motor de grafo fondos -> empresas sobre matrices dispersas (sin un objeto Python por arista).
+#   Nodos: ids enteros 0..n-1 (primero los fondos, después las empresas), con arrays de atributos.
+#   Aristas: matriz CSR n x n (fila = fondo, columna = empresa) con el valor invertido; otra con las acciones.
+#   Métricas: PageRank por iteración de potencia vectorizada, grado de entrada = suma/conteo por columna.
+#   to_networkx() reconstruye el DiGraph de siempre cuando hace falta compatibilidad (análisis con networkx); el dashboard lee graph_artifact.py.
+import time
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sqlalchemy import select, func, and_
+from sqlalchemy.orm import Session
+from src.database.models import Fund, Company, Holding
+from src.database.quarters import quarter_of, quarter_bounds
+
+EDGE_CHUNK = 20_000  # Aristas por bloque leído del cursor (memoria acotada)
+FUND_SUFFIXES = (" Advisors", " Management", " Group", " Inc")
+
+# PARÁMETROS DE PAGERANK (los mismos valores por defecto que networkx)
+ALPHA = 0.85
+TOL = 1e-6
+MAX_ITER = 100
+
+def fund_label(name):
+    """Nombre corto del fondo para el grafo (se calcula una vez por fondo, no por arista)."""
+    for suffix in FUND_SUFFIXES:
+        name = name.replace(suffix, "")
+    return name
+
+def latest_quarter(db: Session):
+    """Trimestre del reporte más reciente cargado (None si 'holdings' está vacía)."""
+    last = db.scalar(select(func.max(Holding.report_date)))
+    return quarter_of(last) if last else None
+
+def iter_edges(db: Session, quarter, chunk=EDGE_CHUNK):
+    """
+    Bloques de aristas (fund_id, company_id, value, shares) del trimestre, con UNA consulta proyectada:
+    por fondo, solo su último reporte dentro del trimestre (las enmiendas no duplican aristas).
+    Sin JOIN ni GROUP BY: el paso a ids de nodo (y la suma de clases de acción con el mismo ticker)
+    se hace con arrays al construir la matriz. El cursor se lee en bloques de `chunk` filas.
+    """
+    start, end = quarter_bounds(quarter)
+    latest = (select(Holding.fund_id, func.max(Holding.report_date).label("report_date"))
+              .where(Holding.report_date.between(start, end))
+              .group_by(Holding.fund_id)
+              .subquery())
+    stmt = (select(Holding.fund_id, Holding.company_id, Holding.value, Holding.shares)
+            .join(latest, and_(latest.c.fund_id == Holding.fund_id, latest.c.report_date == Holding.report_date)))
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk))
+    for rows in result.partitions(chunk):
+        yield rows
+
+def _index_array(ids, values):
+    """Tabla de búsqueda id -> valor como array (ids ausentes -> -1)."""
+    ids = np.asarray(ids, dtype=np.int64)
+    table = np.full(int(ids.max()) + 1 if len(ids) else 1, -1, dtype=np.int64)
+    table[ids] = values
+    return table
+
+class MarketGraph(NamedTuple):
+    quarter: str
+    labels: np.ndarray      # id -> etiqueta (nombre corto del fondo o ticker)
+    is_fund: np.ndarray     # bool por nodo
+    names: np.ndarray       # nombre completo
+    category: np.ndarray    # estrategia (fondo) o sector (empresa); None si falta
+    weights: sp.csr_matrix  # n x n: valor invertido fondo -> empresa (USD)
+    shares: sp.csr_matrix   # n x n: acciones fondo -> empresa
+
+    @property
+    def n_funds(self):
+        return int(self.is_fund.sum())
+
+    @property
+    def n_edges(self):
+        return self.weights.nnz
+
+    def node_id(self, label):
+        ids = np.flatnonzero(self.labels == label)
+        if len(ids) == 0:
+            raise KeyError(f"Nodo desconocido: '{label}'")
+        return int(ids[0])
+
+def edge_matrices(n, rows, cols, values, shares):
+    """Arrays de aristas (ids de nodo) -> matrices CSR n x n de valor y acciones; los pares repetidos se suman."""
+    weights = sp.csr_matrix((values, (rows, cols)), shape=(n, n))
+    return weights, sp.csr_matrix((shares, (rows, cols)), shape=(n, n))
+
+def build_market_graph(db: Session, quarter=None):
+    """Grafo del trimestre (por defecto, el último cargado) como matrices CSR. None si no hay posiciones."""
+    quarter = quarter or latest_quarter(db)
+    if quarter is None: return None
+
+    # Nodos de fondos: varios fondos con la misma etiqueta corta comparten nodo (igual que en el DiGraph)
+    funds = pd.DataFrame(db.execute(select(Fund.id, Fund.name, Fund.strategy)).all(), columns=["id", "name", "strategy"])
+    funds["label"] = funds["name"].map(fund_label)
+    fund_nodes = funds.drop_duplicates("label", keep="last").reset_index(drop=True)
+    node_of_fund = _index_array(funds["id"], pd.Index(fund_nodes["label"]).get_indexer(funds["label"]))
+
+    # Nodos de empresas: un nodo por ticker (las clases de acción comparten nodo); sin ticker -> fuera del grafo
+    companies = pd.DataFrame(db.execute(select(Company.id, Company.ticker, Company.name, Company.sector)
+                                        .where(Company.ticker != None)).all(), columns=["id", "ticker", "name", "sector"])
+    company_nodes = companies.drop_duplicates("ticker", keep="last").sort_values("ticker", ignore_index=True)
+    n_funds, n = len(fund_nodes), len(fund_nodes) + len(company_nodes)
+    tickers = company_nodes["ticker"].to_numpy(dtype=str)
+    node_of_company = _index_array(companies["id"], n_funds + np.searchsorted(tickers, companies["ticker"].to_numpy(dtype=str)))
+
+    # Aristas: arrays por bloque -> una sola matriz COO -> CSR (los duplicados se suman)
+    rows, cols, values, shares = [], [], [], []
+    for chunk in iter_edges(db, quarter):
+        fund_ids, company_ids, value, share = (np.array(c) for c in zip(*chunk))
+        company_ids = company_ids.astype(np.int64)
+        node = np.full(len(company_ids), -1, dtype=np.int64)
+        known = company_ids < len(node_of_company)
+        node[known] = node_of_company[company_ids[known]]
+        keep = node >= 0
+        rows.append(node_of_fund[fund_ids.astype(np.int64)[keep]])
+        cols.append(node[keep])
+        values.append(value.astype(np.float64)[keep])
+        shares.append(share.astype(np.float64)[keep])
+    concat = lambda parts, dtype: np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+    weights, share_matrix = edge_matrices(n, concat(rows, np.int64), concat(cols, np.int64),
+                                          concat(values, np.float64), concat(shares, np.float64))
+
+    return MarketGraph(
+        quarter=quarter,
+        labels=np.concatenate([fund_nodes["label"].to_numpy(dtype=str), tickers]),
+        is_fund=np.arange(n) < n_funds,
+        names=np.concatenate([fund_nodes["name"].to_numpy(dtype=object), company_nodes["name"].to_numpy(dtype=object)]),
+        category=np.concatenate([fund_nodes["strategy"].to_numpy(dtype=object), company_nodes["sector"].to_numpy(dtype=object)]),
+        weights=weights,
+        shares=share_matrix,
+    )
+
+# MÉTRICAS
+def pagerank(weights, alpha=ALPHA, tol=TOL, max_iter=MAX_ITER, x0=None):
+    """
+    PageRank ponderado por iteración de potencia (misma definición que nx.pagerank):
+    x = alpha * (Wᵀx + masa de nodos sin salida / n) + (1 - alpha) / n, con W normalizada por fila.
+    Converge cuando Σ|x - x_anterior| < n * tol. x0 permite arrancar desde una solución previa.
+    Devuelve (scores, iteraciones).
+    """
+    n = weights.shape[0]
+    if n == 0: return np.zeros(0), 0
+    out = np.asarray(weights.sum(axis=1)).ravel()
+    dangling = out == 0
+    inv = np.divide(1.0, out, out=np.zeros(n), where=~dangling)
+    transition_t = (sp.diags(inv) @ weights).T.tocsr()
+
+    x = np.full(n, 1.0 / n) if x0 is None else np.asarray(x0, dtype=np.float64) / np.sum(x0)
+    for i in range(1, max_iter + 1):
+        last = x
+        x = alpha * (transition_t @ last + last[dangling].sum() / n) + (1.0 - alpha) / n
+        if np.abs(x - last).sum() < n * tol:
+            return x, i
+    raise RuntimeError(f"PageRank no convergió en {max_iter} iteraciones")
+
+def in_degree(graph: MarketGraph):
+    """(fondos que poseen cada nodo, valor total recibido) = conteo y suma por columna."""
+    csc = graph.weights.tocsc()
+    return np.diff(csc.indptr), np.asarray(csc.sum(axis=0)).ravel()
+
+def top_companies(graph: MarketGraph, scores, k=5):
+    """Ids de las k empresas con mayor score."""
+    company_ids = np.flatnonzero(~graph.is_fund)
+    order = np.argsort(-scores[company_ids], kind="stable")[:k]
+    return company_ids[order]
+
+def to_networkx(graph: MarketGraph, **node_metrics):
+    """
+    DiGraph con los mismos nodos, atributos y aristas que construía build_graph.py.
+    node_metrics: arrays por nodo que se copian como atributos (ej. importance_score=scores).
+    """
+    import networkx as nx  # Solo para compatibilidad: el motor no depende de networkx
+    G = nx.DiGraph(quarter=graph.quarter)
+    extra = {name: np.asarray(values).tolist() for name, values in node_metrics.items()}
+    for i, label in enumerate(graph.labels.tolist()):
+        attrs = ({"type": "fund", "name": graph.names[i], "strategy": graph.category[i]} if graph.is_fund[i]
+                 else {"type": "company", "name": graph.names[i], "sector": graph.category[i]})
+        attrs.update({name: values[i] for name, values in extra.items()})
+        G.add_node(label, **attrs)
+    coo = graph.weights.tocoo()
+    labels = graph.labels
+    share_values = np.asarray(graph.shares[coo.row, coo.col]).ravel()
+    G.add_edges_from(zip(labels[coo.row].tolist(), labels[coo.col].tolist(),
+                         ({"weight": w, "shares": s} for w, s in zip(coo.data.tolist(), share_values.tolist()))))
+    return G
+
+# BENCHMARK: DiGraph de networkx contra el motor CSR sobre las mismas aristas sintéticas
+def benchmark(n_funds=40, n_companies=12_500, n_edges=450_000, seed=0):
+    """Construcción + PageRank + grado de entrada por los dos caminos: tiempo y memoria pico."""
+    import tracemalloc
+    import networkx as nx
+    rng = np.random.default_rng(seed)
+    n = n_funds + n_companies
+    rows = rng.integers(0, n_funds, n_edges)
+    cols = n_funds + rng.integers(0, n_companies, n_edges)
+    values = rng.lognormal(13, 2, n_edges)
+    shares = rng.integers(1, 10**6, n_edges).astype(np.float64)
+    labels = [f"FUND {i}" for i in range(n_funds)] + [f"T{i}" for i in range(n_companies)]
+    print(f"Benchmark de grafo: {n_funds} fondos, {n_companies} empresas, {n_edges:,} aristas")
+
+    def networkx_path():
+        G = nx.DiGraph()
+        G.add_nodes_from(labels)
+        G.add_edges_from((labels[r], labels[c], {"weight": w, "shares": s})
+                         for r, c, w, s in zip(rows.tolist(), cols.tolist(), values.tolist(), shares.tolist()))
+        return nx.pagerank(G, weight="weight"), dict(G.in_degree())
+
+    def engine_path():
+        weights, _ = edge_matrices(n, rows, cols, values, shares)
+        return pagerank(weights), np.diff(weights.tocsc().indptr)
+
+    results = {}
+    for label, fn in (("networkx DiGraph", networkx_path), ("CSR + NumPy", engine_path)):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        tracemalloc.start()  # Segunda corrida solo para la memoria (tracemalloc distorsiona el tiempo)
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        results[label] = (elapsed, peak)
+        print(f"   {label:<18} {elapsed:7.3f}s | memoria pico {peak:8.1f} MB")
+    (t_nx, m_nx), (t_csr, m_csr) = results.values()
+    print(f"   Aceleración: {t_nx / t_csr:.1f}x | memoria: {m_nx / m_csr:.1f}x menos")
+
+if __name__ == "__main__":
+    import sys
+    if "--benchmark" in sys.argv:
+        benchmark()
+        sys.exit()
+    from src.database.connection import get_db
+    db = next(get_db())
+    t0 = time.perf_counter()
+    graph = build_market_graph(db)
+    db.close()
+    if graph is None:
+        print("No hay posiciones cargadas.")
+    else:
+        t1 = time.perf_counter()
+        scores, iterations = pagerank(graph.weights)
+        t2 = time.perf_counter()
+        print(f"Grafo {graph.quarter}: {len(graph.labels)} nodos, {graph.n_edges} aristas ({t1 - t0:.2f}s); "
+              f"PageRank en {iterations} iteraciones ({(t2 - t1) * 1000:.0f} ms)")
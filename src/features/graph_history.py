@@ -0,0 +1,300 @@
+# src/features/graph_history.py
+# Historia temporal del grafo fondos -> empresas: un snapshot por trimestre 13F guardado como
+# DIFERENCIA contra el trimestre anterior, más las métricas de cada nodo en cada trimestre.
+#   data/processed/graph_history/nodes.npz        -> vocabulario global de nodos (ids estables entre trimestres)
+#   data/processed/graph_history/diffs/<Q>.npz    -> aristas nuevas o cambiadas (valor, acciones) y eliminadas
+#   data/processed/graph_history/metrics/<Q>.npz  -> pagerank, popularidad y valor invertido por nodo
+#   data/processed/graph_history/state.npz        -> aristas completas del último trimestre (punto de partida)
+#   data/processed/graph_history/meta.json        -> trimestres en orden, cuándo se calculó cada uno, estadísticas
+# Añadir un trimestre: se lee solo ese trimestre, se compara con state.npz y el PageRank arranca desde el
+# vector del trimestre anterior. La historia no se rehace, salvo con --full o si el manifiesto de ingesta
+# muestra un trimestre ya guardado que se volvió a cargar: entonces se rehace desde ese trimestre.
+#
+#   from src.features.graph_history import node_history
+#   node_history("AAPL")  -> ((quarter, pagerank, popularity, invested_value), ...)
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.database.connection import get_db
+from src.database.models import Holding, IngestManifest
+from src.database.quarters import quarter_of
+from src.features.graph_engine import build_market_graph, pagerank
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+HISTORY_DIR = BASE_DIR / "data" / "processed" / "graph_history"
+
+HISTORY_VERSION = 1
+_COL_BITS = 32  # Llave de arista = fila << 32 | columna (ids globales de nodo)
+_COL_MASK = (1 << _COL_BITS) - 1
+
+class EdgeState(NamedTuple):
+    """Aristas de un trimestre ordenadas por llave (fila << 32 | columna)."""
+    keys: np.ndarray
+    values: np.ndarray
+    shares: np.ndarray
+
+class NodeSnapshot(NamedTuple):
+    quarter: str
+    pagerank: float
+    popularity: int        # Fondos que poseen la empresa
+    invested_value: float  # Valor total invertido por esos fondos (USD)
+
+_EMPTY_STATE = EdgeState(np.zeros(0, np.int64), np.zeros(0), np.zeros(0))
+
+# ARCHIVOS (escritura atómica: tmp + os.replace; meta.json se escribe al final)
+def _read_meta():
+    try:
+        with open(HISTORY_DIR / "meta.json", "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == HISTORY_VERSION else None
+
+def _write_meta(meta):
+    tmp = HISTORY_DIR / "meta.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, HISTORY_DIR / "meta.json")
+
+def _save_npz(path, **arrays):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+def _load_npz(path):
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+# VOCABULARIO GLOBAL DE NODOS
+class NodeVocab:
+    """(tipo, etiqueta) -> id global. Solo crece: el id de un nodo no cambia entre trimestres."""
+    def __init__(self, labels=(), is_fund=()):
+        self.labels = list(labels)
+        self.is_fund = list(is_fund)
+        self._ids = {(f, l): i for i, (l, f) in enumerate(zip(self.labels, self.is_fund))}
+
+    @classmethod
+    def load(cls):
+        path = HISTORY_DIR / "nodes.npz"
+        if not path.exists(): return cls()
+        data = _load_npz(path)
+        return cls(data["labels"].tolist(), data["is_fund"].tolist())
+
+    def save(self):
+        _save_npz(HISTORY_DIR / "nodes.npz", labels=np.array(self.labels, dtype=str),
+                  is_fund=np.array(self.is_fund, dtype=bool))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def ids_for(self, labels, is_fund):
+        """Ids globales (se crean los que falten)."""
+        out = np.empty(len(labels), dtype=np.int64)
+        for i, key in enumerate(zip(is_fund.tolist(), labels.tolist())):
+            node = self._ids.get(key)
+            if node is None:
+                node = self._ids[key] = len(self.labels)
+                self.labels.append(key[1])
+                self.is_fund.append(key[0])
+            out[i] = node
+        return out
+
+    def find(self, label, kind="company"):
+        node = self._ids.get((kind == "fund", label))
+        if node is None:
+            raise KeyError(f"Nodo desconocido en la historia: '{label}' ({kind})")
+        return node
+
+# DIFERENCIAS ENTRE TRIMESTRES (vectorizadas sobre llaves ordenadas)
+def _member(sorted_keys, keys):
+    """Posición de cada key en sorted_keys y si está."""
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return pos, sorted_keys[pos] == keys
+
+def diff_states(old: EdgeState, new: EdgeState):
+    """(aristas nuevas o cambiadas: EdgeState, llaves eliminadas)."""
+    if len(old.keys) == 0:
+        return new, old.keys
+    pos, found = _member(old.keys, new.keys)
+    same = found & (old.values[pos] == new.values) & (old.shares[pos] == new.shares)
+    _, still = _member(new.keys, old.keys)
+    return EdgeState(new.keys[~same], new.values[~same], new.shares[~same]), old.keys[~still]
+
+def apply_diff(state: EdgeState, upserts: EdgeState, removed):
+    """Estado anterior + diferencia -> estado del trimestre."""
+    _, gone = _member(np.union1d(upserts.keys, removed), state.keys)
+    keys = np.concatenate([state.keys[~gone], upserts.keys])
+    order = np.argsort(keys, kind="stable")
+    return EdgeState(keys[order], np.concatenate([state.values[~gone], upserts.values])[order],
+                     np.concatenate([state.shares[~gone], upserts.shares])[order])
+
+def _quarter_state(graph, vocab: NodeVocab):
+    """Grafo CSR del trimestre (ids locales) -> EdgeState con ids globales."""
+    node_ids = vocab.ids_for(graph.labels, graph.is_fund)
+    coo = graph.weights.tocoo()
+    shares = np.asarray(graph.shares[coo.row, coo.col]).ravel()
+    keys = node_ids[coo.row] << _COL_BITS | node_ids[coo.col]
+    order = np.argsort(keys)
+    return EdgeState(keys[order], coo.data[order], shares[order])
+
+def _metrics(state: EdgeState, n, x0=None):
+    """PageRank (arranque en caliente con x0), popularidad y valor invertido por nodo global."""
+    rows, cols = state.keys >> _COL_BITS, state.keys & _COL_MASK
+    weights = sp.csr_matrix((state.values, (rows, cols)), shape=(n, n))
+    if x0 is not None and len(x0) < n:
+        x0 = np.concatenate([x0, np.full(n - len(x0), 1.0 / n)])  # Nodos nuevos: valor uniforme
+    scores, iterations = pagerank(weights, x0=x0)
+    popularity = np.bincount(cols, minlength=n)
+    invested = np.bincount(cols, weights=state.values, minlength=n)
+    return scores, popularity, invested, iterations
+
+# ACTUALIZACIÓN INCREMENTAL
+def _loaded_quarters(db: Session):
+    return sorted({quarter_of(d) for (d,) in db.execute(select(Holding.report_date).distinct())})
+
+def _reloaded_since(db: Session, meta):
+    """Primer trimestre guardado que el manifiesto muestra recargado después de calcularse (None si ninguno)."""
+    built = {q: datetime.fromisoformat(t) for q, t in meta["built_at"].items()}
+    dirty = [quarter_of(d) for d, loaded_at in db.query(IngestManifest.report_date, IngestManifest.loaded_at)
+             if d is not None and loaded_at is not None and quarter_of(d) in built and loaded_at > built[quarter_of(d)]]
+    return min(dirty) if dirty else None
+
+def _gaps(loaded, meta):
+    """
+    Primer trimestre donde la historia ya no cuadra con lo cargado (None si ninguno): un trimestre cargado
+    más tarde pero anterior al último guardado, o uno guardado que ya no tiene posiciones.
+    """
+    stored, loaded = set(meta["quarters"]), set(loaded)
+    if not stored: return None
+    late = [q for q in loaded - stored if q < meta["quarters"][-1]]
+    return min(late + sorted(stored - loaded), default=None)
+
+def replay(quarter=None):
+    """Reconstruye las aristas de un trimestre guardado aplicando las diferencias en orden."""
+    meta = _read_meta()
+    if meta is None or not meta["quarters"]:
+        raise FileNotFoundError(f"No hay historia del grafo en {HISTORY_DIR}. Ejecuta 'python -m src.features.graph_history'.")
+    quarter = quarter or meta["quarters"][-1]
+    if quarter not in meta["quarters"]:
+        raise KeyError(f"Trimestre sin snapshot: '{quarter}'")
+    state = _EMPTY_STATE
+    for q in meta["quarters"][:meta["quarters"].index(quarter) + 1]:
+        d = _load_npz(HISTORY_DIR / "diffs" / f"{q}.npz")
+        state = apply_diff(state, EdgeState(d["keys"], d["values"], d["shares"]), d["removed"])
+    return state
+
+def _truncate(meta, since):
+    """Descarta los trimestres >= since y deja state.npz como el del trimestre anterior."""
+    keep = [q for q in meta["quarters"] if q < since]
+    for q in meta["quarters"][len(keep):]:
+        for sub in ("diffs", "metrics"):
+            (HISTORY_DIR / sub / f"{q}.npz").unlink(missing_ok=True)
+        meta["built_at"].pop(q, None)
+        meta["stats"].pop(q, None)
+    meta["quarters"] = keep
+    state = replay(keep[-1]) if keep else _EMPTY_STATE
+    _save_npz(HISTORY_DIR / "state.npz", keys=state.keys, values=state.values, shares=state.shares)
+    _write_meta(meta)
+
+def sync_history(db: Session, full=False):
+    """
+    Añade a la historia los trimestres cargados que faltan (en orden cronológico).
+    full=True -> desde cero. Devuelve los trimestres calculados.
+    """
+    meta = None if full else _read_meta()
+    if meta is None:
+        shutil.rmtree(HISTORY_DIR, ignore_errors=True)
+        HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+        meta = {"version": HISTORY_VERSION, "quarters": [], "built_at": {}, "stats": {}}
+    loaded = _loaded_quarters(db)
+    if meta["quarters"]:
+        since = min((q for q in (_reloaded_since(db, meta), _gaps(loaded, meta)) if q is not None), default=None)
+        if since is not None:
+            print(f"   {since} se volvió a cargar o falta en la historia: la historia se rehace desde ese trimestre.")
+            _truncate(meta, since)
+
+    last = meta["quarters"][-1] if meta["quarters"] else None
+    pending = [q for q in loaded if last is None or q > last]
+    if not pending:
+        return []
+
+    vocab = NodeVocab.load()
+    if last is None:
+        state, x0 = _EMPTY_STATE, None
+    else:
+        s = _load_npz(HISTORY_DIR / "state.npz")
+        state = EdgeState(s["keys"], s["values"], s["shares"])
+        x0 = _load_npz(HISTORY_DIR / "metrics" / f"{last}.npz")["pagerank"]
+
+    for quarter in pending:
+        t0 = time.perf_counter()
+        graph = build_market_graph(db, quarter)
+        new_state = _quarter_state(graph, vocab)
+        upserts, removed = diff_states(state, new_state)
+        scores, popularity, invested, iterations = _metrics(new_state, len(vocab), x0)
+
+        _save_npz(HISTORY_DIR / "diffs" / f"{quarter}.npz", keys=upserts.keys, values=upserts.values,
+                  shares=upserts.shares, removed=removed)
+        _save_npz(HISTORY_DIR / "metrics" / f"{quarter}.npz", pagerank=scores, popularity=popularity, invested=invested)
+        _save_npz(HISTORY_DIR / "state.npz", keys=new_state.keys, values=new_state.values, shares=new_state.shares)
+        vocab.save()
+        meta["quarters"].append(quarter)
+        meta["built_at"][quarter] = datetime.utcnow().isoformat()
+        meta["stats"][quarter] = {"edges": len(new_state.keys), "changed": len(upserts.keys), "removed": len(removed),
+                                  "nodes": len(vocab), "pagerank_iterations": iterations,
+                                  "seconds": round(time.perf_counter() - t0, 3)}
+        _write_meta(meta)
+        print(f"   {quarter}: {len(new_state.keys)} aristas ({len(upserts.keys)} nuevas/cambiadas, {len(removed)} eliminadas), "
+              f"PageRank en {iterations} iteraciones{' (arranque en caliente)' if x0 is not None else ''}.")
+        state, x0 = new_state, scores
+    return pending
+
+# LECTURA
+def quarters():
+    meta = _read_meta()
+    return tuple(meta["quarters"]) if meta else ()
+
+def node_history(label, kind="company"):
+    """Trayectoria de un nodo: NodeSnapshot por cada trimestre guardado (desde que aparece)."""
+    node = NodeVocab.load().find(label, kind)
+    out = []
+    for q in quarters():
+        m = _load_npz(HISTORY_DIR / "metrics" / f"{q}.npz")
+        if node < len(m["pagerank"]):
+            out.append(NodeSnapshot(q, float(m["pagerank"][node]), int(m["popularity"][node]), float(m["invested"][node])))
+    return tuple(out)
+
+def top_movers(quarter=None, k=10, kind="company"):
+    """Nodos con mayor cambio de PageRank contra el trimestre anterior: ((etiqueta, antes, después), ...)."""
+    qs = quarters()
+    quarter = quarter or (qs[-1] if qs else None)
+    if quarter not in qs or qs.index(quarter) == 0: return ()
+    prev = _load_npz(HISTORY_DIR / "metrics" / f"{qs[qs.index(quarter) - 1]}.npz")["pagerank"]
+    curr = _load_npz(HISTORY_DIR / "metrics" / f"{quarter}.npz")["pagerank"]
+    vocab = NodeVocab.load()
+    before = np.concatenate([prev, np.zeros(len(curr) - len(prev))])
+    mask = np.array(vocab.is_fund[:len(curr)]) == (kind == "fund")
+    candidates = np.flatnonzero(mask)
+    order = candidates[np.argsort(-np.abs(curr[candidates] - before[candidates]), kind="stable")[:k]]
+    return tuple((vocab.labels[i], float(before[i]), float(curr[i])) for i in order)
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv
+    print(f"Actualizando la historia del grafo por trimestre ({'completa' if full else 'incremental'})...")
+    db = next(get_db())
+    added = sync_history(db, full=full)
+    db.close()
+    print(f"   {len(added)} trimestres añadidos; historia: {', '.join(quarters()) or 'vacía'}")
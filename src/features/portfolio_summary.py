@@ -0,0 +1,142 @@
+# src/features/portfolio_summary.py
+# Tablas materializadas de resumen de cartera:
+#   fund_quarter_summary  -> (fondo, trimestre): AUM, nº de posiciones, concentración top-10
+#   fund_quarter_sectors  -> (fondo, trimestre, sector): valor y peso
+# El dashboard y el agente leen por llave primaria en vez de agregar 'holdings' cada vez.
+# Refresco incremental: solo se recalculan los (fondo, trimestre) afectados por la última ingesta.
+import sys
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from src.database.connection import engine, get_db
+from src.database.models import (Company, Holding, IngestManifest,
+                                 FundQuarterSummary, FundSectorWeight)
+from src.database.bulk import bulk_insert
+from src.database.quarters import quarter_of, quarter_bounds
+from src.database.query_service import bump_version
+
+TOP_N = 10
+UNKNOWN_SECTOR = "Unknown"
+
+def ensure_summary_tables():
+    """Crea las tablas materializadas en bases de datos antiguas (idempotente)."""
+    for model in (FundQuarterSummary, FundSectorWeight):
+        model.__table__.create(bind=engine, checkfirst=True)
+
+def holdings_keys(db: Session):
+    """Todos los (fondo, trimestre) con posiciones cargadas."""
+    rows = db.execute(select(Holding.fund_id, Holding.report_date).distinct())
+    return {(fund_id, quarter_of(d)) for fund_id, d in rows}
+
+def dirty_keys(db: Session):
+    """
+    (fondo, trimestre) que hay que recalcular: sin resumen todavía, con resumen pero ya sin
+    posiciones, o con un reporte cargado (según el manifiesto de ingesta) después del último refresco.
+    """
+    summaries = {(s.fund_id, s.quarter): s.updated_at for s in db.query(FundQuarterSummary)}
+    loaded = holdings_keys(db)
+    keys = (loaded - set(summaries)) | (set(summaries) - loaded)
+    for fund_id, report_date, loaded_at in db.query(IngestManifest.fund_id, IngestManifest.report_date, IngestManifest.loaded_at):
+        if report_date is None: continue
+        key = (fund_id, quarter_of(report_date))
+        if key in summaries and loaded_at is not None and loaded_at > summaries[key]:
+            keys.add(key)
+    return keys
+
+def compute_key(db: Session, fund_id, quarter):
+    """
+    Agrega la cartera de un fondo en un trimestre (su último reporte dentro del trimestre).
+    Devuelve (fila de resumen, filas por sector) o (None, []) si no hay posiciones.
+    """
+    start, end = quarter_bounds(quarter)
+    last_date = db.scalar(select(func.max(Holding.report_date)).where(
+        Holding.fund_id == fund_id, Holding.report_date.between(start, end)))
+    if last_date is None:
+        return None, []
+
+    rows = db.execute(
+        select(Holding.value, Company.sector)
+        .join(Company, Company.id == Holding.company_id)
+        .where(Holding.fund_id == fund_id, Holding.report_date == last_date)
+    ).all()
+    values = np.fromiter((v for v, _ in rows), dtype=np.float64, count=len(rows))
+    sectors = np.array([s or UNKNOWN_SECTOR for _, s in rows], dtype=object)
+
+    aum = float(values.sum())
+    top10 = float(np.sort(values)[-TOP_N:].sum())
+    now = datetime.utcnow()
+    summary = {
+        "fund_id": fund_id, "quarter": quarter, "report_date": last_date,
+        "aum": aum, "positions": len(values), "top10_value": top10,
+        "top10_concentration": top10 / aum if aum else 0.0, "updated_at": now,
+    }
+
+    names, inverse = np.unique(sectors, return_inverse=True)
+    sector_value = np.bincount(inverse, weights=values, minlength=len(names))
+    sector_count = np.bincount(inverse, minlength=len(names))
+    sector_rows = [
+        {"fund_id": fund_id, "quarter": quarter, "sector": name, "value": float(val),
+         "weight": float(val) / aum if aum else 0.0, "positions": int(n)}
+        for name, val, n in zip(names.tolist(), sector_value, sector_count)
+    ]
+    return summary, sector_rows
+
+def refresh_summaries(db: Session, keys=None, full=False):
+    """
+    Recalcula las tablas materializadas para 'keys' [(fund_id, trimestre)].
+    keys=None -> detecta lo pendiente (dirty_keys); full=True -> todo desde cero.
+    """
+    ensure_summary_tables()
+    if full:
+        db.execute(delete(FundSectorWeight))
+        db.execute(delete(FundQuarterSummary))
+        keys = holdings_keys(db)
+    elif keys is None:
+        keys = dirty_keys(db)
+    keys = sorted(set(keys))
+    if not keys:
+        return 0
+
+    summaries, sector_rows = [], []
+    for fund_id, quarter in keys:
+        summary, sectors = compute_key(db, fund_id, quarter)
+        # Reemplazo completo de la llave (un sector puede desaparecer de la cartera)
+        db.execute(delete(FundSectorWeight).where(FundSectorWeight.fund_id == fund_id, FundSectorWeight.quarter == quarter))
+        db.execute(delete(FundQuarterSummary).where(FundQuarterSummary.fund_id == fund_id, FundQuarterSummary.quarter == quarter))
+        if summary is not None:
+            summaries.append(summary)
+            sector_rows.extend(sectors)
+
+    bulk_insert(db, FundQuarterSummary, summaries)
+    bulk_insert(db, FundSectorWeight, sector_rows)
+    db.commit()
+    return len(keys)
+
+# LECTURA (consultas por llave primaria)
+def latest_quarter(db: Session, fund_id):
+    return db.scalar(select(func.max(FundQuarterSummary.quarter)).where(FundQuarterSummary.fund_id == fund_id))
+
+def get_fund_summary(db: Session, fund_id, quarter=None):
+    """Resumen de un fondo en un trimestre (por defecto, el más reciente)."""
+    quarter = quarter or latest_quarter(db, fund_id)
+    if quarter is None: return None
+    return db.get(FundQuarterSummary, (fund_id, quarter))
+
+def get_sector_weights(db: Session, fund_id, quarter=None):
+    """Pesos por sector de un fondo en un trimestre, de mayor a menor."""
+    quarter = quarter or latest_quarter(db, fund_id)
+    return (db.query(FundSectorWeight)
+            .filter(FundSectorWeight.fund_id == fund_id, FundSectorWeight.quarter == quarter)
+            .order_by(FundSectorWeight.value.desc())
+            .all())
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv
+    print(f"Refrescando resúmenes de cartera ({'completo' if full else 'incremental'})...")
+    db = next(get_db())
+    n = refresh_summaries(db, full=full)
+    db.close()
+    if n or full:
+        bump_version("portfolio_summary")
+    print(f"   {n} (fondo, trimestre) recalculados.")
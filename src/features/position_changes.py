@@ -0,0 +1,170 @@
+# src/features/position_changes.py
+# Motor de cambios de posición trimestre contra trimestre (Whale Tracker):
+#   position_changes -> (fondo, empresa, trimestre): acciones y valor antes/después + tipo de cambio
+#     'new'  = no estaba en el reporte anterior     'add'  = aumentó acciones
+#     'trim' = redujo acciones                        'exit' = vendió todo
+# Se calcula vectorizado por fondo (sin self-join de 'holdings') y solo para los trimestres recién cargados.
+import sys
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from src.database.connection import engine, get_db
+from src.database.models import Holding, IngestManifest, PositionChange
+from src.database.bulk import bulk_insert
+from src.database.quarters import quarter_of, quarter_bounds, previous_quarter, next_quarter
+from src.database.query_service import bump_version
+
+def ensure_changes_table():
+    """Crea la tabla de cambios en bases de datos antiguas (idempotente)."""
+    PositionChange.__table__.create(bind=engine, checkfirst=True)
+
+def _fund_quarters(db: Session):
+    """{fund_id: set(trimestres con posiciones)}"""
+    quarters = defaultdict(set)
+    for fund_id, d in db.execute(select(Holding.fund_id, Holding.report_date).distinct()):
+        quarters[fund_id].add(quarter_of(d))
+    return quarters
+
+def dirty_keys(db: Session):
+    """
+    (fondo, trimestre) pendientes: cargados después del último cálculo según el manifiesto,
+    o comparables con el trimestre anterior pero sin ninguna fila calculada todavía.
+    """
+    computed = {(f, q): t for f, q, t in db.execute(
+        select(PositionChange.fund_id, PositionChange.quarter, func.max(PositionChange.updated_at))
+        .group_by(PositionChange.fund_id, PositionChange.quarter))}
+    keys = {(f, q) for f, qs in _fund_quarters(db).items() for q in qs
+            if previous_quarter(q) in qs and (f, q) not in computed}
+    for fund_id, report_date, loaded_at in db.query(IngestManifest.fund_id, IngestManifest.report_date, IngestManifest.loaded_at):
+        if report_date is None: continue
+        key = (fund_id, quarter_of(report_date))
+        if key in computed and loaded_at is not None and loaded_at > computed[key]:
+            keys.add(key)
+    return keys
+
+def _latest_snapshot(rows):
+    """Filas (company_id, report_date, shares, value) -> {trimestre: (ids, shares, value)} del último reporte de cada trimestre."""
+    if not rows: return {}
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    dates = np.array([r[1] for r in rows], dtype="datetime64[D]")
+    shares = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+    values = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows))
+
+    snapshots = {}
+    for d in np.unique(dates):
+        q = quarter_of(d.astype(object))
+        mask = dates == d
+        snapshots[q] = (ids[mask], shares[mask], values[mask])  # np.unique ordena: el último gana
+    return snapshots
+
+def diff_snapshots(prev, curr):
+    """
+    Alinea dos carteras por company_id y clasifica cada cambio (vectorizado).
+    Devuelve (ids, tipo, prev_shares, shares, prev_value, value) solo de posiciones que cambiaron.
+    """
+    p_ids, p_sh, p_val = prev
+    c_ids, c_sh, c_val = curr
+    ids = np.union1d(p_ids, c_ids)
+
+    prev_shares, prev_value = np.zeros(len(ids)), np.zeros(len(ids))
+    shares, value = np.zeros(len(ids)), np.zeros(len(ids))
+    pos = np.searchsorted(ids, p_ids)
+    prev_shares[pos], prev_value[pos] = p_sh, p_val
+    pos = np.searchsorted(ids, c_ids)
+    shares[pos], value[pos] = c_sh, c_val
+
+    in_prev, in_curr = np.isin(ids, p_ids), np.isin(ids, c_ids)
+    kind = np.select(
+        [in_curr & ~in_prev, in_prev & ~in_curr, shares > prev_shares, shares < prev_shares],
+        ["new", "exit", "add", "trim"], default="")
+    changed = kind != ""
+    return ids[changed], kind[changed], prev_shares[changed], shares[changed], prev_value[changed], value[changed]
+
+def compute_fund(db: Session, fund_id, quarters):
+    """Filas de position_changes para un fondo y un conjunto de trimestres (UNA consulta por fondo)."""
+    start = quarter_bounds(previous_quarter(min(quarters)))[0]
+    end = quarter_bounds(max(quarters))[1]
+    rows = db.execute(
+        select(Holding.company_id, Holding.report_date, Holding.shares, Holding.value)
+        .where(Holding.fund_id == fund_id, Holding.report_date.between(start, end))
+    ).all()
+    snapshots = _latest_snapshot(rows)
+
+    now = datetime.utcnow()
+    out = []
+    for q in sorted(quarters):
+        prev_q = previous_quarter(q)
+        # Primer trimestre del fondo (o trimestre sin reporte): no hay contra qué comparar
+        if q not in snapshots or prev_q not in snapshots: continue
+        ids, kind, p_sh, sh, p_val, val = diff_snapshots(snapshots[prev_q], snapshots[q])
+        out.extend(
+            {"fund_id": fund_id, "company_id": cid, "quarter": q, "change_type": k,
+             "prev_shares": ps, "shares": s, "share_change": s - ps,
+             "prev_value": pv, "value": v, "value_change": v - pv, "updated_at": now}
+            for cid, k, ps, s, pv, v in zip(ids.tolist(), kind.tolist(), p_sh.tolist(),
+                                           sh.tolist(), p_val.tolist(), val.tolist())
+        )
+    return out
+
+def refresh_changes(db: Session, keys=None, full=False):
+    """
+    Recalcula position_changes para 'keys' [(fund_id, trimestre)] y sus trimestres siguientes
+    (un reporte nuevo también es el "anterior" del próximo trimestre).
+    keys=None -> detecta lo pendiente (dirty_keys); full=True -> todo desde cero.
+    """
+    ensure_changes_table()
+    if full:
+        db.execute(delete(PositionChange))
+        keys = {(f, q) for f, qs in _fund_quarters(db).items() for q in qs}
+    elif keys is None:
+        keys = dirty_keys(db)
+    keys = set(keys) | {(f, next_quarter(q)) for f, q in keys}
+    if not keys:
+        return 0
+
+    by_fund = defaultdict(set)
+    for fund_id, quarter in keys:
+        by_fund[fund_id].add(quarter)
+
+    rows = []
+    for fund_id, quarters in sorted(by_fund.items()):
+        db.execute(delete(PositionChange).where(PositionChange.fund_id == fund_id, PositionChange.quarter.in_(quarters)))
+        rows.extend(compute_fund(db, fund_id, quarters))
+
+    bulk_insert(db, PositionChange, rows)
+    db.commit()
+    return len(rows)
+
+# LECTURA (recorridos del índice quarter + value_change)
+def top_buys(db: Session, quarter, limit=20, change_types=("new", "add")):
+    """Mayores compras del trimestre entre todos los fondos (por valor)."""
+    return (db.query(PositionChange)
+            .filter(PositionChange.quarter == quarter, PositionChange.change_type.in_(change_types))
+            .order_by(PositionChange.value_change.desc())
+            .limit(limit).all())
+
+def top_sells(db: Session, quarter, limit=20, change_types=("trim", "exit")):
+    """Mayores ventas del trimestre entre todos los fondos (por valor)."""
+    return (db.query(PositionChange)
+            .filter(PositionChange.quarter == quarter, PositionChange.change_type.in_(change_types))
+            .order_by(PositionChange.value_change.asc())
+            .limit(limit).all())
+
+def fund_changes(db: Session, fund_id, quarter):
+    """Todo lo que compró y vendió un fondo en un trimestre."""
+    return (db.query(PositionChange)
+            .filter(PositionChange.fund_id == fund_id, PositionChange.quarter == quarter)
+            .order_by(PositionChange.value_change.desc())
+            .all())
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv
+    print(f"Calculando cambios de posición trimestre a trimestre ({'completo' if full else 'incremental'})...")
+    db = next(get_db())
+    n = refresh_changes(db, full=full)
+    db.close()
+    if n or full:
+        bump_version("position_changes")
+    print(f"   {n} cambios de posición escritos.")
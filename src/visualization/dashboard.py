@@ -1,12 +1,16 @@
 # src/visualization/dashboard.py
+import sys
 import streamlit as st
-import pickle
-import networkx as nx
 from pyvis.network import Network
 import pandas as pd
 from pathlib import Path
 import streamlit.components.v1 as components
 
+# Rutas ('streamlit run' ejecuta este archivo como script: la raíz del repo va en el path para importar src)
+BASE_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BASE_DIR))
+from src.features.graph_artifact import open_artifact, current_version
+
 # CONFIGURACIÓN DE LA PÁGINA (ESTILO TERMINAL)
 st.set_page_config(
     page_title="Institutional Radar",
@@ -25,36 +29,39 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# Rutas
-BASE_DIR = Path(__file__).resolve().parents[2]
-GRAPH_PATH = BASE_DIR / "data" / "processed" / "market_graph.gpickle"
+# Columnas de nodo que usa la terminal (el resto del grafo no se lee del disco)
+NODE_COLUMNS = ["label", "is_fund", "name", "category", "importance_score", "institutional_popularity"]
 
 # FUNCIONES
 @st.cache_data
-def load_graph():
-    """Carga el grafo desde el archivo pickle (el cerebro congelado)."""
-    with open(GRAPH_PATH, 'rb') as f:
-        return pickle.load(f)
-
-def build_pyvis_network(G, physics=True):
-    """Convierte el grafo de NetworkX a PyVis (HTML interactivo)."""
+def load_graph(version):
+    """Nodos y aristas de una versión del grafo (columnas memory-mapped; la caché se renueva con la versión)."""
+    art = open_artifact(version)
+    nodes = art.nodes(NODE_COLUMNS)
+    weights = art.edges().tocoo()
+    labels = nodes["label"].to_numpy()
+    edges = pd.DataFrame({"source": labels[weights.row], "target": labels[weights.col], "weight": weights.data})
+    return art.quarter, nodes, edges
+
+def build_pyvis_network(nodes, edges, physics=True):
+    """Convierte las tablas de nodos y aristas a PyVis (HTML interactivo)."""
     # Crear red PyVis con fondo oscuro
     net = Network(height="600px", width="100%", bgcolor="#222222", font_color="white")
     
-    # Traducir nodos y aristas de NetworkX a PyVis
-    for node, attrs in G.nodes(data=True):
+    # Traducir nodos y aristas a PyVis
+    for label, is_fund, score in zip(nodes["label"].tolist(), nodes["is_fund"].tolist(), nodes["importance_score"].tolist()):
         # Diferenciar colores por tipo de nodo
-        color = "#00ff00" if attrs.get('type') == 'company' else "#ff4b4b" # Verde Matrix vs Rojo
-        size = attrs.get('importance_score', 0.01) * 300 # El tamaño depende del PageRank
+        node_type = "fund" if is_fund else "company"
+        color = "#00ff00" if node_type == 'company' else "#ff4b4b" # Verde Matrix vs Rojo
+        size = score * 300 # El tamaño depende del PageRank
         
         # Tooltip al pasar el mouse
-        title = f"{node}\nType: {attrs.get('type')}\nScore: {attrs.get('importance_score', 0):.4f}"
+        title = f"{label}\nType: {node_type}\nScore: {score:.4f}"
         
-        net.add_node(node, label=node, title=title, color=color, size=size)
+        net.add_node(label, label=label, title=title, color=color, size=size)
 
-    for source, target, attrs in G.edges(data=True):
+    for source, target, value in zip(edges["source"].tolist(), edges["target"].tolist(), edges["weight"].tolist()):
         # El grosor depende del valor invertido
-        value = attrs.get('weight', 1)
         width = 1  # Por defecto
         if value > 1000000: width = 3
         elif value > 10000000: width = 6
@@ -79,27 +86,29 @@ def main():
         st.info("Visualizando Ecosistema EV & Tech.\nDatos procesados de SEC 13F.")
 
     # 2. Cargar Datos
-    if not GRAPH_PATH.exists():
-        st.error(" No se encontró el archivo del grafo. Ejecuta 'src/features/build_graph.py' primero.")
+    version = current_version()
+    if version is None:
+        st.error(" No se encontró el grafo. Ejecuta 'src/features/build_graph.py' primero.")
         return
 
-    G = load_graph()
+    quarter, nodes, edges = load_graph(version)
+    companies = nodes[~nodes["is_fund"]]
+    st.caption(f"Trimestre {quarter} · grafo {version}")
 
     # 3. Métricas Rápidas (Top Bar)
     col1, col2, col3 = st.columns(3)
-    col1.metric("Nodos (Empresas/Fondos)", len(G.nodes))
-    col2.metric("Conexiones (Inversiones)", len(G.edges))
+    col1.metric("Nodos (Empresas/Fondos)", len(nodes))
+    col2.metric("Conexiones (Inversiones)", len(edges))
     
     # Encontrar la empresa más importante
-    top_company = sorted([n for n, a in G.nodes(data=True) if a['type']=='company'], 
-                         key=lambda x: G.nodes[x]['importance_score'], reverse=True)[0]
+    top_company = companies.loc[companies["importance_score"].idxmax(), "label"]
     col3.metric("Top Player (PageRank)", top_company)
 
     # 4. El Grafo Interactivo
     st.subheader("Grafo de Influencia Institucional")
     
     # Generar HTML temporal
-    pyvis_net = build_pyvis_network(G, physics=physics_on)
+    pyvis_net = build_pyvis_network(nodes, edges, physics=physics_on)
     try:
         path = '/tmp'
         pyvis_net.save_graph(f'{path}/pyvis_graph.html')
@@ -117,19 +126,12 @@ def main():
     st.markdown("---")
     st.subheader("Datos del Mercado (Top 10 PageRank)")
     
-    # Crear un DataFrame rápido con los datos del grafo
-    data = []
-    for node, attrs in G.nodes(data=True):
-        if attrs.get('type') == 'company':
-            data.append({
-                "Ticker": node,
-                "Name": attrs.get('name'),
-                "Sector": attrs.get('sector'),
-                "PageRank Score": attrs.get('importance_score'),
-                "Institutional Backers": attrs.get('institutional_popularity')
-            })
-            
-    df = pd.DataFrame(data).sort_values("PageRank Score", ascending=False).head(10)
+    # Tabla directa desde las columnas del grafo
+    df = (companies.rename(columns={"label": "Ticker", "name": "Name", "category": "Sector",
+                                    "importance_score": "PageRank Score",
+                                    "institutional_popularity": "Institutional Backers"})
+          [["Ticker", "Name", "Sector", "PageRank Score", "Institutional Backers"]]
+          .sort_values("PageRank Score", ascending=False).head(10))
     st.dataframe(df, use_container_width=True)
 
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+# tests/conftest.py
+# Las pruebas usan una base SQLite temporal: RADAR_DATABASE_URL se fija ANTES de importar src.database
+# (el motor se crea al importar connection.py) y nunca tocan data/institutional_radar.db.
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+TMP_DIR = Path(tempfile.mkdtemp(prefix="radar-tests-"))
+os.environ["RADAR_DATABASE_URL"] = f"sqlite:///{TMP_DIR / 'warehouse.db'}"
+os.environ.pop("RADAR_DB_BACKEND", None)
+
+from src.database.connection import engine, SessionLocal  # noqa: E402
+from src.database.models import Base, Fund, Company, Holding, DerivativePosition  # noqa: E402
+from src.database import query_service as qs  # noqa: E402
+
+REPORT_DATE = date(2025, 9, 30)
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    """Base vacía con 2 fondos, 3 empresas y sus posiciones; versión y caché del servicio aisladas."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(qs, "VERSION_FILE", tmp_path / "warehouse_version.json")
+    monkeypatch.setattr(qs, "_version_cache", [None, 0])
+    qs.CACHE.clear()
+
+    with SessionLocal() as db:
+        db.add_all([Fund(id=1, cik="1000001", name="ALPHA CAPITAL"), Fund(id=2, cik="1000002", name="BETA PARTNERS")])
+        db.add_all([Company(id=1, name="APPLE INC", cusip="037833100", ticker="AAPL"),
+                    Company(id=2, name="MICROSOFT CORP", cusip="594918104", ticker="MSFT"),
+                    Company(id=3, name="TESLA INC", cusip="88160R101", ticker="TSLA")])
+        db.add_all([Holding(fund_id=1, company_id=1, report_date=REPORT_DATE, shares=100, value=1000.0),
+                    Holding(fund_id=1, company_id=2, report_date=REPORT_DATE, shares=50, value=500.0),
+                    Holding(fund_id=2, company_id=1, report_date=REPORT_DATE, shares=10, value=100.0)])
+        db.add(DerivativePosition(fund_id=2, company_id=3, report_date=REPORT_DATE, derivative_type="PUT",
+                                  shares_underlying=5, value=50.0))
+        db.commit()
+    yield SessionLocal
+    qs.CACHE.clear()
@@ -0,0 +1,76 @@
+# tests/test_enrichment.py
+# Cliente de enriquecimiento (src/etl/enrichment.py) contra el stub HTTP local con respuestas 429.
+import threading
+import time
+import pytest
+from sqlalchemy import func, select
+from src.database.models import Company, KeyExecutive
+from src.etl.enrichment import EnrichmentClient, http_info, fake_info, start_stub_server
+from src.etl.fetch_executives import fetch_executives
+
+@pytest.fixture
+def stub():
+    servers = []
+    def start(**kwargs):
+        server, url = start_stub_server(**kwargs)
+        servers.append(server)
+        return url
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_retries_succeed_under_throttling(stub):
+    url = stub(throttle_rate=0.3)
+    client = EnrichmentClient(http_info(url), workers=4, rate=200, burst=20, retries=10, backoff=0.01)
+    tickers = [f"T{i:03d}" for i in range(40)]
+    results = {t: (info, error) for t, info, error in client.map(tickers)}
+
+    assert sorted(results) == tickers
+    assert all(error is None for _, error in results.values())
+    assert all(info == fake_info(t) for t, (info, _) in results.items())
+    assert client.throttled > 0
+    assert client.calls == len(tickers) + client.throttled
+
+def test_rate_limit_holds():
+    rate, burst, n = 20.0, 5, 45
+    stamps, lock = [], threading.Lock()
+    def fetch(ticker):
+        with lock:
+            stamps.append(time.monotonic())
+        return {}
+
+    client = EnrichmentClient(fetch, workers=8, rate=rate, burst=burst)
+    t0 = time.monotonic()
+    assert len(list(client.map(range(n)))) == n
+    elapsed = time.monotonic() - t0
+
+    assert elapsed >= (n - burst) / rate * 0.95
+    # En cualquier ventana de 1 s caben a lo sumo la ráfaga más rate tokens
+    stamps.sort()
+    for i, start in enumerate(stamps):
+        in_window = sum(1 for s in stamps[i:] if s - start <= 1.0)
+        assert in_window <= burst + rate + 1
+
+def test_fetch_executives_against_stub(warehouse, stub):
+    served = []
+    url = stub(info=lambda t: served.append(t) or fake_info(t), throttle_rate=0.1)
+    with warehouse() as db:
+        db.add_all([Company(name=f"COMPANY {i}", cusip=f"TEST{i:05d}", ticker=f"X{i:02d}") for i in range(12)])
+        db.commit()
+        tickers = [t for (t,) in db.execute(select(Company.ticker))]
+
+    fetch_executives(source="http", url=url, workers=4, rate=50)
+    with warehouse() as db:
+        first = db.scalar(select(func.count()).select_from(KeyExecutive))
+        people = {(name, role) for name, role in db.execute(select(KeyExecutive.name, KeyExecutive.role))}
+    expected = {(o["name"], o["title"]) for t in tickers for o in fake_info(t)["companyOfficers"]}
+    assert people == expected
+    assert first == len(expected)
+    assert sorted(served) == sorted(tickers)  # Una respuesta buena por ticker (los 429 no llegan a info)
+
+    # Segunda corrida: todas las empresas ya tienen ejecutivos -> ninguna petición y nada escrito
+    fetch_executives(source="http", url=url, workers=4, rate=50)
+    assert len(served) == len(tickers)
+    with warehouse() as db:
+        assert db.scalar(select(func.count()).select_from(KeyExecutive)) == first
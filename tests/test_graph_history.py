@@ -0,0 +1,46 @@
+# tests/test_graph_history.py
+# Historia del grafo (src/features/graph_history.py): un trimestre anterior cargado tarde rehace la historia.
+from datetime import date
+import pytest
+from src.database.models import Holding
+from src.features import graph_history as gh
+from src.features.graph_engine import build_market_graph
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(gh, "HISTORY_DIR", tmp_path / "graph_history")
+
+def _add_quarter(Session, report_date, scale):
+    with Session() as db:
+        db.add_all([Holding(fund_id=1, company_id=1, report_date=report_date, shares=100 * scale, value=1000.0 * scale),
+                    Holding(fund_id=2, company_id=scale % 3 + 1, report_date=report_date, shares=10, value=100.0 + scale)])
+        if scale % 2:
+            db.add(Holding(fund_id=1, company_id=3, report_date=report_date, shares=7, value=70.0))
+        db.commit()
+
+def _edges(state, vocab):
+    """EdgeState -> {(fondo, empresa): (valor, acciones)} por etiqueta."""
+    return {(vocab.labels[k >> gh._COL_BITS], vocab.labels[k & gh._COL_MASK]): (v, s)
+            for k, v, s in zip(state.keys.tolist(), state.values.tolist(), state.shares.tolist())}
+
+def _graph_edges(graph):
+    coo = graph.weights.tocoo()
+    return {(graph.labels[r], graph.labels[c]): (v, graph.shares[r, c])
+            for r, c, v in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist())}
+
+def test_late_earlier_quarter_rebuilds_history(warehouse, history):
+    # El fixture trae 2025Q3; con 2024Q3 y 2025Q1 son tres trimestres guardados
+    _add_quarter(warehouse, date(2024, 9, 30), 1)
+    _add_quarter(warehouse, date(2025, 3, 31), 2)
+    with warehouse() as db:
+        assert gh.sync_history(db) == ["2024Q3", "2025Q1", "2025Q3"]
+
+    _add_quarter(warehouse, date(2023, 12, 31), 3)  # Trimestre anterior que llega tarde
+    with warehouse() as db:
+        assert gh.sync_history(db) == ["2023Q4", "2024Q3", "2025Q1", "2025Q3"]
+        assert gh.sync_history(db) == []
+        assert gh.quarters() == ("2023Q4", "2024Q3", "2025Q1", "2025Q3")
+
+        vocab = gh.NodeVocab.load()
+        for quarter in gh.quarters():
+            assert _edges(gh.replay(quarter), vocab) == _graph_edges(build_market_graph(db, quarter)), quarter
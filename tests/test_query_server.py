@@ -0,0 +1,108 @@
+# tests/test_query_server.py
+# API de lectura (src/database/query_server.py) contra una base SQLite temporal:
+# caché invalidada por versión, operaciones desconocidas y argumentos inválidos.
+import json
+from datetime import date
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import pytest
+from sqlalchemy import update
+from src.database import query_service as qs
+from src.database.models import Holding, DerivativePosition
+from src.database.query_server import start_stub_server
+from src.features.fund_similarity import refresh_similarity
+
+@pytest.fixture
+def api(warehouse):
+    server, base_url = start_stub_server()
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+def get(base_url, path):
+    """(status, JSON) de un GET, también para respuestas de error."""
+    try:
+        with urlopen(base_url + path, timeout=5) as r:
+            return r.status, json.loads(r.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_fund_holdings(api):
+    status, body = get(api, "/fund_holdings?fund_id=1&as_of=2025-12-31")
+    assert status == 200
+    result = body["result"]
+    assert result["fund_name"] == "ALPHA CAPITAL" and result["report_date"] == "2025-09-30"
+    assert [h["ticker"] for h in result["holdings"]] == ["AAPL", "MSFT"]
+    assert result["aum"] == pytest.approx(1500.0)
+    assert result["holdings"][0]["weight"] == pytest.approx(1000.0 / 1500.0)
+
+def test_cached_answer_changes_after_bump(api, warehouse):
+    _, before = get(api, "/top_holders?ticker=AAPL&as_of=2025-12-31")
+    assert [r["fund_id"] for r in before["result"]] == [1, 2]
+
+    with warehouse() as db:
+        db.execute(update(Holding).where(Holding.fund_id == 2, Holding.company_id == 1).values(value=5000.0))
+        db.commit()
+    _, cached = get(api, "/top_holders?ticker=AAPL&as_of=2025-12-31")
+    assert cached == before  # Sin incrementar la versión: respuesta en caché
+
+    version = qs.bump_version("test")
+    _, after = get(api, "/top_holders?ticker=AAPL&as_of=2025-12-31")
+    assert after["version"] == version == before["version"] + 1
+    assert [r["fund_id"] for r in after["result"]] == [2, 1]
+    assert after["result"][0]["value"] == pytest.approx(5000.0)
+
+def test_put_call_exposure_sees_reload_after_bump(api, warehouse):
+    _, before = get(api, "/put_call_exposure?ticker=tsla&as_of=2025-12-31")
+    assert before["result"]["put_value"] == pytest.approx(50.0)
+    assert before["result"]["put_call_ratio"] is None
+
+    with warehouse() as db:
+        db.add(DerivativePosition(fund_id=1, company_id=3, report_date=date(2025, 9, 30), derivative_type="CALL",
+                                  shares_underlying=10, value=200.0))
+        db.commit()
+    qs.bump_version("impute_derivatives")
+    _, after = get(api, "/put_call_exposure?ticker=TSLA&as_of=2025-12-31")
+    assert after["result"]["call_value"] == pytest.approx(200.0)
+    assert after["result"]["put_call_ratio"] == pytest.approx(0.25)
+
+def test_similar_funds_after_refresh(api, warehouse):
+    _, before = get(api, "/similar_funds?fund_id=1&quarter=2025Q3")
+    assert before["result"]["funds"] == []  # Cacheado antes de calcular
+
+    with warehouse() as db:
+        assert refresh_similarity(db) > 0
+    _, after = get(api, "/similar_funds?fund_id=1&quarter=2025Q3")
+    assert after["version"] == before["version"] + 1
+    assert [n["fund_id"] for n in after["result"]["funds"]] == [2]
+    assert after["result"]["funds"][0]["common_positions"] == 1
+
+def test_version_endpoint_reports_cache(api):
+    get(api, "/fund_holdings?fund_id=1")
+    get(api, "/fund_holdings?fund_id=1")
+    status, stats = get(api, "/version")
+    assert status == 200
+    assert stats["version"] == 0 and stats["hits"] >= 1 and stats["entries"] >= 1
+
+def test_unknown_operation(api):
+    status, body = get(api, "/drop_tables")
+    assert status == 404
+    assert "drop_tables" in body["error"]
+    assert "fund_holdings" in body["operations"]
+
+@pytest.mark.parametrize("path", [
+    "/fund_holdings?fund_id=abc",                # No es un entero
+    "/fund_holdings",                            # Falta fund_id
+    "/top_holders?ticker=AAPL&limit=diez",
+    "/fund_holdings?fund_id=1&as_of=2025-13-45",  # Fecha inválida
+    "/similar_funds?fund_id=1&metric=euclidean",  # Métrica desconocida
+])
+def test_bad_arguments(api, path):
+    status, body = get(api, path)
+    assert status == 400
+    assert body["error"]
+
+def test_missing_fund(api):
+    status, body = get(api, "/fund_holdings?fund_id=999")
+    assert status == 404
+    assert "999" in body["error"]